@@ -1,17 +1,31 @@
 from flask import Flask
 from flask_cors import CORS
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
+import logging
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
-# Firebase 客户端
-firebase = None
-firestore_db = None
-storage_bucket = None
+# 日志级别由 LOG_LEVEL 控制，认证等高频路径的调试日志默认不输出
+logging.basicConfig(
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+
+# Firebase和OpenAI客户端由 app.services 在第一次使用时创建
+# 保留 app.firestore_db / app.storage_bucket 的访问方式，读取时才初始化
+def __getattr__(name):
+    if name == 'firestore_db':
+        from app.services import get_firestore
+        return get_firestore()
+    if name == 'storage_bucket':
+        from app.services import get_storage_bucket
+        return get_storage_bucket()
+    if name == 'firebase':
+        from app.services import get_firebase_app
+        return get_firebase_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def create_app(test_config=None):
     # 创建Flask应用
@@ -20,37 +34,45 @@ def create_app(test_config=None):
     # 配置CORS，允许前端访问
     CORS(app)
     
-    # 初始化Firebase
-    global firebase, firestore_db, storage_bucket
+    test_config = test_config or {}
     
-    cred_path = os.environ.get('FIREBASE_CREDENTIALS', 'firebase-key.json')
-    bucket_name = os.environ.get('FIREBASE_STORAGE_BUCKET', 'shiru-pic.firebasestorage.app')
-        
-    if not firebase_admin._apps:
-        try:
-            cred = credentials.Certificate(cred_path)
-            # 初始化Firebase应用
-            firebase = firebase_admin.initialize_app(cred, {
-                'storageBucket': bucket_name,
-                'projectId': 'shiru-pic'
-            })
-            
-            # 输出更详细的日志
-            print(f"Firebase初始化成功: {firebase._name}")
-            print(f"项目ID: {firebase.project_id}")
-            # 确保在初始化成功后再获取客户端
-            firestore_db = firestore.client()
-            storage_bucket = storage.bucket()
-            app.logger.info('Firebase 初始化成功')
-        except Exception as e:
-            app.logger.error(f'Firebase 初始化失败: {str(e)}')
-            # 在初始化失败时，将客户端设为None，防止后续代码出错
-            firestore_db = None
-            storage_bucket = None
+    if 'FIRESTORE_CLIENT' in test_config:
+        # 测试和基准环境注入替身客户端，不连接真实的Firebase
+        from app import services
+        services.override('firestore', test_config['FIRESTORE_CLIENT'])
+        services.override('storage', test_config.get('STORAGE_BUCKET'))
     
     # 设置应用密钥
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_key_please_change_in_production')
     
+    # 请求体大小上限，Content-Length超出时在读取请求体之前直接返回413
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 64 * 1024 * 1024))
+    
+    if 'OPENAI_CLIENT' in test_config:
+        from app.utils.openai_client import set_openai_client
+        set_openai_client(test_config['OPENAI_CLIENT'])
+    
+    app.config.update({key: value for key, value in test_config.items()
+                       if key not in ('FIRESTORE_CLIENT', 'STORAGE_BUCKET', 'OPENAI_CLIENT')})
+    
+    # 请求计时、Server-Timing响应头和 /metrics 接口
+    from app.utils import metrics
+    metrics.init_app(app)
+    
+    # 请求截止时间，模型调用的超时不超过请求剩余的时间
+    from app.utils import upstream
+    upstream.init_app(app)
+    
+    # 压缩JSON等文本响应；SSE和导出等流式响应不压缩，避免缓冲导致推送延迟
+    if os.environ.get('COMPRESS_ENABLED', 'true').lower() not in ('0', 'false', 'no'):
+        from flask_compress import Compress
+        app.config.setdefault('COMPRESS_ALGORITHM', os.environ.get('COMPRESS_ALGORITHM', 'br,gzip'))
+        app.config.setdefault('COMPRESS_MIN_SIZE', int(os.environ.get('COMPRESS_MIN_SIZE', 500)))
+        app.config.setdefault('COMPRESS_LEVEL', int(os.environ.get('COMPRESS_LEVEL', 6)))
+        app.config.setdefault('COMPRESS_BR_LEVEL', int(os.environ.get('COMPRESS_BR_LEVEL', 4)))
+        app.config['COMPRESS_STREAMS'] = False
+        Compress(app)
+    
     with app.app_context():
         from .api import auth, wordbook, image, tts, history, ai
         app.register_blueprint(auth.bp)
@@ -60,6 +82,11 @@ def create_app(test_config=None):
         app.register_blueprint(history.bp)
         app.register_blueprint(ai.ai_bp)
     
+    @app.errorhandler(413)
+    def request_too_large(e):
+        limit = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+        return {'error': f'请求内容过大，上限为{limit}MB'}, 413
+    
     # 添加ping端点用于测试
     @app.route('/api/ping')
     def ping():
@@ -1,16 +1,64 @@
-import os
 import json
-from openai import OpenAI
-from flask import Blueprint, request, jsonify, current_app
+import time
+from flask import Blueprint, request, jsonify, current_app, Response
 from flask_cors import cross_origin
 import logging
+from app.utils.openai_client import get_openai_client
+from app.utils.json_stream import JsonFieldScanner, parse_json_content
+from app.utils.metrics import span, observe_span
+from app.utils.admission import get_admission, AdmissionRejected, rejection_response
+from app.utils.upstream import call_upstream, call_timeout, is_timeout
+from app.utils.dictionary import lookup_word
+from app.api.wordbook import optional_user_id
+from app.utils.translation_cache import translation_cache_key, memoized_translation, get_cached_translation, set_cached_translation
 
 # 创建blueprint
 ai_bp = Blueprint('ai', __name__, url_prefix='/api/ai')
 logger = logging.getLogger(__name__)
 
-# 初始化OpenAI客户端 - 注意这里不预先初始化客户端
-# 而是在每次请求时重新创建，确保使用最新的API密钥
+# OpenAI客户端由 get_openai_client 统一管理，复用连接池
+# 密钥轮换通过.env修改时间检测或 reload_openai_client 生效
+
+DEFAULT_MODEL = 'gpt-4.1-mini'
+DEFAULT_SYSTEM_PROMPT = '你是一个专业的日中互译助手。请提供以下日语单词的详细信息，包括原始单词、假名(如果有)、中文意思和例句。请用JSON格式返回，格式为：{"word": "单词", "kana": "假名", "meaning": "中文意思", "example": "例句", "exampleMeaning": "例句翻译"}'
+
+def _read_translate_request():
+    """解析翻译请求参数，返回 (model, query, system_prompt, 错误响应)"""
+    data = request.get_json()
+    if not data:
+        return None, None, None, (jsonify({'error': '请求数据为空'}), 400)
+
+    requested_model = data.get('model', DEFAULT_MODEL)
+    query = data.get('query')
+    system_prompt = data.get('system_prompt', DEFAULT_SYSTEM_PROMPT)
+
+    if not query:
+        return None, None, None, (jsonify({'error': '查询文本不能为空'}), 400)
+
+    return requested_model, query, system_prompt, None
+
+def _dictionary_result(query, system_prompt):
+    """
+    使用默认提示词且明确不需要例句(请求中 examples 为false)时先查本地词典
+    词典只有 word / kana / meaning，例句始终由模型生成；未传 examples 的请求按需要例句处理
+    """
+    if system_prompt != DEFAULT_SYSTEM_PROMPT:
+        return None
+    data = request.get_json(silent=True) or {}
+    if str(data.get('examples', 'true')).lower() not in ('0', 'false', 'no'):
+        return None
+    with span('dictionary.lookup'):
+        return lookup_word(query)
+
+def _client_key():
+    """翻译接口不要求登录，有有效令牌时按用户限流，否则按客户端IP限流"""
+    return optional_user_id() or f'ip:{request.remote_addr}'
+
+def _build_messages(system_prompt, query):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": query}
+    ]
 
 @ai_bp.route('/translate', methods=['POST'])
 @cross_origin()
@@ -18,74 +66,155 @@ def translate():
     """使用AI模型进行日中互译"""
     try:
         # 获取请求数据
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': '请求数据为空'}), 400
-        
-        requested_model = data.get('model', 'gpt-4.1-mini')
-        query = data.get('query')
-        system_prompt = data.get('system_prompt', '你是一个专业的日中互译助手。请提供以下日语单词的详细信息，包括原始单词、假名(如果有)、中文意思和例句。请用JSON格式返回，格式为：{"word": "单词", "kana": "假名", "meaning": "中文意思", "example": "例句", "exampleMeaning": "例句翻译"}')
-        
-        if not query:
-            return jsonify({'error': '查询文本不能为空'}), 400
-        
+        requested_model, query, system_prompt, error_response = _read_translate_request()
+        if error_response:
+            return error_response
+
+        # 常用词直接从本地词典返回，不调用模型
+        entry = _dictionary_result(query, system_prompt)
+        if entry is not None:
+            return jsonify(entry), 200, {'X-Cache': 'DICT'}
+
         try:
-            # 在每次请求时重新创建OpenAI客户端
-            # 直接从.env文件重新读取API密钥
-            from dotenv import load_dotenv
-            # 强制重新加载.env文件
-            load_dotenv(override=True)
-            api_key = os.environ.get('OPENAI_API_KEY')
-            logger.info(f"使用API密钥前缀: {api_key[:10] if api_key else None}...")
-            client = OpenAI(api_key=api_key)
-            
-            # 使用OpenAI客户端直接调用API
-            response = client.chat.completions.create(
-                model=requested_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": query}
-                ],
-                temperature=0.2,
-                max_tokens=800
-            )
-            
-            # 从响应中提取内容
-            content = response.choices[0].message.content
-            
-            # 尝试解析JSON响应
-            try:
-                # 首先尝试直接解析整个内容
-                result = json.loads(content)
-            except json.JSONDecodeError:
-                # 如果不是有效的JSON，尝试从文本中提取JSON部分
-                json_match = content.find('{')
-                if json_match != -1:
-                    try:
-                        # 提取{}包含的内容
-                        json_content = content[json_match:]
-                        # 找到最后一个}的位置
-                        last_brace = json_content.rfind('}')
-                        if last_brace != -1:
-                            json_content = json_content[:last_brace+1]
-                            result = json.loads(json_content)
-                        else:
-                            raise ValueError("无法在响应中找到完整的JSON")
-                    except Exception as e:
-                        logger.error(f"JSON解析错误: {str(e)}")
-                        # 返回原始文本响应
-                        return jsonify({"content": content}), 200
-                else:
-                    # 没有找到JSON，返回原始文本
-                    return jsonify({"content": content}), 200
-            
-            # 返回解析后的JSON或原始响应
-            return jsonify(result), 200
-            
+            client = get_openai_client()
+            if client is None:
+                return jsonify({'error': 'OpenAI API密钥未配置'}), 500
+
+            client_key = _client_key()
+
+            def call_model():
+                # 只有缓存未命中、真正调用模型时才消耗限额
+                ticket = get_admission().acquire(client_key, 'chat')
+                try:
+                    # 超时不超过请求剩余的时间，开启对冲时较慢的调用会再发一次
+                    with span('openai.chat'):
+                        response = call_upstream('chat', client, lambda c, timeout: c.chat.completions.create(
+                            model=requested_model,
+                            messages=_build_messages(system_prompt, query),
+                            temperature=0.2,
+                            max_tokens=800,
+                            timeout=timeout
+                        ))
+                finally:
+                    ticket.release()
+
+                # 从响应中提取内容
+                content = response.choices[0].message.content
+
+                # 尝试解析JSON响应，不是有效的JSON时返回原始文本且不缓存
+                result = parse_json_content(content)
+                if result is None:
+                    logger.error("JSON解析错误: 无法在响应中找到完整的JSON")
+                    return {"content": content}, False
+                return result, True
+
+            # 相同查询优先使用缓存，并发的相同查询只调用一次模型
+            cache_key = translation_cache_key(requested_model, system_prompt, query)
+            result, source = memoized_translation(cache_key, call_model)
+
+            # 返回解析后的JSON
+            return jsonify(result), 200, {'X-Cache': source.upper()}
+
+        except AdmissionRejected as e:
+            return rejection_response(e)
         except Exception as e:
             logger.error(f"OpenAI API调用错误: {str(e)}")
-            return jsonify({'error': f'模型API请求失败: {str(e)}'}), 500
-    
+            return jsonify({'error': f'模型API请求失败: {str(e)}'}), 504 if is_timeout(e) else 500
+
     except Exception as e:
         logger.error(f"翻译服务错误: {str(e)}")
         return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@ai_bp.route('/translate/stream', methods=['POST'])
+@cross_origin()
+def translate_stream():
+    """
+    流式日中互译，以Server-Sent Events返回：
+    delta: 模型输出的文本片段；field: 解析完成的JSON字段；done: 完整结果；error: 错误
+    """
+    requested_model, query, system_prompt, error_response = _read_translate_request()
+    if error_response:
+        return error_response
+
+    # 词典或缓存命中时直接推送完整结果
+    cache_key = translation_cache_key(requested_model, system_prompt, query)
+    entry = _dictionary_result(query, system_prompt)
+    cached = entry if entry is not None else get_cached_translation(cache_key)
+    if cached is not None:
+        fields = cached.items() if isinstance(cached, dict) else []
+        events = [_sse('field', {'name': name, 'value': value})
+                  for name, value in fields if isinstance(value, str)]
+        events.append(_sse('done', cached))
+        return Response(events, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Cache': 'DICT' if entry is not None else 'HIT'
+        })
+
+    client = get_openai_client()
+    if client is None:
+        return jsonify({'error': 'OpenAI API密钥未配置'}), 500
+
+    # 流式连接在整个输出过程中占用并发名额，输出结束后归还
+    try:
+        ticket = get_admission().acquire(_client_key(), 'chat')
+    except AdmissionRejected as e:
+        return rejection_response(e)
+
+    stream_start = time.perf_counter()
+    try:
+        # 建立流式连接的耗时计入当前请求，完整输出耗时只记录到直方图
+        with span('openai.chat_stream_open'):
+            stream = client.chat.completions.create(
+                model=requested_model,
+                messages=_build_messages(system_prompt, query),
+                temperature=0.2,
+                max_tokens=800,
+                stream=True,
+                timeout=call_timeout('chat')
+            )
+    except Exception as e:
+        ticket.release()
+        logger.error(f"OpenAI API调用错误: {str(e)}")
+        return jsonify({'error': f'模型API请求失败: {str(e)}'}), 504 if is_timeout(e) else 500
+
+    def generate():
+        scanner = JsonFieldScanner()
+        first_token = False
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if not text:
+                    continue
+                if not first_token:
+                    first_token = True
+                    observe_span('openai.chat_stream_first_token', time.perf_counter() - stream_start)
+                yield _sse('delta', {'content': text})
+                # word / kana / meaning 等字段一旦完整输出就立即推送
+                for name, value in scanner.feed(text):
+                    yield _sse('field', {'name': name, 'value': value})
+
+            result = parse_json_content(scanner.buffer)
+            if result is not None:
+                set_cached_translation(cache_key, result)
+            yield _sse('done', result if result is not None else {'content': scanner.buffer})
+        except Exception as e:
+            logger.error(f"流式翻译错误: {str(e)}")
+            yield _sse('error', {'error': f'模型API请求失败: {str(e)}'})
+        finally:
+            stream.close()
+            ticket.release()
+            observe_span('openai.chat_stream', time.perf_counter() - stream_start)
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        'X-Cache': 'MISS'
+    })
+    # 客户端在开始读取之前断开时生成器不会执行，关闭响应时也归还名额
+    response.call_on_close(ticket.release)
+    return response
@@ -1,37 +1,14 @@
 from flask import Blueprint, request, jsonify, current_app
-from google.oauth2 import id_token
-from google.auth.transport import requests
 import jwt
 import datetime
 import os
-import firebase_admin
-from firebase_admin import auth, credentials
+from app.services import get_firebase_app
 
 # 移除了所有用户集合相关的导入和函数调用
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
-# 初始化 Firebase Admin
-try:
-    # 检查是否已经初始化
-    firebase_admin.get_app()
-    print("Firebase Admin SDK 已经初始化")
-except ValueError:
-    # 如果没有初始化，则初始化
-    try:
-        cred_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'firebase-key.json')
-        print(f"Firebase 密钥文件路径: {cred_path}")
-        
-        if not os.path.exists(cred_path):
-            print(f"Firebase 密钥文件不存在: {cred_path}")
-            raise FileNotFoundError(f"Firebase key file not found at {cred_path}")
-            
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-        print("Firebase Admin SDK 初始化成功")
-    except Exception as e:
-        print(f"Firebase Admin SDK 初始化失败: {str(e)}")
-        raise
+# Firebase Admin 由 app.services 在第一次验证令牌时初始化，不再在导入时重复初始化
 
 # Google/Firebase登录处理
 @bp.route('/google', methods=['POST'])
@@ -44,7 +21,8 @@ def google_auth():
     try:
         # 尝试验证 Firebase ID 令牌
         try:
-            decoded_token = auth.verify_id_token(id_token_str)
+            from firebase_admin import auth
+            decoded_token = auth.verify_id_token(id_token_str, app=get_firebase_app())
             
             # 获取用户信息
             uid = decoded_token['uid']
@@ -1,15 +1,54 @@
 from flask import Blueprint, request, jsonify, current_app
-from app.api.wordbook import token_required
-from app.utils.firebase_utils import get_history_by_user, get_history_item, delete_history_item
+from datetime import datetime, timezone
+from app.api.wordbook import token_required, paged_response, parse_page_args, versioned_list
+from app.utils.firebase_utils import (get_history_by_user, get_history_page, get_history_item, get_history_items,
+                                      delete_history_item, delete_history_items, embed_words)
 
 bp = Blueprint('history', __name__, url_prefix='/api/history')
 
+# 单次按ID批量读取的最大条数
+MAX_BULK_IDS = 100
+
+# 单次按ID批量删除的最大条数
+MAX_BULK_DELETE_IDS = 1000
+
+def _include_words():
+    # ?include_words=1 时为列表中的记录附带单词；分页查询指定了 fields 时还需要包含 words
+    if request.args.get('include_words', '').lower() not in ('1', 'true', 'yes'):
+        return False
+    try:
+        page_args = parse_page_args()
+    except ValueError:
+        page_args = None
+    fields = page_args and page_args['fields']
+    return not fields or 'words' in fields
+
+def _prepare_list_items(items):
+    # 不附带单词时不返回单词以减小列表体积
+    if _include_words():
+        return embed_words(items)
+    for item in items:
+        item.pop('words', None)
+    return items
+
 # 获取历史记录列表
+# 支持 ?limit=&cursor=&fields= 分页参数，分页时返回 {items, nextCursor}
+# 支持 ?ids=a,b,c 一次性读取指定的多条记录
 @bp.route('', methods=['GET'])
 @token_required
+@versioned_list('history')
 def get_history_list(user):
+    if request.args.get('ids'):
+        history_ids = [history_id for history_id in request.args['ids'].split(',') if history_id][:MAX_BULK_IDS]
+        history_items = [item for item in get_history_items(history_ids) if item.get('user_id') == user['id']]
+        return jsonify(_prepare_list_items(history_items)), 200
+    
+    response = paged_response(get_history_page, user['id'], transform=_prepare_list_items)
+    if response is not None:
+        return response
+    
     history_items = get_history_by_user(user['id'])
-    return jsonify(history_items), 200
+    return jsonify(_prepare_list_items(history_items)), 200
 
 # 获取单条历史记录详情
 @bp.route('/<history_id>', methods=['GET'])
@@ -32,7 +71,7 @@ def remove_history_item(user, history_id):
     # 尝试删除历史记录
     try:
         # 首先获取历史记录，验证它属于当前用户
-        history_item = get_history_item(history_id)
+        history_item = get_history_item(history_id, include_words=False)
         
         if not history_item:
             return jsonify({'error': '记录不存在'}), 404
@@ -41,7 +80,7 @@ def remove_history_item(user, history_id):
             return jsonify({'error': '没有权限删除此记录'}), 403
         
         # 删除历史记录（Firebase工具函数将同时删除存储中的图片和相关单词）
-        success = delete_history_item(history_id)
+        success = delete_history_item(history_id, history_item)
         
         if success:
             return jsonify({'message': '记录已删除'}), 200
@@ -50,3 +89,44 @@ def remove_history_item(user, history_id):
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+def _parse_datetime(value):
+    # 接受ISO 8601格式的时间，例如 2025-01-01 或 2025-01-01T00:00:00+08:00
+    # 只有日期或没有时区的时间按UTC处理，才能与 created_at 比较
+    if not isinstance(value, str):
+        raise ValueError('时间必须是字符串')
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+# 批量删除历史记录
+# 请求体为 {"ids": [...]} 或 {"from": "开始时间", "to": "结束时间"}
+@bp.route('', methods=['DELETE'])
+@token_required
+def remove_history_items(user):
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        if 'ids' in data:
+            history_ids = data['ids']
+            if not isinstance(history_ids, list) or not all(isinstance(i, str) and i for i in history_ids):
+                return jsonify({'error': 'ids 必须是记录ID列表'}), 400
+            if len(history_ids) > MAX_BULK_DELETE_IDS:
+                return jsonify({'error': f'单次最多删除{MAX_BULK_DELETE_IDS}条记录'}), 400
+            deleted = delete_history_items(user['id'], history_ids=list(dict.fromkeys(history_ids)))
+        elif 'from' in data or 'to' in data:
+            try:
+                start = _parse_datetime(data['from']) if data.get('from') else None
+                end = _parse_datetime(data['to']) if data.get('to') else None
+            except (TypeError, ValueError):
+                return jsonify({'error': '时间格式不正确，应为ISO 8601格式'}), 400
+            deleted = delete_history_items(user['id'], start=start, end=end)
+        else:
+            return jsonify({'error': '需要提供 ids 或 from/to 参数'}), 400
+        
+        return jsonify({'message': '记录已删除', 'deleted': deleted}), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
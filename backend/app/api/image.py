@@ -1,16 +1,24 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response
 from werkzeug.utils import secure_filename
 import uuid
 import base64
 import json
 import os
 import logging
-from app import firestore_db, storage_bucket
 from app.api.wordbook import token_required
-from app.utils.firebase_utils import upload_image, add_history_item
-import openai
-from PIL import Image
-import io
+from app.utils.firebase_utils import (upload_image, upload_thumbnail, add_history_item, add_history_items,
+                                      delete_image)
+from app.utils.image_processing import (compute_image_keys, normalize_image, sniff_image, read_image_data,
+                                        ImageRejected)
+from app.utils.analysis_cache import get_cached_analysis, set_cached_analysis
+from app.utils.pipeline import get_executor, run_in_background, StageTimer
+from app.utils.metrics import span, observe_span, bind_request_spans
+from app.utils.openai_client import get_openai_client
+from app.utils.jobs import get_job_queue, QueueFullError
+from app.utils.admission import get_admission, AdmissionRejected, rejection_response
+from app.utils.upstream import call_upstream, call_timeout, bind_item_deadline, is_timeout, DeadlineExceeded
+from concurrent.futures import ThreadPoolExecutor
+import time
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
@@ -33,14 +41,10 @@ def allowed_file(filename):
 
 
 # 使用OpenAI分析图片内容
-def analyze_image_with_openai(image_url_or_path, api_key, is_url=False, image_data=None):
+def analyze_image_with_openai(image_url_or_path, client, is_url=False, image_data=None, mime_type='image/png'):
     try:
         logger.info(f"开始分析图片: {'使用URL' if is_url else '使用二进制数据' if image_data else '使用本地文件'}")
         
-        # 创建OpenAI客户端
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-        
         # 处理图片数据
         if is_url:
             # 使用URL直接调用API
@@ -50,8 +54,7 @@ def analyze_image_with_openai(image_url_or_path, api_key, is_url=False, image_da
             # 使用传入的二进制数据
             logger.info("使用传入的图片数据")
             image_data_base64 = base64.b64encode(image_data).decode('ascii')
-            # 使用通用的MIME类型
-            image_url = f"data:image/png;base64,{image_data_base64}"
+            image_url = f"data:{mime_type};base64,{image_data_base64}"
         else:
             # 读取本地图片文件
             logger.info(f"读取本地图片: {image_url_or_path}")
@@ -60,25 +63,29 @@ def analyze_image_with_openai(image_url_or_path, api_key, is_url=False, image_da
                 image_url = f"data:image/png;base64,{image_data}"
         
         # 调用OpenAI视觉API分析图片
-        response = client.responses.create(
-            model="gpt-4.1-nano",
-            input=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "input_text", "text": "分析这张图片，识别图片中的物体，并给出每个物体的日语名称(可以用汉字描述的使用汉字)、假名读音和中文翻译。 \
+        # 超时不超过请求剩余的时间，开启对冲时较慢的调用会再发一次
+        with span('openai.vision'):
+            response = call_upstream('vision', client, lambda c, timeout: c.responses.create(
+                timeout=timeout,
+                model="gpt-4.1-nano",
+                input=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "input_text", "text": "分析这张图片，识别图片中的物体，并给出每个物体的日语名称(可以用汉字描述的使用汉字)、假名读音和中文翻译。 \
                         还要给出每个物体在图片中的大致位置（用x和y的百分比表示）。然后，使用这些日语单词创建一个自然的日语句子，并提供中文翻译。\
                         单个图片最多返回5个单词，并且返回的物体坐标不要重叠，如果多个识别的物体非常靠近，坐标可以相对分散。\
                         \n\n请使用以下的JSON格式返回结果，不要添加其他文本说明：\n{\n  \"words\": [\n    {\n      \"id\": \"uuid\",\n      \"word\": \"[日语单词]\",\n      \"kana\": \"[假名读音]\",\n      \"meaning\": \"[中文意思]\",\n      \"position\": {\"x\": [横坐标百分比], \"y\": [纵坐标百分比]}\n    }\n  ],\n  \"sentence\": {\n    \"japanese\": \"[日语句子]\",\n    \"chinese\": \"[中文翻译]\"\n  }\n}"},
-                        {"type": "input_image", "image_url": image_url},
-                    ],
-                }
-            ]
-        )
+                            {"type": "input_image", "image_url": image_url},
+                        ],
+                    }
+                ]
+            ))
         # 打印响应
         logger.info(f"OpenAI API 响应: {response}")
         # 处理返回的文本，提取JSON（适配新版OpenAI API响应格式）
         # 新的响应格式为 response.output[0].content[0].text
+        parse_start = time.perf_counter()
         try:
             # 获取AI返回的文本
             ai_text = response.output[0].content[0].text
@@ -145,7 +152,8 @@ def analyze_image_with_openai(image_url_or_path, api_key, is_url=False, image_da
                     "sentence": "椅子はテーブルのそばにあります。",
                     "translatedSentence": "椅子在桌子旁边。",
                     "sentence_japanese": "椅子はテーブルのそばにあります。",
-                    "sentence_chinese": "椅子在桌子旁边。"
+                    "sentence_chinese": "椅子在桌子旁边。",
+                    "_fallback": True  # 模拟数据，不写入缓存
                 }
         except Exception as e:
             logger.error(f"解析AI图像JSON响应错误: {str(e)}")
@@ -163,8 +171,10 @@ def analyze_image_with_openai(image_url_or_path, api_key, is_url=False, image_da
                 "sentence": "猫がいます。",
                 "translatedSentence": "有一只猫。",
                 "sentence_japanese": "猫がいます。",
-                "sentence_chinese": "有一只猫。"
+                "sentence_chinese": "有一只猫。",
+                "_fallback": True  # 模拟数据，不写入缓存
             }
+        observe_span('analyze.parse', time.perf_counter() - parse_start)
         
         return result
         
@@ -173,6 +183,7 @@ def analyze_image_with_openai(image_url_or_path, api_key, is_url=False, image_da
         # 返回简洁的错误信息与空数据
         return {
             "error": str(e),
+            "timeout": is_timeout(e),
             "words": [],
             "sentence": "无法分析图像。",
             "sentence_japanese": "画像を分析できません。",
@@ -180,6 +191,126 @@ def analyze_image_with_openai(image_url_or_path, api_key, is_url=False, image_da
             "translatedSentence": "无法分析图像。"
         }
 
+class ImageAnalysisError(Exception):
+    """图片分析失败，模型调用超时时 status 为504"""
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+# 图片分析流水线：预处理后并发执行上传和模型分析，再保存历史记录
+def run_analysis_pipeline(user_id, file_data, filename, client, persist='sync'):
+    """
+    file_data: 图片的bytes或上传文件的文件对象，预处理后才读入内存
+    persist: 'sync' 同步保存历史记录；'async' 在后台保存；None 不保存，由调用方负责
+    返回 (response_data, history_record)，history_record 为 add_history_item 的参数
+    """
+    timer = StageTimer()
+    
+    # 预处理：校正方向、缩放并重新编码，减小上传体积和视觉模型的token消耗
+    with timer.stage('normalize'), span('image.normalize'):
+        try:
+            file_data, mime_type, extension = normalize_image(file_data)
+        except Exception as e:
+            logger.warning(f"图片预处理失败，使用原始数据: {str(e)}")
+            file_data = read_image_data(file_data)
+            mime_type = None
+        else:
+            filename = f"{filename.rsplit('.', 1)[0]}.{extension}"
+    
+    # 先查询分析结果缓存，命中时跳过模型调用
+    with timer.stage('cache_lookup'), span('analysis_cache.lookup'):
+        content_hash, perceptual_hash = compute_image_keys(file_data)
+        analysis_result, matched_by = get_cached_analysis(content_hash, perceptual_hash)
+    cache_hit = analysis_result is not None
+    
+    # 剩余时间不够调用模型时在上传之前结束
+    if not cache_hit:
+        try:
+            call_timeout('vision')
+        except DeadlineExceeded as e:
+            raise ImageAnalysisError(str(e), 504)
+    
+    # 上传到Firebase Storage，与模型分析并发执行
+    executor = get_executor()
+    upload_future = executor.submit(bind_request_spans(timer.timed('upload', upload_image)),
+                                    file_data, filename, content_type=mime_type)
+    thumbnail_future = executor.submit(bind_request_spans(timer.timed('thumbnail', upload_thumbnail)),
+                                       file_data, filename)
+    
+    if not cache_hit:
+        # 分析图片 - 使用预处理后的图片数据
+        analysis_result = timer.timed('analysis', analyze_image_with_openai)(
+            None, client, is_url=False, image_data=file_data, mime_type=mime_type or 'image/png')
+        
+        if 'error' in analysis_result:
+            # 分析失败时清理已上传的图片
+            upload_future.add_done_callback(
+                lambda f: f.exception() is None and run_in_background(delete_image, f.result()[1]))
+            thumbnail_future.add_done_callback(
+                lambda f: f.exception() is None and f.result()
+                and run_in_background(delete_image, f.result()['thumbnail_storage_path']))
+            raise ImageAnalysisError(analysis_result['error'], 504 if analysis_result.get('timeout') else 500)
+        
+        set_cached_analysis(content_hash, perceptual_hash, analysis_result)
+    
+    image_url, storage_path = upload_future.result()
+    thumbnail = thumbnail_future.result()
+    
+    # 准备检测到的单词数据
+    detected_words = []
+    for word_data in analysis_result.get('words', []):
+        detected_words.append({
+            'word': word_data.get('word', ''),
+            'kana': word_data.get('kana', ''),
+            'meaning': word_data.get('meaning', ''),
+            'position_x': word_data.get('position', {}).get('x', 0),
+            'position_y': word_data.get('position', {}).get('y', 0)
+        })
+    
+    # 获取句子，优先使用sentence_japanese，兼容新旧格式
+    japanese_sentence = analysis_result.get('sentence_japanese', analysis_result.get('sentence', ''))
+    chinese_sentence = analysis_result.get('sentence_chinese', analysis_result.get('translatedSentence', ''))
+    
+    # 预先生成历史记录ID，使后台保存时也能立即返回
+    history_id = str(uuid.uuid4())
+    history_record = {
+        'user_id': user_id,
+        'image_url': image_url,
+        'image_storage_path': storage_path,
+        'sentence': japanese_sentence,
+        'translated_sentence': chinese_sentence,
+        'detected_words': detected_words,
+        'history_id': history_id,
+        'thumbnail': thumbnail
+    }
+    
+    # 将数据保存到Firebase
+    if persist == 'async':
+        run_in_background(add_history_item, **history_record)
+    elif persist:
+        timer.timed('history', add_history_item)(**history_record)
+    
+    # 构建响应 - 包含新增字段
+    response_data = {
+        'imageUrl': image_url,
+        'thumbnailUrl': thumbnail and thumbnail['thumbnail_url'],
+        'placeholder': thumbnail and thumbnail['placeholder'],
+        'historyId': history_id,  # 增加历史记录ID
+        'words': analysis_result.get('words', []),
+        'sentence': japanese_sentence,
+        'translatedSentence': chinese_sentence,
+        'sentence_japanese': japanese_sentence,  # 增加新字段
+        'sentence_chinese': chinese_sentence,    # 增加新字段
+        'cache': {
+            'hit': cache_hit,
+            'matchedBy': matched_by
+        },
+        'timings': timer.as_dict()
+    }
+    
+    return response_data, history_record
+
 # 分析图片
 @bp.route('/analyze', methods=['POST'])
 @token_required
@@ -198,68 +329,209 @@ def analyze_image(user):
     if file and allowed_file(file.filename):
         original_filename = secure_filename(file.filename).lower()
         
+        # 上传的文件由werkzeug写入临时文件，这里只读取文件头检查大小、格式和分辨率
         try:
-            # 读取文件内容
-            file_data = file.read()
-            
-            # 上传到Firebase Storage
-            image_url, storage_path = upload_image(file_data, original_filename)
-            
-            # 获取OpenAI API密钥
-            from dotenv import load_dotenv
-            load_dotenv(override=True)
-            api_key = os.environ.get('OPENAI_API_KEY')
+            sniff_image(file.stream)
+        except ImageRejected as e:
+            return jsonify({'error': e.message}), e.status
+        
+        try:
+            # 获取共享的OpenAI客户端
+            client = get_openai_client()
             
-            if not api_key:
+            if client is None:
                 return jsonify({'error': 'OpenAI API密钥未配置'}), 500
             
-            # 分析图片 - 使用原始文件数据
-            # 重置文件指针并重新读取数据
-            file.seek(0)
-            analysis_result = analyze_image_with_openai(image_url, api_key, is_url=False, image_data=file_data)
-            
-            if 'error' in analysis_result:
-                return jsonify({'error': f'图片分析失败: {analysis_result["error"]}'}), 500
-            
-            # 准备检测到的单词数据
-            detected_words = []
-            for word_data in analysis_result.get('words', []):
-                detected_words.append({
-                    'word': word_data.get('word', ''),
-                    'kana': word_data.get('kana', ''),
-                    'meaning': word_data.get('meaning', ''),
-                    'position_x': word_data.get('position', {}).get('x', 0),
-                    'position_y': word_data.get('position', {}).get('y', 0)
-                })
-            
-            # 获取句子，优先使用sentence_japanese，兼容新旧格式
-            japanese_sentence = analysis_result.get('sentence_japanese', analysis_result.get('sentence', ''))
-            chinese_sentence = analysis_result.get('sentence_chinese', analysis_result.get('translatedSentence', ''))
+            # 异步模式：立即返回任务ID，由任务队列在后台完成分析
+            # 任务队列本身限制了并发，这里只检查用户限额
+            run_async = request.args.get('async', '').lower() in ('1', 'true', 'yes')
+            try:
+                if run_async:
+                    ticket = None
+                    get_admission().check_rate(user['id'], 'vision')
+                else:
+                    ticket = get_admission().acquire(user['id'], 'vision')
+            except AdmissionRejected as e:
+                return rejection_response(e)
             
-            # 将数据保存到Firebase
-            history_id = add_history_item(
-                user['id'],
-                image_url,
-                storage_path,
-                japanese_sentence,
-                chinese_sentence,
-                detected_words
-            )
+            if run_async:
+                # 后台任务在请求结束后执行，需要把文件内容读入内存
+                try:
+                    job = get_job_queue('analyze').submit(
+                        user['id'], _run_analysis_job, user['id'], file.read(), original_filename, client)
+                except QueueFullError:
+                    # 任务没有进入队列，退还 check_rate 扣除的令牌
+                    get_admission().refund(user['id'], 'vision')
+                    return jsonify({'error': '服务器繁忙，请稍后重试'}), 503, {'Retry-After': '5'}
+                
+                return jsonify({
+                    'jobId': job['id'],
+                    'status': job['status'],
+                    'statusUrl': f"/api/image/jobs/{job['id']}",
+                    'eventsUrl': f"/api/image/jobs/{job['id']}/events"
+                }), 202
             
-            # 构建响应 - 包含新增字段
-            response_data = {
-                'imageUrl': image_url,
-                'historyId': history_id,  # 增加历史记录ID
-                'words': analysis_result.get('words', []),
-                'sentence': japanese_sentence,
-                'translatedSentence': chinese_sentence,
-                'sentence_japanese': japanese_sentence,  # 增加新字段
-                'sentence_chinese': chinese_sentence     # 增加新字段
-            }
+            # HISTORY_ASYNC_WRITE 开启时历史记录在后台保存，不占用响应时间
+            persist = 'async' if os.environ.get('HISTORY_ASYNC_WRITE', '').lower() in ('1', 'true', 'yes') else 'sync'
+            try:
+                response_data, _ = run_analysis_pipeline(user['id'], file.stream, original_filename, client, persist=persist)
+            finally:
+                ticket.release()
             
             return jsonify(response_data), 200
-                
+        
+        except ImageAnalysisError as e:
+            return jsonify({'error': f'图片分析失败: {str(e)}'}), e.status
         except Exception as e:
             return jsonify({'error': f'处理图片失败: {str(e)}'}), 500
     
     return jsonify({'error': '不支持的文件类型'}), 400
+
+# 批量分析图片：并发执行分析流水线，所有历史记录一次性批量写入
+@bp.route('/analyze/batch', methods=['POST'])
+@token_required
+def analyze_image_batch(user):
+    files = [f for f in request.files.getlist('images') if f and f.filename]
+    if not files:
+        return jsonify({'error': '没有文件'}), 400
+    
+    max_images = int(os.environ.get('ANALYZE_BATCH_MAX_IMAGES', 20))
+    if len(files) > max_images:
+        return jsonify({'error': f'单次最多上传{max_images}张图片'}), 400
+    
+    client = get_openai_client()
+    if client is None:
+        return jsonify({'error': 'OpenAI API密钥未配置'}), 500
+    
+    start = time.perf_counter()
+    results = [None] * len(files)
+    jobs = []
+    for index, file in enumerate(files):
+        if not allowed_file(file.filename):
+            results[index] = {'index': index, 'filename': file.filename, 'error': '不支持的文件类型'}
+            continue
+        try:
+            sniff_image(file.stream)
+        except ImageRejected as e:
+            results[index] = {'index': index, 'filename': file.filename, 'error': e.message}
+            continue
+        jobs.append((index, file.filename, secure_filename(file.filename).lower(), file.stream))
+    
+    # 每张图片消耗一个令牌，按实际并发数占用视觉模型的并发名额
+    concurrency = int(os.environ.get('ANALYZE_BATCH_CONCURRENCY', 4))
+    try:
+        ticket = get_admission().acquire(user['id'], 'vision', cost=len(jobs),
+                                         slots=min(concurrency, len(jobs)))
+    except AdmissionRejected as e:
+        return rejection_response(e)
+    try:
+        return _analyze_batch(user, files, client, concurrency, start, results, jobs)
+    finally:
+        ticket.release()
+
+def _analyze_batch(user, files, client, concurrency, start, results, jobs):
+    # 分析流水线内部还会使用共享线程池上传图片，这里使用独立的有界线程池避免互相占满
+    history_records = []
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(jobs) or 1))) as executor:
+        futures = [
+            (index, filename, executor.submit(bind_item_deadline(bind_request_spans(run_analysis_pipeline)), user['id'], data, safe_name, client, None))
+            for index, filename, safe_name, data in jobs
+        ]
+        for index, filename, future in futures:
+            try:
+                response_data, history_record = future.result()
+            except ImageAnalysisError as e:
+                results[index] = {'index': index, 'filename': filename, 'error': f'图片分析失败: {str(e)}'}
+            except Exception as e:
+                results[index] = {'index': index, 'filename': filename, 'error': f'处理图片失败: {str(e)}'}
+            else:
+                results[index] = {'index': index, 'filename': filename, 'result': response_data}
+                history_records.append((index, history_record))
+    
+    # 所有历史记录和单词合并为最少次数的批量写入
+    batch_commits = 0
+    if history_records:
+        try:
+            _, batch_commits = add_history_items([record for _, record in history_records])
+        except Exception as e:
+            logger.error(f"批量保存历史记录失败: {str(e)}", exc_info=True)
+            for index, _ in history_records:
+                results[index] = {'index': index, 'filename': results[index]['filename'],
+                                  'error': f'保存历史记录失败: {str(e)}'}
+    
+    elapsed = time.perf_counter() - start
+    succeeded = sum(1 for item in results if 'result' in item)
+    return jsonify({
+        'results': results,
+        'stats': {
+            'total': len(files),
+            'succeeded': succeeded,
+            'failed': len(files) - succeeded,
+            'batchCommits': batch_commits,
+            'elapsedMs': round(elapsed * 1000, 1),
+            'imagesPerSecond': round(len(files) / elapsed, 2) if elapsed > 0 else None
+        }
+    }), 200
+
+# 异步任务：在任务队列中执行完整的分析流水线
+def _run_analysis_job(user_id, file_data, filename, client):
+    response_data, _ = run_analysis_pipeline(user_id, file_data, filename, client, persist='sync')
+    return response_data
+
+def _job_payload(job):
+    payload = {
+        'jobId': job['id'],
+        'status': job['status']
+    }
+    if job['status'] == 'succeeded':
+        payload['result'] = job['result']
+    elif job['status'] == 'failed':
+        payload['error'] = f"图片分析失败: {job['error']}"
+    return payload
+
+def _get_user_job(user, job_id):
+    job = get_job_queue('analyze').get(job_id)
+    if not job or job['user_id'] != user['id']:
+        return None
+    return job
+
+# 查询异步分析任务状态
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_analysis_job(user, job_id):
+    job = _get_user_job(user, job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    return jsonify(_job_payload(job)), 200
+
+# 通过SSE订阅异步分析任务的状态变化
+@bp.route('/jobs/<job_id>/events', methods=['GET'])
+@token_required
+def stream_analysis_job(user, job_id):
+    job = _get_user_job(user, job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    queue = get_job_queue('analyze')
+    
+    def generate():
+        last_updated_at = None
+        while True:
+            current = queue.wait(job_id, last_updated_at)
+            if current is None:
+                yield 'event: error\ndata: {"error": "任务不存在"}\n\n'
+                return
+            if current['updated_at'] == last_updated_at:
+                # 没有状态变化时发送注释保持连接
+                yield ': keep-alive\n\n'
+                continue
+            last_updated_at = current['updated_at']
+            yield f"event: {current['status']}\ndata: {json.dumps(_job_payload(current), ensure_ascii=False)}\n\n"
+            if current['status'] in ('succeeded', 'failed'):
+                return
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
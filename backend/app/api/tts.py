@@ -1,56 +1,123 @@
-from flask import Blueprint, request, jsonify, send_file
-import os
-import io
-import tempfile
-import openai
+from flask import Blueprint, request, jsonify, send_file, current_app
+import re
 from app.api.wordbook import token_required
+from app.utils.openai_client import get_openai_client
+from app.utils.tts_cache import audio_cache_key, get_audio_cache
+from app.utils.metrics import span
+from app.utils.admission import get_admission, AdmissionRejected, rejection_response
 
 bp = Blueprint('tts', __name__, url_prefix='/api/tts')
 
+TTS_MODEL = "gpt-4o-mini-tts"
+TTS_VOICE = "alloy"
+TTS_INSTRUCTIONS = "你是一名日语老师，请用日语读出以下文本:"
+
+# 音频按内容寻址，内容不会变化，可以长期缓存
+AUDIO_MAX_AGE = 365 * 24 * 3600
+
+AUDIO_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+def _audio_response(key, data=None):
+    """返回缓存的音频，支持ETag条件请求和Range分段请求"""
+    cache = get_audio_cache()
+
+    if data is None:
+        data = cache.get_memory(key)
+
+    if data is None:
+        # 磁盘命中时直接发送文件，不再复制到内存
+        path = cache.get_path(key)
+        if path:
+            response = send_file(
+                path,
+                mimetype="audio/mpeg",
+                as_attachment=True,
+                download_name="speech.mp3",
+                conditional=True,
+                etag=key,
+                max_age=AUDIO_MAX_AGE
+            )
+            response.headers['X-Audio-Key'] = key
+            response.cache_control.immutable = True
+            return response
+        data = cache.get(key)
+
+    if data is None:
+        return None
+
+    response = current_app.response_class(data, mimetype="audio/mpeg")
+    response.headers['Content-Disposition'] = 'attachment; filename=speech.mp3'
+    response.headers['X-Audio-Key'] = key
+    response.set_etag(key)
+    response.cache_control.public = True
+    response.cache_control.max_age = AUDIO_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
 # 文本转语音
 @bp.route('/speak', methods=['POST'])
 @token_required
 def text_to_speech(user):
     data = request.get_json()
-    
+
     if not data or 'text' not in data:
         return jsonify({'error': '没有提供文本'}), 400
-    
+
     text = data['text']
-    
-    # 获取OpenAI API密钥
-    from dotenv import load_dotenv
-    load_dotenv(override=True)
-    api_key = os.environ.get('OPENAI_API_KEY')
-    
-    if not api_key:
+
+    # 相同文本的语音在所有用户之间共享缓存
+    key = audio_cache_key(text, TTS_VOICE, TTS_MODEL, TTS_INSTRUCTIONS)
+    with span('tts_cache.lookup'):
+        response = _audio_response(key)
+    if response is not None:
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    # 获取共享的OpenAI客户端
+    client = get_openai_client()
+
+    if client is None:
         return jsonify({'error': 'OpenAI API密钥未配置'}), 500
-    
+
+    # 缓存未命中才消耗用户限额和TTS并发名额
+    try:
+        ticket = get_admission().acquire(user['id'], 'tts')
+    except AdmissionRejected as e:
+        return rejection_response(e)
+
     try:
-        openai.api_key = api_key
-        
-        # 创建临时文件存储音频数据
-        temp_file = tempfile.NamedTemporaryFile(delete=False)
-        
         # 调用OpenAI TTS API生成语音
-        response = openai.audio.speech.create(
-            instructions="你是一名日语老师，请用日语读出以下文本:",
-            model="gpt-4o-mini-tts",
-            voice="alloy",
-            input=text,
-        )
-        
-        # 保存音频数据到临时文件
-        temp_file.write(response.content)
-        temp_file.close()
-        
-        # 发送音频文件
-        return send_file(
-            temp_file.name,
-            mimetype="audio/mpeg",
-            as_attachment=True,
-            download_name="speech.mp3"
-        )
-        
+        try:
+            with span('openai.tts'):
+                speech = client.audio.speech.create(
+                    instructions=TTS_INSTRUCTIONS,
+                    model=TTS_MODEL,
+                    voice=TTS_VOICE,
+                    input=text,
+                )
+                audio_data = speech.content
+        finally:
+            ticket.release()
+
+        # 写入缓存后直接从内存发送，不再创建临时文件
+        with span('tts_cache.set'):
+            get_audio_cache().set(key, audio_data)
+
+        response = _audio_response(key, audio_data)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+
     except Exception as e:
         return jsonify({'error': f'生成语音失败: {str(e)}'}), 500
+
+# 按内容地址获取已生成的语音，可直接作为<audio>的src并支持拖动播放
+@bp.route('/audio/<key>', methods=['GET'])
+def get_audio(key):
+    if not AUDIO_KEY_PATTERN.match(key):
+        return jsonify({'error': '无效的音频标识'}), 400
+
+    response = _audio_response(key)
+    if response is None:
+        return jsonify({'error': '音频不存在'}), 404
+
+    return response
@@ -1,58 +1,73 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, g, Response, stream_with_context, make_response
 import jwt
 from functools import wraps
+from werkzeug.exceptions import HTTPException
 import os
-from app.utils.firebase_utils import add_word, update_word, delete_word, get_words_by_user
+import time
+import hashlib
+import logging
+from app.utils.cache import MemoryCache
+from app.utils.collection_version import get_collection_version, collection_etag, etag_matches
+from app.utils.firebase_utils import (add_word, add_words, update_word, delete_word, get_words_by_user, get_words_page,
+                                      InvalidCursorError, WordExistsError, import_words, iter_words_by_user)
+from app.utils.wordbook_io import (IMPORT_FORMATS, EXPORT_FORMATS, detect_format, prepare_import_stream,
+                                   iter_import_rows, iter_export_chunks)
 
 bp = Blueprint('wordbook', __name__, url_prefix='/api/wordbook')
+logger = logging.getLogger(__name__)
+
+# 已验证令牌的缓存，在令牌过期前跳过重复的签名校验
+_verified_tokens = MemoryCache(max_entries=int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000)), ttl=300)
+
+def _token_cache_key(token, secret_key):
+    # 密钥变更后旧的缓存自动失效
+    return hashlib.sha256(f"{secret_key}:{token}".encode('utf-8')).hexdigest()
 
 # JWT认证装饰器
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        print('------- 单词本接口认证开始 -------')
         auth_header = request.headers.get('Authorization')
         
         if not auth_header:
-            print('错误: Authorization 头部缺失')
+            logger.debug('认证失败: Authorization 头部缺失')
             return jsonify({'error': '未提供授权头部'}), 401
         
         if not auth_header.startswith('Bearer '):
-            print(f'错误: Authorization 格式不正确: {auth_header}')
+            logger.debug('认证失败: Authorization 格式不正确')
             return jsonify({'error': '授权令牌格式不正确 (应为 Bearer token)'}), 401
         
         token = auth_header.split(' ')[1]
-        print(f'收到的令牌: {token[:20]}...{token[-10:] if len(token) > 30 else ""}')
         
         try:
             # 获取密钥
             secret_key = current_app.config.get('SECRET_KEY') or os.environ.get('SECRET_KEY')
             if not secret_key:
-                print('错误: SECRET_KEY 未设置')
+                logger.error('SECRET_KEY 未设置')
                 return jsonify({'error': 'SECRET_KEY 配置缺失'}), 500
             
-            print(f'尝试使用密钥解码令牌 (密钥前10个字符: {secret_key[:10] if secret_key else "None"})')
-            
-            # 解码令牌
-            try:
-                payload = jwt.decode(token, secret_key, algorithms=['HS256'])
-                print(f'令牌解码成功: {payload}')
-                user_id = payload['user_id']
-            except jwt.ExpiredSignatureError:
-                print('错误: 令牌已过期')
-                return jsonify({'error': '令牌已过期'}), 401
-            except jwt.InvalidTokenError as e:
-                print(f'错误: 无效的令牌 (JWT格式错误): {str(e)}')
-                return jsonify({'error': '无效的令牌', 'details': str(e)}), 401
-            except KeyError as e:
-                print(f'错误: 令牌中缺少必要字段: {str(e)}')
-                return jsonify({'error': f'令牌中缺少 {str(e)} 字段'}), 401
-            except Exception as e:
-                print(f'错误: 解码令牌时发生未知错误: {str(e)}')
-                return jsonify({'error': '令牌验证失败', 'details': str(e)}), 401
+            cache_key = _token_cache_key(token, secret_key)
+            user = _verified_tokens.get(cache_key)
             
-            # 直接使用令牌中的信息构建用户数据
-            try:
+            if user is None:
+                # 解码令牌
+                try:
+                    payload = jwt.decode(token, secret_key, algorithms=['HS256'])
+                    user_id = payload['user_id']
+                except jwt.ExpiredSignatureError:
+                    logger.debug('认证失败: 令牌已过期')
+                    return jsonify({'error': '令牌已过期'}), 401
+                except jwt.InvalidTokenError as e:
+                    logger.debug(f'认证失败: 无效的令牌: {str(e)}')
+                    return jsonify({'error': '无效的令牌', 'details': str(e)}), 401
+                except KeyError as e:
+                    logger.debug(f'认证失败: 令牌中缺少必要字段: {str(e)}')
+                    return jsonify({'error': f'令牌中缺少 {str(e)} 字段'}), 401
+                except Exception as e:
+                    logger.warning(f'解码令牌时发生未知错误: {str(e)}')
+                    return jsonify({'error': '令牌验证失败', 'details': str(e)}), 401
+                
+                # 直接使用令牌中的信息构建用户数据
                 user = {
                     'id': user_id,
                     'name': payload.get('name', '用户'),
@@ -60,24 +75,105 @@ def token_required(f):
                     'profile_picture': payload.get('profile_picture', '')
                 }
                 
-                print(f'用户验证成功: {user["id"]}')
-            except Exception as e:
-                print(f'错误: 获取用户信息时出错: {str(e)}')
-                return jsonify({'error': '获取用户信息失败', 'details': str(e)}), 500
+                # 缓存到令牌过期为止，没有过期时间的令牌使用默认TTL
+                exp = payload.get('exp')
+                ttl = exp - time.time() if isinstance(exp, (int, float)) else None
+                if ttl is None or ttl > 0:
+                    _verified_tokens.set(cache_key, user, ttl=ttl)
             
-            print('------- 单词本接口认证成功 -------')
-            return f(user, *args, **kwargs)
+            logger.debug(f'用户验证成功: {user["id"]}')
+            g.user = user
+            return f(dict(user), *args, **kwargs)
             
+        except HTTPException:
+            # 请求体过大(413)等由Flask统一处理
+            raise
         except Exception as e:
-            print(f'错误: 处理认证过程中发生意外错误: {str(e)}')
+            logger.error(f'处理认证过程中发生意外错误: {str(e)}')
             return jsonify({'error': '认证过程中发生错误', 'details': str(e)}), 500
     
     return decorated
 
+# 不要求登录的接口获取当前用户ID，没有有效令牌时返回None
+def optional_user_id():
+    auth_header = request.headers.get('Authorization') or ''
+    secret_key = current_app.config.get('SECRET_KEY') or os.environ.get('SECRET_KEY')
+    if not auth_header.startswith('Bearer ') or not secret_key:
+        return None
+    token = auth_header.split(' ')[1]
+    user = _verified_tokens.get(_token_cache_key(token, secret_key))
+    if user is not None:
+        return user['id']
+    try:
+        return jwt.decode(token, secret_key, algorithms=['HS256']).get('user_id')
+    except jwt.InvalidTokenError:
+        return None
+
+# 解析分页参数，未提供 limit 和 cursor 时返回None，保持返回完整列表的旧行为
+def parse_page_args():
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return None
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        raise ValueError('limit 必须是整数')
+    fields = request.args.get('fields')
+    return {
+        'limit': limit,
+        'cursor': request.args.get('cursor') or None,
+        'fields': [field.strip() for field in fields.split(',') if field.strip()] if fields else None
+    }
+
+# 分页查询并构建响应
+def paged_response(fetch_page, user_id, transform=None):
+    try:
+        page_args = parse_page_args()
+        if page_args is None:
+            return None
+        items, next_cursor = fetch_page(user_id, **page_args)
+    except (InvalidCursorError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    if transform:
+        items = transform(items)
+    return jsonify({'items': items, 'nextCursor': next_cursor}), 200
+
+# 列表接口的条件请求：集合版本未变化时直接返回304，不查询列表也不序列化
+# 需要放在 token_required 之后
+def versioned_list(collection):
+    def decorator(f):
+        @wraps(f)
+        def decorated(user, *args, **kwargs):
+            # 条件请求必须使用最新的版本号，否则其他进程刚写入的数据会返回304
+            version = get_collection_version(user['id'], collection, fresh=bool(request.if_none_match))
+            etag = collection_etag(user['id'], collection, version, request.full_path)
+            
+            matched = etag_matches(request.if_none_match, etag)
+            if matched:
+                response = current_app.response_class(status=304)
+                etag = matched
+            else:
+                response = make_response(f(user, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            response.set_etag(etag)
+            # 浏览器每次都需要验证，内容按用户区分
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Authorization')
+            return response
+        return decorated
+    return decorator
+
 # 获取单词列表
+# 支持 ?limit=&cursor=&fields= 分页参数，分页时返回 {items, nextCursor}
 @bp.route('', methods=['GET'])
 @token_required
+@versioned_list('words')
 def get_wordbook(user):
+    response = paged_response(get_words_page, user['id'])
+    if response is not None:
+        return response
+    
     words = get_words_by_user(user['id'])
     return jsonify(words), 200
 
@@ -90,23 +186,42 @@ def add_new_word(user):
     if not data or not all(k in data for k in ('word', 'kana', 'meaning')):
         return jsonify({'error': '缺少必要参数'}), 400
     
-    # 准备单词数据
+    # 准备单词数据，单词和假名去除首尾空白
     word_data = {
-        'word': data['word'],
-        'kana': data['kana'],
+        'word': str(data['word'] or '').strip(),
+        'kana': str(data['kana'] or '').strip(),
         'meaning': data['meaning']
     }
+    if not word_data['word']:
+        return jsonify({'error': '缺少必要参数'}), 400
     
-    # 尝试添加单词
-    word_id = add_word(user['id'], word_data['word'], word_data['kana'], word_data['meaning'])
+    # 添加是幂等的，同一个单词重复添加返回相同的ID，已有的释义不会被覆盖
+    saved, created = add_word(user['id'], word_data['word'], word_data['kana'], word_data['meaning'])
     
-    # 返回添加的单词数据
+    # 返回保存的单词数据，单词已存在时返回原有的释义和200
+    return jsonify(dict(saved, user_id=user['id'], created=created)), 201 if created else 200
+
+# 批量添加单词，例如一次保存图片中识别出的全部单词
+@bp.route('/add/batch', methods=['POST'])
+@token_required
+def add_words_batch(user):
+    data = request.get_json()
+    words = data.get('words') if isinstance(data, dict) else None
+    
+    if not isinstance(words, list) or not words:
+        return jsonify({'error': '没有提供单词'}), 400
+    
+    max_words = int(os.environ.get('WORDBOOK_BATCH_MAX_WORDS', 500))
+    if len(words) > max_words:
+        return jsonify({'error': f'单次最多添加{max_words}个单词'}), 400
+    
+    if not all(isinstance(item, dict) and isinstance(item.get('word'), str) and item['word'].strip() for item in words):
+        return jsonify({'error': '每个单词都需要提供 word'}), 400
+    
+    word_ids, saved = add_words(user['id'], words)
     return jsonify({
-        'id': word_id,
-        'word': word_data['word'],
-        'kana': word_data['kana'],
-        'meaning': word_data['meaning'],
-        'user_id': user['id']
+        'ids': word_ids,
+        'saved': saved
     }), 201
 
 # 更新单词
@@ -129,8 +244,11 @@ def update_word_api(user, word_id):
     
     # 更新单词
     try:
-        update_word(word_id, update_data)
+        # 修改单词或假名后单词ID会改变，返回新的ID
+        word_id = update_word(word_id, update_data, user_id=user['id'])
         return jsonify({'message': '单词更新成功', 'id': word_id}), 200
+    except WordExistsError as e:
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 404
 
@@ -139,7 +257,48 @@ def update_word_api(user, word_id):
 @token_required
 def delete_word_api(user, word_id):
     try:
-        delete_word(word_id)
+        delete_word(word_id, user_id=user['id'])
         return jsonify({'message': '单词已删除'}), 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 404
\ No newline at end of file
+        return jsonify({'error': str(e)}), 404
+
+# 批量导入单词，支持CSV、TSV和Anki导出的纯文本文件
+@bp.route('/import', methods=['POST'])
+@token_required
+def import_wordbook(user):
+    if 'file' not in request.files:
+        return jsonify({'error': '没有文件'}), 400
+    
+    file = request.files['file']
+    fmt = detect_format(file.filename, request.args.get('format') or request.form.get('format'))
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': f'不支持的格式: {fmt}'}), 400
+    
+    # 编码错误时在写入任何单词之前返回
+    stream, bad_line = prepare_import_stream(file.stream)
+    if bad_line is not None:
+        return jsonify({'error': f'文件必须是UTF-8编码(第{bad_line}行无法解码)', 'line': bad_line,
+                        'imported': 0, 'duplicates': 0}), 400
+    
+    try:
+        imported, duplicates = import_words(user['id'], iter_import_rows(stream, fmt))
+    except UnicodeDecodeError:
+        return jsonify({'error': '文件必须是UTF-8编码'}), 400
+    except Exception as e:
+        return jsonify({'error': f'导入失败: {str(e)}'}), 500
+    
+    return jsonify({'imported': imported, 'duplicates': duplicates}), 200
+
+# 导出单词，边读取边输出，不在内存中保存完整列表
+@bp.route('/export', methods=['GET'])
+@token_required
+def export_wordbook(user):
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'不支持的格式: {fmt}'}), 400
+    
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    chunks = iter_export_chunks(iter_words_by_user(user['id']), fmt)
+    return Response(stream_with_context(chunks), mimetype=f'{mimetype}; charset=utf-8', headers={
+        'Content-Disposition': f'attachment; filename=wordbook.{extension}'
+    })
@@ -0,0 +1,124 @@
+import os
+import logging
+import importlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 服务账号密钥默认放在后端根目录
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Firebase客户端在第一次使用时才创建，导入应用和启动进程时不连接外部服务
+# OpenAI客户端由 app.utils.openai_client 按同样的方式延迟创建，并支持密钥热更新
+_factories = {}
+_instances = {}
+_lock = threading.RLock()
+
+
+def register(name, factory):
+    """注册服务工厂，服务在第一次 get 时才创建"""
+    _factories[name] = factory
+
+
+def get(name):
+    """获取服务实例，首次调用时创建，之后复用；创建失败时抛出异常，下次调用会重试"""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        instance = _instances.get(name)
+        if instance is None:
+            instance = _factories[name]()
+            _instances[name] = instance
+    return instance
+
+
+def override(name, instance):
+    """直接指定服务实例，用于测试和基准环境注入替身"""
+    with _lock:
+        _instances[name] = instance
+
+
+def reset(name=None):
+    """丢弃已创建的服务实例，下次使用时重新创建"""
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+
+def _credentials_path():
+    path = os.environ.get('FIREBASE_CREDENTIALS', 'firebase-key.json')
+    if not os.path.isabs(path) and not os.path.exists(path):
+        # 兼容从其他目录启动时使用后端根目录下的密钥文件
+        path = os.path.join(BACKEND_DIR, path)
+    return path
+
+
+def _create_firebase_app():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    try:
+        return firebase_admin.get_app()
+    except ValueError:
+        pass
+
+    cred_path = _credentials_path()
+    bucket_name = os.environ.get('FIREBASE_STORAGE_BUCKET', 'shiru-pic.firebasestorage.app')
+    try:
+        app = firebase_admin.initialize_app(credentials.Certificate(cred_path), {
+            'storageBucket': bucket_name,
+            'projectId': os.environ.get('FIREBASE_PROJECT_ID', 'shiru-pic')
+        })
+    except Exception as e:
+        logger.error(f"Firebase初始化错误: {str(e)}")
+        raise
+    logger.info('Firebase Admin SDK 初始化成功')
+    return app
+
+
+def _create_firestore():
+    from firebase_admin import firestore
+    return firestore.client(app=get('firebase_app'))
+
+
+def _create_storage_bucket():
+    from firebase_admin import storage
+    return storage.bucket(app=get('firebase_app'))
+
+
+register('firebase_app', _create_firebase_app)
+register('firestore', _create_firestore)
+register('storage', _create_storage_bucket)
+
+
+def get_firebase_app():
+    return get('firebase_app')
+
+
+def get_firestore():
+    """Firestore客户端，第一次使用时初始化Firebase"""
+    return get('firestore')
+
+
+def get_storage_bucket():
+    """Firebase Storage存储桶，第一次使用时初始化Firebase"""
+    return get('storage')
+
+
+class LazyModule:
+    """
+    延迟导入的模块代理，第一次访问属性时才真正导入
+    用于 firebase_admin.firestore 等导入耗时较长、只在处理请求时才用到的模块
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
@@ -0,0 +1,222 @@
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+from app.utils.metrics import Counter, register_metric, METRIC_PREFIX
+
+# 受保护的上游及默认限额: (每分钟令牌数, 突发容量, 全局并发上限)
+UPSTREAMS = {
+    'vision': (20, 5, 16),
+    'chat': (60, 20, 32),
+    'tts': (60, 20, 16),
+}
+
+rejections = register_metric(Counter(f'{METRIC_PREFIX}_admission_rejected_total',
+                                     '准入控制拒绝的请求数', ('upstream', 'reason')))
+
+
+class AdmissionRejected(Exception):
+    """请求被准入控制拒绝，status 为 429(用户超出限额) 或 503(上游并发已满)"""
+
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """按 (上游, 用户) 划分的令牌桶，长时间不活跃的用户按LRU淘汰(淘汰后视为令牌已满)"""
+
+    def __init__(self, max_users=100000):
+        self.max_users = max_users
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate_per_minute, burst, cost=1):
+        """
+        尝试取出 cost 个令牌，成功返回0，否则返回需要等待的秒数
+        rate_per_minute 为0时不限制
+        """
+        if rate_per_minute <= 0:
+            return 0
+        rate = rate_per_minute / 60.0
+        capacity = max(burst, cost)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def refund(self, key, burst, cost=1):
+        with self._lock:
+            if key in self._buckets:
+                tokens, last = self._buckets[key]
+                self._buckets[key] = (min(max(burst, cost), tokens + cost), last)
+
+
+class ConcurrencyLimit:
+    """全局并发上限，limit为0时不限制"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, count=1, timeout=0):
+        if self.limit <= 0:
+            return True
+        count = min(count, self.limit)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight + count > self.limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += count
+        return True
+
+    def release(self, count=1):
+        if self.limit <= 0:
+            return
+        count = min(count, self.limit)
+        with self._cond:
+            self.in_flight -= count
+            self._cond.notify_all()
+
+
+class Ticket:
+    """已获准的请求，处理完成后调用 release 归还并发名额，可重复调用"""
+
+    def __init__(self, limit=None, slots=0):
+        self._limit = limit
+        self._slots = slots
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        if self._limit is not None and self._slots:
+            self._limit.release(self._slots)
+
+
+class Admission:
+    """
+    进程内准入控制：每个用户在每个上游有独立的令牌桶，每个上游有全局并发上限
+    多进程部署时限额按进程计算
+    """
+
+    def __init__(self, limits, queue_timeout=0, retry_after=2, max_users=100000):
+        self.limits = limits
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._buckets = TokenBuckets(max_users)
+        self._concurrency = {upstream: ConcurrencyLimit(limit[2]) for upstream, limit in limits.items()}
+
+    def check_rate(self, user_id, upstream, cost=1):
+        """只检查并扣除用户令牌，超出限额时抛出 AdmissionRejected(429)"""
+        rate, burst, _ = self.limits[upstream]
+        wait = self._buckets.take((upstream, user_id), rate, burst, cost)
+        if wait > 0:
+            rejections.inc((upstream, 'rate_limited'))
+            raise AdmissionRejected(429, '请求过于频繁，请稍后再试', math.ceil(wait))
+
+    def acquire(self, user_id, upstream, cost=1, slots=1):
+        """
+        扣除用户令牌并占用上游并发名额，返回 Ticket
+        用户超出限额时抛出 429，上游并发已满时抛出 503 并退还令牌
+        """
+        self.check_rate(user_id, upstream, cost)
+        if slots <= 0:
+            return Ticket()
+        limit = self._concurrency[upstream]
+        if not limit.acquire(slots, self.queue_timeout):
+            self.refund(user_id, upstream, cost)
+            rejections.inc((upstream, 'overloaded'))
+            raise AdmissionRejected(503, '服务繁忙，请稍后再试', self.retry_after)
+        return Ticket(limit, slots)
+
+    def refund(self, user_id, upstream, cost=1):
+        """退还 check_rate 扣除的令牌，用于请求在调用上游之前被拒绝的情况"""
+        _, burst, _ = self.limits[upstream]
+        self._buckets.refund((upstream, user_id), burst, cost)
+
+    def in_flight(self, upstream):
+        return self._concurrency[upstream].in_flight
+
+
+class NoAdmission:
+    """关闭准入控制"""
+
+    def check_rate(self, user_id, upstream, cost=1):
+        pass
+
+    def acquire(self, user_id, upstream, cost=1, slots=1):
+        return Ticket()
+
+    def refund(self, user_id, upstream, cost=1):
+        pass
+
+    def in_flight(self, upstream):
+        return 0
+
+
+_admission = None
+_admission_lock = threading.Lock()
+
+
+def _limits_from_env():
+    limits = {}
+    for upstream, (rate, burst, concurrency) in UPSTREAMS.items():
+        prefix = upstream.upper()
+        limits[upstream] = (
+            float(os.environ.get(f'{prefix}_RATE_PER_MINUTE', rate)),
+            float(os.environ.get(f'{prefix}_BURST', burst)),
+            int(os.environ.get(f'{prefix}_MAX_CONCURRENCY', concurrency)),
+        )
+    return limits
+
+
+def get_admission():
+    """
+    获取进程共享的准入控制器
+    ADMISSION_ENABLED: 设为false关闭
+    {VISION|CHAT|TTS}_RATE_PER_MINUTE / _BURST / _MAX_CONCURRENCY: 各上游的限额，0表示不限制
+    ADMISSION_QUEUE_TIMEOUT: 并发已满时等待名额的秒数(默认0，立即拒绝)
+    ADMISSION_RETRY_AFTER: 并发已满时返回的 Retry-After 秒数(默认2)
+    """
+    global _admission
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                if os.environ.get('ADMISSION_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+                    _admission = NoAdmission()
+                else:
+                    _admission = Admission(
+                        _limits_from_env(),
+                        queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 0)),
+                        retry_after=int(os.environ.get('ADMISSION_RETRY_AFTER', 2)),
+                        max_users=int(os.environ.get('ADMISSION_MAX_USERS', 100000))
+                    )
+    return _admission
+
+
+def rejection_response(error):
+    """将 AdmissionRejected 转换为带 Retry-After 的JSON响应"""
+    from flask import jsonify
+    return jsonify({'error': error.message, 'retryAfter': error.retry_after}), error.status, {
+        'Retry-After': str(error.retry_after)
+    }
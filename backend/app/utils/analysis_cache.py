@@ -0,0 +1,90 @@
+import os
+import copy
+import logging
+from app.utils.cache import create_cache
+
+logger = logging.getLogger(__name__)
+
+# 图片分析结果缓存，后端由 ANALYSIS_CACHE_BACKEND 等环境变量配置
+_cache = create_cache('ANALYSIS_CACHE', default_dir='.cache/analysis', default_collection='analysis_cache')
+
+# 感知哈希(128位)分成4段分别建立索引，汉明距离不超过3时至少有一段完全相同
+PHASH_BANDS = 4
+PHASH_MAX_DISTANCE = min(int(os.environ.get('ANALYSIS_CACHE_PHASH_DISTANCE', 3)), PHASH_BANDS - 1)
+
+# 每段索引最多保留的候选图片数，超出时淘汰最早加入的
+PHASH_BUCKET_SIZE = 16
+
+
+def _content_key(content_hash):
+    return f"sha256:{content_hash}"
+
+
+def _band_keys(perceptual_hash):
+    width = len(perceptual_hash) // PHASH_BANDS
+    return [f"phash:{i}:{perceptual_hash[i * width:(i + 1) * width]}" for i in range(PHASH_BANDS)]
+
+
+def _band_entry(perceptual_hash, content_hash):
+    """索引条目保存为 "感知哈希:内容哈希" 字符串，Firestore不支持数组嵌套数组"""
+    return f"{perceptual_hash}:{content_hash}"
+
+
+def hamming_distance(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+def _find_similar(perceptual_hash):
+    """按感知哈希的各段查找候选图片，返回汉明距离最小且不超过阈值的分析结果"""
+    candidates = {}
+    for band_key in _band_keys(perceptual_hash):
+        for entry in _cache.get(band_key) or []:
+            if not isinstance(entry, str) or ':' not in entry:
+                continue
+            stored_hash, content_hash = entry.split(':', 1)
+            distance = hamming_distance(perceptual_hash, stored_hash)
+            if distance <= PHASH_MAX_DISTANCE:
+                candidates.setdefault(content_hash, distance)
+    for content_hash, _ in sorted(candidates.items(), key=lambda item: item[1]):
+        result = _cache.get(_content_key(content_hash))
+        if result is not None:
+            return result
+    return None
+
+
+def get_cached_analysis(content_hash, perceptual_hash):
+    """
+    查找图片分析结果，先按内容哈希精确匹配，再按感知哈希的汉明距离匹配重新压缩过的相同图片
+    纹理太少的图片没有感知哈希，只能精确匹配
+    返回 (result, matched_by)，未命中时返回 (None, None)
+    """
+    if _cache is None:
+        return None, None
+    try:
+        result = _cache.get(_content_key(content_hash))
+        if result is not None:
+            return copy.deepcopy(result), 'sha256'
+        if perceptual_hash:
+            result = _find_similar(perceptual_hash)
+            if result is not None:
+                return copy.deepcopy(result), 'phash'
+    except Exception as e:
+        logger.warning(f"读取分析缓存失败: {str(e)}")
+    return None, None
+
+
+def set_cached_analysis(content_hash, perceptual_hash, result):
+    """保存图片分析结果，出错或解析失败时的模拟数据不缓存"""
+    if _cache is None or not result or 'error' in result or result.get('_fallback'):
+        return
+    try:
+        _cache.set(_content_key(content_hash), copy.deepcopy(result))
+        if not perceptual_hash:
+            return
+        # 各段索引只保存 (感知哈希, 内容哈希)，结果本身只保存一份
+        # 原子地加入条目，并发分析相似图片时不会丢失彼此的条目
+        entry = _band_entry(perceptual_hash, content_hash)
+        for band_key in _band_keys(perceptual_hash):
+            _cache.add_member(band_key, entry, max_members=PHASH_BUCKET_SIZE)
+    except Exception as e:
+        logger.warning(f"写入分析缓存失败: {str(e)}")
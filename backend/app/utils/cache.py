@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCache:
+    """进程内LRU缓存，支持TTL过期与条目数上限"""
+
+    def __init__(self, max_entries=1024, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else 0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def add_member(self, key, member, max_members=None, ttl=None):
+        """原子地把字符串加入列表值的末尾(已存在时不重复加入)，超过 max_members 时丢弃最早的成员"""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            item = self._data.get(key)
+            members = list(item[1]) if item and (not item[0] or item[0] >= time.time()) else []
+            if member not in members:
+                members.append(member)
+            if max_members:
+                members = members[-max_members:]
+            self._data[key] = (time.time() + ttl if ttl else 0, members)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DiskCache:
+    """磁盘缓存，每个条目一个JSON文件，按最近访问时间淘汰"""
+
+    def __init__(self, directory, max_entries=10000, ttl=86400):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._member_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._count = len(self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _entries(self):
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')]
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                item = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if item.get('expires_at') and item['expires_at'] < time.time():
+            self.delete(key)
+            return None
+        # 更新访问时间，作为LRU依据
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return item.get('value')
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        item = {'key': key, 'expires_at': time.time() + ttl if ttl else 0, 'value': value}
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(item, f, ensure_ascii=False)
+        existed = os.path.exists(path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if not existed:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self._entries():
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        entries.sort()
+        # 一次淘汰10%，避免每次写入都扫描目录
+        overflow = len(entries) - int(self.max_entries * 0.9)
+        for _, path in entries[:max(overflow, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._count = len(entries) - max(overflow, 0)
+
+    def add_member(self, key, member, max_members=None, ttl=None):
+        """把字符串加入列表值的末尾(已存在时不重复加入)，同一进程内的并发调用不会互相覆盖"""
+        with self._member_lock:
+            members = list(self.get(key) or [])
+            if member not in members:
+                members.append(member)
+            if max_members:
+                members = members[-max_members:]
+            self.set(key, members, ttl)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+            with self._lock:
+                self._count = max(self._count - 1, 0)
+        except OSError:
+            pass
+
+    def clear(self):
+        for path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._count = 0
+
+
+class FirestoreCache:
+    """
+    Firestore缓存，多实例共享；过期条目在读取时删除
+    expires_at 为Timestamp字段，需要在集合上开启以 expires_at 为字段的TTL策略，由Firestore删除过期文档来限制数量
+    """
+
+    def __init__(self, collection, ttl=86400):
+        self.collection = collection
+        self.ttl = ttl
+
+    def _ref(self, key):
+        from app.services import get_firestore
+        doc_id = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return get_firestore().collection(self.collection).document(doc_id)
+
+    def get(self, key):
+        doc = self._ref(key).get()
+        if not doc.exists:
+            return None
+        item = doc.to_dict()
+        if self._expired(item.get('expires_at')):
+            self.delete(key)
+            return None
+        return item.get('value')
+
+    @staticmethod
+    def _expired(expires_at):
+        if not expires_at:
+            return False
+        # 兼容之前以浮点数时间戳保存的条目
+        if isinstance(expires_at, (int, float)):
+            return expires_at < time.time()
+        return expires_at < datetime.now(timezone.utc)
+
+    def _expires_at(self, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        return datetime.now(timezone.utc) + timedelta(seconds=ttl) if ttl else None
+
+    def set(self, key, value, ttl=None):
+        self._ref(key).set({
+            'key': key,
+            'value': value,
+            'expires_at': self._expires_at(ttl)
+        })
+
+    def add_member(self, key, member, max_members=None, ttl=None):
+        """
+        用 ArrayUnion 把字符串加入数组字段，多个实例并发加入时不会互相覆盖
+        超过 max_members 时再用 ArrayRemove 删除最早的成员
+        """
+        from google.cloud.firestore_v1 import transforms
+        ref = self._ref(key)
+        ref.set({
+            'key': key,
+            'value': transforms.ArrayUnion([member]),
+            'expires_at': self._expires_at(ttl)
+        }, merge=True)
+        if not max_members:
+            return
+        members = (ref.get().to_dict() or {}).get('value') or []
+        if len(members) > max_members:
+            ref.update({'value': transforms.ArrayRemove(members[:-max_members])})
+
+    def delete(self, key):
+        self._ref(key).delete()
+
+    def clear(self, page_size=500):
+        """分页删除集合中的全部缓存文档，每页一次批量提交"""
+        from app.services import get_firestore
+        db = get_firestore()
+        # select([]) 在Python客户端中表示不投影，只取文档名才能避免读取完整文档
+        query = db.collection(self.collection).select(['__name__']).limit(page_size)
+        while True:
+            docs = list(query.stream())
+            if not docs:
+                return
+            batch = db.batch()
+            for doc in docs:
+                batch.delete(doc.reference)
+            batch.commit()
+
+
+def create_cache(prefix, default_dir, default_collection):
+    """
+    根据环境变量创建缓存后端
+    {prefix}_BACKEND: memory / disk / firestore / none
+    {prefix}_TTL: 过期时间(秒)
+    {prefix}_MAX_ENTRIES: 最大条目数
+    {prefix}_DIR: 磁盘缓存目录
+    """
+    backend = os.environ.get(f'{prefix}_BACKEND', 'memory').lower()
+    ttl = int(os.environ.get(f'{prefix}_TTL', 7 * 86400))
+    max_entries = int(os.environ.get(f'{prefix}_MAX_ENTRIES', 2048))
+
+    if backend in ('none', 'off', ''):
+        return None
+    if backend == 'disk':
+        directory = os.environ.get(f'{prefix}_DIR', default_dir)
+        return DiskCache(directory, max_entries=max_entries, ttl=ttl)
+    if backend == 'firestore':
+        return FirestoreCache(os.environ.get(f'{prefix}_COLLECTION', default_collection), ttl=ttl)
+    if backend != 'memory':
+        logger.warning(f"未知的缓存后端 {backend}，使用内存缓存")
+    return MemoryCache(max_entries=max_entries, ttl=ttl)
+
+
+class SingleFlight:
+    """合并并发的相同请求：同一个key同时只执行一次，其余调用等待并共享结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """返回 (结果, 是否共享了其他调用的结果)，fn抛出的异常会传递给所有等待者"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result'], True
+
+        try:
+            call['result'] = fn()
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call['event'].set()
+        return call['result'], False
@@ -0,0 +1,69 @@
+import os
+import uuid
+import hashlib
+from app.services import get_firestore
+from app.utils.cache import MemoryCache
+from app.utils.metrics import span
+
+# 每个用户一个文档，字段为集合名，值为集合最后一次修改时生成的随机版本号
+VERSION_COLLECTION = 'collection_versions'
+
+# 从未记录过版本的用户使用的初始版本
+INITIAL_VERSION = '0'
+
+# 版本号在进程内缓存，只用于生成普通请求响应中的ETag
+# 判断 If-None-Match 时总是读取版本文档，其他进程刚写入的数据不会被误判为未变化
+_versions = MemoryCache(
+    max_entries=int(os.environ.get('COLLECTION_VERSION_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('COLLECTION_VERSION_TTL', 5))
+)
+
+
+def _version_ref(user_id):
+    return get_firestore().collection(VERSION_COLLECTION).document(user_id)
+
+
+def version_writes(user_id, collections):
+    """
+    生成提升集合版本号的写操作，与数据写入放在同一批次提交
+    返回 (写操作, 新版本号)，提交成功后调用 remember_versions 更新本进程缓存
+    """
+    versions = {collection: uuid.uuid4().hex for collection in collections}
+    return ('merge', _version_ref(user_id), versions), versions
+
+
+def remember_versions(user_id, versions):
+    # 数据提交之后才更新缓存，保证新版本号对应的一定是新数据
+    current = dict(_versions.get(user_id) or {})
+    current.update(versions)
+    _versions.set(user_id, current)
+
+
+def get_collection_version(user_id, collection, fresh=False):
+    """fresh 为True时忽略进程内缓存，直接读取版本文档(一次文档读取，仍远比查询列表便宜)"""
+    versions = None if fresh else _versions.get(user_id)
+    if versions is None:
+        with span('firestore.get'):
+            doc = _version_ref(user_id).get()
+        versions = (doc.to_dict() or {}) if doc.exists else {}
+        _versions.set(user_id, versions)
+    return versions.get(collection, INITIAL_VERSION)
+
+
+def collection_etag(user_id, collection, version, request_path):
+    """ETag由用户、集合版本和完整请求路径(含分页等查询参数)决定"""
+    raw = f'{user_id}|{collection}|{version}|{request_path}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def etag_matches(if_none_match, etag):
+    """
+    判断 If-None-Match 是否包含ETag，返回匹配的标签，不匹配时返回None
+    压缩后的响应ETag带有 :gzip / :br 后缀，比较时去掉，304响应原样返回客户端持有的标签
+    """
+    if if_none_match.star_tag:
+        return etag
+    for tag in if_none_match.as_set(include_weak=True):
+        if tag.split(':', 1)[0] == etag:
+            return tag
+    return None
@@ -0,0 +1,184 @@
+import os
+import re
+import sqlite3
+import logging
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 随代码提供的常用词种子词典，格式为 单词<TAB>假名<TAB>中文意思
+SEED_PATH = os.path.join(BACKEND_DIR, 'app', 'data', 'dictionary_seed.tsv')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    surface TEXT NOT NULL,
+    word TEXT NOT NULL,
+    kana TEXT NOT NULL,
+    meaning TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 100,
+    lang TEXT NOT NULL DEFAULT 'chi'
+);
+CREATE INDEX IF NOT EXISTS idx_entries_surface ON entries (surface, priority);
+"""
+
+# 释义的语言，与JMdict的 xml:lang 一样使用ISO 639-2代码
+# 翻译接口的默认提示词输出中文释义，只返回中文释义的词条；其他语言的词条只用于判断同音词是否有歧义
+MEANING_LANG = 'chi'
+
+# 种子词典的词条优先于从JMdict等外部来源导入的词条
+SEED_PRIORITY = 0
+DEFAULT_PRIORITY = 100
+
+
+def to_hiragana(text):
+    """片假名转换为平假名，长音符等其他字符保持不变"""
+    return ''.join(chr(ord(ch) - 0x60) if 'ァ' <= ch <= 'ヶ' else ch for ch in text)
+
+
+def lookup_key(text):
+    """查询键：统一全角半角、去除空白，片假名按平假名匹配"""
+    text = unicodedata.normalize('NFKC', text)
+    return to_hiragana(re.sub(r'\s+', '', text))
+
+
+def entry_rows(word, kana, meaning, priority=DEFAULT_PRIORITY, lang=MEANING_LANG):
+    """一个词条按单词和假名各生成一行，两种写法都能查到"""
+    word = word.strip()
+    kana = kana.strip() or word
+    meaning = meaning.strip()
+    keys = {lookup_key(word), lookup_key(kana)}
+    return [(key, word, kana, meaning, priority, lang) for key in keys if key]
+
+
+def iter_tsv_entries(path, priority=DEFAULT_PRIORITY):
+    """读取 单词<TAB>假名<TAB>中文意思[<TAB>优先级] 格式的词典文件，#开头的行为注释，释义语言为中文"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            columns = line.split('\t')
+            if len(columns) < 3 or not columns[0].strip() or not columns[2].strip():
+                continue
+            row_priority = int(columns[3]) if len(columns) > 3 and columns[3].strip() else priority
+            yield columns[0], columns[1], columns[2], row_priority, MEANING_LANG
+
+
+def create_index(conn):
+    conn.executescript(SCHEMA)
+
+
+def insert_entries(conn, entries):
+    """entries: (word, kana, meaning, priority, lang) 的可迭代对象，返回写入的词条数"""
+    count = 0
+    rows = []
+    for word, kana, meaning, priority, lang in entries:
+        rows.extend(entry_rows(word, kana, meaning, priority, lang))
+        count += 1
+        if len(rows) >= 5000:
+            conn.executemany('INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)', rows)
+            rows = []
+    if rows:
+        conn.executemany('INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)', rows)
+    return count
+
+
+class Dictionary:
+    """
+    基于SQLite的只读词典索引，按单词或假名精确匹配
+    同一个键对应多个不同的 (单词, 假名) 时(例如同音词 はし → 箸 / 橋)无法确定是哪个词，视为未收录；
+    同一个词有多个来源的释义时返回优先级最高的中文释义，只有其他语言的释义时视为未收录
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path):
+        """打开 scripts.build_dictionary 生成的词典文件，没有释义语言的旧文件需要重新生成"""
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(entries)')}
+        if 'lang' not in columns:
+            conn.close()
+            raise ValueError(f'词典文件 {path} 没有释义语言，请用 scripts.build_dictionary 重新生成')
+        return cls(conn)
+
+    @classmethod
+    def from_tsv(cls, path):
+        """没有生成词典文件时，把种子词典加载到内存数据库"""
+        conn = sqlite3.connect(':memory:', check_same_thread=False)
+        create_index(conn)
+        insert_entries(conn, iter_tsv_entries(path, SEED_PRIORITY))
+        conn.commit()
+        return cls(conn)
+
+    def lookup(self, query):
+        """返回 {'word', 'kana', 'meaning'}，未收录或有歧义时返回None"""
+        key = lookup_key(query)
+        if not key:
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT word, kana, meaning, lang FROM entries WHERE surface = ? ORDER BY priority, rowid LIMIT 50',
+                (key,)
+            ).fetchall()
+        if not rows or len({(word, kana) for word, kana, _, _ in rows}) > 1:
+            return None
+        for word, kana, meaning, lang in rows:
+            if lang == MEANING_LANG:
+                return {'word': word, 'kana': kana, 'meaning': meaning}
+        return None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(DISTINCT word || kana) FROM entries').fetchone()[0]
+
+
+_dictionary = None
+_dictionary_lock = threading.Lock()
+_load_failed = False
+
+
+def get_dictionary():
+    """
+    获取进程共享的词典，第一次使用时加载
+    DICTIONARY_ENABLED: 设为false关闭词典，所有查询都调用模型
+    DICTIONARY_PATH: scripts.build_dictionary 生成的词典文件(默认.cache/dictionary.sqlite)，不存在时使用种子词典
+    """
+    global _dictionary, _load_failed
+    if os.environ.get('DICTIONARY_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+        return None
+    if _dictionary is None and not _load_failed:
+        with _dictionary_lock:
+            if _dictionary is None and not _load_failed:
+                path = os.environ.get('DICTIONARY_PATH') or os.path.join(BACKEND_DIR, '.cache', 'dictionary.sqlite')
+                try:
+                    if os.path.exists(path):
+                        try:
+                            _dictionary = Dictionary.open(path)
+                        except ValueError as e:
+                            logger.warning(f"{str(e)}，暂时使用种子词典")
+                            _dictionary = Dictionary.from_tsv(SEED_PATH)
+                    else:
+                        _dictionary = Dictionary.from_tsv(SEED_PATH)
+                    logger.info(f"词典已加载: {len(_dictionary)} 个词条")
+                except Exception as e:
+                    logger.warning(f"加载词典失败，查询将直接调用模型: {str(e)}")
+                    _load_failed = True
+    return _dictionary
+
+
+def lookup_word(query):
+    """在本地词典中查找单词，词典不可用或未收录时返回None"""
+    dictionary = get_dictionary()
+    if dictionary is None:
+        return None
+    try:
+        return dictionary.lookup(query)
+    except Exception as e:
+        logger.warning(f"查询词典失败: {str(e)}")
+        return None
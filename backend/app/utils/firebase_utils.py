@@ -1,30 +1,104 @@
+import io
+import os
+import re
+import json
 import uuid
+import base64
+import hashlib
+import logging
+import unicodedata
+from itertools import islice
 from datetime import datetime
-from firebase_admin import firestore
-from app import firestore_db, storage_bucket
+from app.services import get_firestore, get_storage_bucket, LazyModule
+from app.utils.pipeline import run_in_background
+from app.utils.metrics import span
+from app.utils.collection_version import version_writes, remember_versions
+from app.utils.image_processing import make_thumbnail
 
-def add_word(user_id, word, kana, meaning):
-    word_id = str(uuid.uuid4())
-    word_ref = firestore_db.collection('words').document(word_id)
-    
-    word_data = {
+logger = logging.getLogger(__name__)
+
+# SERVER_TIMESTAMP 等常量在第一次使用时才导入Firestore客户端库
+firestore = LazyModule('firebase_admin.firestore')
+
+def word_doc_id(user_id, word, kana):
+    """单词文档ID由 (用户, 规范化的单词, 假名) 决定，同一个词重复保存写入同一个文档"""
+    normalized_word, normalized_kana = normalize_word_key(word, kana)
+    raw = f"{user_id}\x1f{normalized_word}\x1f{normalized_kana}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+def _word_write(user_id, word, kana, meaning):
+    """新单词的完整写入，单词和假名去除首尾空白后保存"""
+    word, kana = (word or '').strip(), (kana or '').strip()
+    word_id = word_doc_id(user_id, word, kana)
+    return word_id, ('set', get_firestore().collection('words').document(word_id), {
         'id': word_id,
         'user_id': user_id,
         'word': word,
         'kana': kana,
         'meaning': meaning,
         'created_at': firestore.SERVER_TIMESTAMP
-    }
-    
-    word_ref.set(word_data)
-    return word_id
+    })
+
+def _existing_word_ids(refs):
+    """按ID批量读取，返回其中已存在的单词ID"""
+    with span('firestore.get_all'):
+        return {snapshot.id for snapshot in get_firestore().get_all(refs, field_paths=['id'])
+                if snapshot.exists}
+
+def _add_or_touch(pending):
+    """
+    pending: [(单词ID, 新单词的写入)]
+    已存在的单词只更新 created_at 移到列表最前，保留用户修改过的释义；不存在的单词整体写入
+    """
+    existing = _existing_word_ids([write[1] for _, write in pending])
+    for word_id, write in pending:
+        if word_id in existing:
+            yield ('update', write[1], {'created_at': firestore.SERVER_TIMESTAMP})
+        else:
+            yield write
+
+def add_word(user_id, word, kana, meaning):
+    """
+    幂等添加单词，一次读取加一次写入
+    单词已存在时只移到列表最前，不覆盖已有的释义，也不会产生重复文档
+    返回 (保存的单词 {'id', 'word', 'kana', 'meaning'}, 是否新建)
+    """
+    word_id, (op, ref, data) = _word_write(user_id, word, kana, meaning)
+    with span('firestore.get'):
+        doc = ref.get()
+    if doc.exists:
+        data = doc.to_dict()
+        commit_versioned_writes([('update', ref, {'created_at': firestore.SERVER_TIMESTAMP})], 'words', [user_id])
+    else:
+        commit_versioned_writes([(op, ref, data)], 'words', [user_id])
+    return {key: data.get(key) for key in ('id', 'word', 'kana', 'meaning')}, not doc.exists
+
+def add_words(user_id, words):
+    """
+    批量幂等添加单词(例如保存一张图片识别出的全部单词)，合并为最少次数的批量读取和写入
+    words: [{'word', 'kana', 'meaning'}]，列表内重复的词只写入一次，已存在的单词与 add_word 相同只移到列表最前
+    返回 (与输入顺序对应的单词ID列表, 写入的不重复单词数)
+    """
+    writes = {}
+    word_ids = []
+    for item in words:
+        word_id, write = _word_write(user_id, item['word'], item.get('kana', ''), item.get('meaning', ''))
+        word_ids.append(word_id)
+        writes.setdefault(word_id, write)
+    pending = list(writes.items())
+    chunks = (pending[i:i + GET_ALL_CHUNK_SIZE] for i in range(0, len(pending), GET_ALL_CHUNK_SIZE))
+    commit_versioned_writes((write for chunk in chunks for write in _add_or_touch(chunk)), 'words', [user_id])
+    return word_ids, len(writes)
 
 def get_words_by_user(user_id):
-    words_ref = firestore_db.collection('words')
+    words_ref = get_firestore().collection('words')
     query = words_ref.where('user_id', '==', user_id).order_by('created_at', direction=firestore.Query.DESCENDING)
     
+    with span('firestore.query'):
+        docs = query.get()
+    
     results = []
-    for doc in query.get():
+    for doc in docs:
         word_data = doc.to_dict()
         # 格式化日期
         if 'created_at' in word_data and word_data['created_at']:
@@ -33,17 +107,285 @@ def get_words_by_user(user_id):
     
     return results
 
-def update_word(word_id, data):
-    word_ref = firestore_db.collection('words').document(word_id)
-    word_ref.update(data)
+# 分页查询单页最大条数
+MAX_PAGE_SIZE = 100
+
+# 字段投影只允许简单字段名
+FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+class WordExistsError(ValueError):
+    """修改单词或假名后与用户已有的另一个单词相同"""
+    pass
+
+class InvalidCursorError(ValueError):
+    """分页游标无效"""
+    pass
+
+def encode_cursor(created_at, doc_id):
+    """将最后一条记录的 (created_at, id) 编码为不透明的分页游标"""
+    raw = json.dumps({'t': created_at.isoformat(), 'id': doc_id})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(raw['t']), raw['id']
+    except Exception:
+        raise InvalidCursorError('无效的分页游标')
+
+def _format_created_at(data):
+    # 格式化日期
+    if 'created_at' in data and data['created_at']:
+        data['createdAt'] = data['created_at'].isoformat()
+    return data
+
+def _query_page(collection, user_id, limit, cursor=None, fields=None):
+    """
+    按 created_at、id 倒序分页查询用户的文档，每页只读取 limit+1 个文档
+    需要 (user_id ASC, created_at DESC, id DESC) 复合索引
+    返回 (文档列表, 下一页游标)，没有下一页时游标为None
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    query = (get_firestore().collection(collection)
+             .where('user_id', '==', user_id)
+             .order_by('created_at', direction=firestore.Query.DESCENDING)
+             .order_by('id', direction=firestore.Query.DESCENDING))
+    
+    if fields:
+        invalid = [field for field in fields if not FIELD_NAME_PATTERN.match(field)]
+        if invalid:
+            raise ValueError(f"无效的字段: {', '.join(invalid)}")
+        # 游标依赖 created_at 和 id，投影时始终包含
+        query = query.select(sorted(set(fields) | {'id', 'created_at'}))
+    
+    if cursor:
+        created_at, doc_id = decode_cursor(cursor)
+        query = query.start_after({'created_at': created_at, 'id': doc_id})
+    
+    # 多读一条用于判断是否还有下一页
+    with span('firestore.query'):
+        docs = list(query.limit(limit + 1).stream())
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    
+    results = [_format_created_at(doc.to_dict()) for doc in docs]
+    next_cursor = None
+    if has_more and results and results[-1].get('created_at'):
+        next_cursor = encode_cursor(results[-1]['created_at'], results[-1]['id'])
+    return results, next_cursor
+
+def get_words_page(user_id, limit, cursor=None, fields=None):
+    return _query_page('words', user_id, limit, cursor, fields)
+
+def update_word(word_id, data, user_id=None):
+    """
+    更新单词，返回更新后的单词ID
+    修改单词或假名时文档ID随之改变，在同一批次中创建新ID的文档并删除旧文档
+    新ID的单词已存在时抛出 WordExistsError，不会覆盖已有单词的释义和添加时间
+    """
+    word_ref = get_firestore().collection('words').document(word_id)
+    data = {key: value.strip() if key in ('word', 'kana') and isinstance(value, str) else value
+            for key, value in data.items()}
+    if 'word' not in data and 'kana' not in data:
+        commit_versioned_writes([('update', word_ref, data)], 'words', [user_id] if user_id else [])
+        return word_id
+    
+    with span('firestore.get'):
+        doc = word_ref.get()
+    if not doc.exists:
+        raise ValueError('单词不存在')
+    word_data = dict(doc.to_dict() or {}, **data)
+    new_id = word_doc_id(word_data.get('user_id'), word_data.get('word'), word_data.get('kana'))
+    if new_id == word_id:
+        commit_versioned_writes([('update', word_ref, data)], 'words', [user_id] if user_id else [])
+        return word_id
+    
+    from google.api_core.exceptions import AlreadyExists
+    word_data['id'] = new_id
+    new_ref = get_firestore().collection('words').document(new_id)
+    with span('firestore.get'):
+        exists = new_ref.get().exists
+    # 读取之后并发添加的同一个词由 create 在提交时拒绝
+    try:
+        if exists:
+            raise AlreadyExists(new_ref.path)
+        writes = [('create', new_ref, word_data), ('delete', word_ref, None)]
+        commit_versioned_writes(writes, 'words', [user_id] if user_id else [])
+    except AlreadyExists:
+        raise WordExistsError(f"单词本中已有 {word_data.get('word')}({word_data.get('kana')})")
+    return new_id
+
+def delete_word(word_id, user_id=None):
+    word_ref = get_firestore().collection('words').document(word_id)
+    commit_versioned_writes([('delete', word_ref, None)], 'words', [user_id] if user_id else [])
+
+# Firestore单次批量写入最多包含500个操作
+MAX_BATCH_WRITES = 500
+
+def commit_writes(writes):
+    """
+    分批提交写操作，每批不超过 MAX_BATCH_WRITES 个
+    writes: [(操作, 文档引用, 数据)]，操作为 'set' / 'create' / 'merge' / 'update' / 'delete'
+    'create' 的文档已存在时整批提交失败，抛出 AlreadyExists
+    返回提交的批次数
+    """
+    batch = None
+    count = 0
+    commits = 0
+    for op, ref, data in writes:
+        if batch is None:
+            batch = get_firestore().batch()
+        if op == 'set':
+            batch.set(ref, data)
+        elif op == 'create':
+            batch.create(ref, data)
+        elif op == 'merge':
+            batch.set(ref, data, merge=True)
+        elif op == 'update':
+            batch.update(ref, data)
+        else:
+            batch.delete(ref)
+        count += 1
+        if count >= MAX_BATCH_WRITES:
+            with span('firestore.batch_commit'):
+                batch.commit()
+            commits += 1
+            batch = None
+            count = 0
+    if batch is not None:
+        with span('firestore.batch_commit'):
+            batch.commit()
+        commits += 1
+    return commits
+
+# 每批最多同时提升多少个用户的版本号，超过时(例如运维脚本)改为在数据写入后单独提交
+MAX_VERSIONED_USERS_PER_BATCH = 100
+
+def commit_versioned_writes(writes, collection, user_ids):
+    """
+    分批提交写操作，每一批都同时提升这些用户的集合版本号，列表接口据此判断 If-None-Match
+    中途失败(例如导入文件后半部分编码错误)时，已提交的批次也已经提升了版本号
+    没有任何写操作时不提升版本号，返回提交的批次数
+    """
+    user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id]
+    if len(user_ids) > MAX_VERSIONED_USERS_PER_BATCH:
+        return _commit_then_bump_versions(writes, collection, user_ids)
+    
+    writes = iter(writes)
+    per_batch = MAX_BATCH_WRITES - len(user_ids)
+    commits = 0
+    latest = []
+    try:
+        while True:
+            chunk = list(islice(writes, per_batch))
+            if not chunk:
+                break
+            # 每批使用新的版本号，客户端在两批之间读到的列表不会在后续批次提交后仍被判定为未变化
+            pending = [(user_id,) + version_writes(user_id, [collection]) for user_id in user_ids]
+            commits += commit_writes(chunk + [write for _, write, _ in pending])
+            latest = pending
+    finally:
+        for user_id, _, versions in latest:
+            remember_versions(user_id, versions)
+    return commits
+
+def _commit_then_bump_versions(writes, collection, user_ids):
+    """用户太多无法放进每一批时，数据提交后(包括中途失败时)再单独提升版本号"""
+    count = [0]
+    
+    def counted():
+        for write in writes:
+            count[0] += 1
+            yield write
+    
+    commits = 0
+    try:
+        commits = commit_writes(counted())
+    finally:
+        if count[0]:
+            pending = [(user_id,) + version_writes(user_id, [collection]) for user_id in user_ids]
+            commits += commit_writes([write for _, write, _ in pending])
+            for user_id, _, versions in pending:
+                remember_versions(user_id, versions)
+    return commits
+
+def normalize_word_key(word, kana):
+    """单词去重使用的键：统一全角半角并去除首尾空白"""
+    return (unicodedata.normalize('NFKC', word or '').strip(), unicodedata.normalize('NFKC', kana or '').strip())
+
+def iter_words_by_user(user_id, page_size=500):
+    """按页流式读取用户的全部单词，内存中最多保留一页"""
+    query = (get_firestore().collection('words')
+             .where('user_id', '==', user_id)
+             .order_by('created_at', direction=firestore.Query.DESCENDING)
+             .order_by('id', direction=firestore.Query.DESCENDING)
+             .limit(page_size))
+    last_doc = None
+    while True:
+        page_query = query.start_after(last_doc) if last_doc else query
+        with span('firestore.query'):
+            docs = list(page_query.stream())
+        for doc in docs:
+            yield _format_created_at(doc.to_dict())
+        if len(docs) < page_size:
+            return
+        last_doc = docs[-1]
+
+# get_all 单次读取的文档数
+GET_ALL_CHUNK_SIZE = 100
+
+def import_words(user_id, rows):
+    """
+    批量导入单词，按 (单词, 假名) 与已有单词及文件内重复项去重
+    单词文档ID由 (单词, 假名) 决定，每100个单词按ID批量读取一次判断是否已存在，不需要读取整个单词本
+    已有的单词保持不变，不会被导入文件中的释义覆盖
+    rows: 可迭代的 {'word', 'kana', 'meaning'}，边读取边分批写入
+    返回 (导入数量, 跳过的重复数量)
+    """
+    seen = set()
+    stats = {'imported': 0, 'duplicates': 0}
+    
+    def flush(pending):
+        existing = _existing_word_ids([write[1] for _, write in pending])
+        for word_id, write in pending:
+            if word_id in existing:
+                stats['duplicates'] += 1
+                continue
+            stats['imported'] += 1
+            yield write
+    
+    def writes():
+        pending = []
+        for row in rows:
+            word_id, write = _word_write(user_id, row['word'], row.get('kana', ''), row.get('meaning', ''))
+            if word_id in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(word_id)
+            pending.append((word_id, write))
+            if len(pending) >= GET_ALL_CHUNK_SIZE:
+                yield from flush(pending)
+                pending = []
+        if pending:
+            yield from flush(pending)
+    
+    commit_versioned_writes(writes(), 'words', [user_id])
+    return stats['imported'], stats['duplicates']
 
-def delete_word(word_id):
-    word_ref = firestore_db.collection('words').document(word_id)
-    word_ref.delete()
+# 缩略图相关字段: thumbnail_url / thumbnail_storage_path / placeholder / image_width / image_height
+THUMBNAIL_FIELDS = ('thumbnail_url', 'thumbnail_storage_path', 'placeholder', 'image_width', 'image_height')
 
-def add_history_item(user_id, image_url, image_storage_path, sentence, translated_sentence, detected_words):
-    history_id = str(uuid.uuid4())
-    history_ref = firestore_db.collection('history').document(history_id)
+def _history_writes(user_id, image_url, image_storage_path, sentence, translated_sentence, detected_words, history_id,
+                    thumbnail=None):
+    history_ref = get_firestore().collection('history').document(history_id)
+    
+    # 识别出的单词直接内嵌在历史记录文档中，读取详情只需一次读取
+    words = []
+    for word_data in detected_words:
+        word_data['id'] = str(uuid.uuid4())
+        word_data['history_id'] = history_id
+        words.append(word_data)
     
     history_data = {
         'id': history_id,
@@ -53,34 +395,52 @@ def add_history_item(user_id, image_url, image_storage_path, sentence, translate
         'sentence': sentence,
         'translated_sentence': translated_sentence,
         'created_at': firestore.SERVER_TIMESTAMP,
-        'word_count': len(detected_words)
+        'word_count': len(words),
+        'words': words,
+        'words_inline': True
     }
     
-    # 使用事务同时添加历史记录和单词
-    transaction = firestore_db.transaction()
+    # 缩略图生成失败时不写入这些字段，前端回退到原图
+    if thumbnail:
+        history_data.update({key: thumbnail[key] for key in THUMBNAIL_FIELDS if key in thumbnail})
     
-    @firestore.transactional
-    def add_in_transaction(transaction, history_ref, history_data, detected_words):
-        transaction.set(history_ref, history_data)
-        
-        for word_data in detected_words:
-            word_id = str(uuid.uuid4())
-            word_ref = firestore_db.collection('detected_words').document(word_id)
-            
-            word_data['id'] = word_id
-            word_data['history_id'] = history_id
-            
-            transaction.set(word_ref, word_data)
-    
-    add_in_transaction(transaction, history_ref, history_data, detected_words)
+    return [('set', history_ref, history_data)]
+
+def add_history_item(user_id, image_url, image_storage_path, sentence, translated_sentence, detected_words, history_id=None,
+                     thumbnail=None):
+    history_id = history_id or str(uuid.uuid4())
+    
+    # 使用批量写入同时添加历史记录和单词
+    # 只写不读的场景下批量写入同样是原子的，且只需一次提交请求
+    commit_versioned_writes(_history_writes(user_id, image_url, image_storage_path, sentence,
+                                            translated_sentence, detected_words, history_id, thumbnail),
+                            'history', [user_id])
     return history_id
 
+def add_history_items(records):
+    """
+    批量添加多条历史记录及其单词
+    records: add_history_item 的参数字典列表
+    返回 (历史记录ID列表, 提交的批次数)
+    """
+    writes = []
+    history_ids = []
+    for record in records:
+        record = dict(record)
+        history_id = record.pop('history_id', None) or str(uuid.uuid4())
+        history_ids.append(history_id)
+        writes.extend(_history_writes(history_id=history_id, **record))
+    return history_ids, commit_versioned_writes(writes, 'history', [record['user_id'] for record in records])
+
 def get_history_by_user(user_id):
-    history_ref = firestore_db.collection('history')
+    history_ref = get_firestore().collection('history')
     query = history_ref.where('user_id', '==', user_id).order_by('created_at', direction=firestore.Query.DESCENDING)
     
+    with span('firestore.query'):
+        docs = query.get()
+    
     results = []
-    for doc in query.get():
+    for doc in docs:
         history_data = doc.to_dict()
         # 格式化日期
         if 'created_at' in history_data and history_data['created_at']:
@@ -89,93 +449,213 @@ def get_history_by_user(user_id):
     
     return results
 
-def get_history_item(history_id):
-    history_ref = firestore_db.collection('history').document(history_id)
-    history_doc = history_ref.get()
+def get_history_page(user_id, limit, cursor=None, fields=None):
+    if fields:
+        # 单词是否内嵌决定了是否需要查询旧的 detected_words 集合，投影时一并读取这个标记
+        # 单词数组只在调用方的字段中包含 words 时读取
+        fields = list(fields) + ['words_inline']
+    return _query_page('history', user_id, limit, cursor, fields)
+
+# Firestore的 in 查询最多包含30个值
+MAX_IN_QUERY_VALUES = 30
+
+def get_legacy_detected_words(history_ids):
+    """
+    读取旧数据中保存在 detected_words 集合里的单词
+    每30个历史记录合并为一次 in 查询，返回 {history_id: [单词]}
+    """
+    history_ids = list(history_ids)
+    words_by_history = {history_id: [] for history_id in history_ids}
+    words_ref = get_firestore().collection('detected_words')
+    for i in range(0, len(history_ids), MAX_IN_QUERY_VALUES):
+        chunk = history_ids[i:i + MAX_IN_QUERY_VALUES]
+        with span('firestore.query'):
+            docs = list(words_ref.where('history_id', 'in', chunk).stream())
+        for doc in docs:
+            word_data = doc.to_dict()
+            words_by_history.setdefault(word_data.get('history_id'), []).append(word_data)
+    return words_by_history
+
+def embed_words(history_items):
+    """为历史记录补充单词：已内嵌的直接使用，旧数据批量查询"""
+    legacy_ids = [item['id'] for item in history_items if not item.get('words_inline')]
+    if legacy_ids:
+        words_by_history = get_legacy_detected_words(legacy_ids)
+        for item in history_items:
+            if not item.get('words_inline'):
+                item['words'] = words_by_history.get(item['id'], [])
+    return history_items
+
+def get_history_items(history_ids):
+    """使用 get_all 一次性读取多条历史记录，不存在的记录被忽略"""
+    refs = [get_firestore().collection('history').document(history_id) for history_id in history_ids]
+    with span('firestore.get_all'):
+        docs = list(get_firestore().get_all(refs))
+    results = []
+    for doc in docs:
+        if doc.exists:
+            results.append(_format_created_at(doc.to_dict()))
+    return results
+
+def get_history_item(history_id, include_words=True):
+    history_ref = get_firestore().collection('history').document(history_id)
+    with span('firestore.get'):
+        history_doc = history_ref.get()
     
     if not history_doc.exists:
         return None
     
     history_data = history_doc.to_dict()
     
-    # 获取关联的单词
-    words_ref = firestore_db.collection('detected_words')
-    words_query = words_ref.where('history_id', '==', history_id)
-    
-    words = []
-    for doc in words_query.get():
-        word_data = doc.to_dict()
-        words.append(word_data)
-    
-    history_data['words'] = words
-    
-    # 格式化日期
-    if 'created_at' in history_data and history_data['created_at']:
-        history_data['createdAt'] = history_data['created_at'].isoformat()
+    # 旧数据的单词保存在 detected_words 集合中，需要额外查询
+    if include_words:
+        embed_words([history_data])
     
-    return history_data
+    return _format_created_at(history_data)
 
-def delete_history_item(history_id):
-    # 获取历史记录
-    history_ref = firestore_db.collection('history').document(history_id)
-    history_doc = history_ref.get()
-    
-    if not history_doc.exists:
-        return False
+def _delete_images_async(storage_paths):
+    # 图片删除不影响响应，在后台执行
+    for storage_path in storage_paths:
+        if storage_path:
+            run_in_background(delete_image, storage_path)
+
+def _history_delete_writes(history_items):
+    """
+    生成删除历史记录及其旧版单词文档的写操作
+    先删除单词再删除历史记录，分批提交中途失败时可以重试删除剩余部分
+    """
+    writes = []
     
-    history_data = history_doc.to_dict()
+    # 单词已内嵌在历史记录中时无需额外查询，旧数据批量查询关联单词
+    legacy_ids = [item['id'] for item in history_items if not item.get('words_inline')]
+    if legacy_ids:
+        words_ref = get_firestore().collection('detected_words')
+        for words in get_legacy_detected_words(legacy_ids).values():
+            for word_data in words:
+                if word_data.get('id'):
+                    writes.append(('delete', words_ref.document(word_data['id']), None))
     
-    # 删除存储中的图片
-    if 'image_storage_path' in history_data:
-        try:
-            blob = storage_bucket.blob(history_data['image_storage_path'])
-            blob.delete()
-        except Exception as e:
-            print(f"删除图片失败: {e}")
-    
-    # 使用事务删除历史记录和关联的单词
-    transaction = firestore_db.transaction()
-    
-    @firestore.transactional
-    def delete_in_transaction(transaction, history_id):
-        # 删除历史记录
-        history_ref = firestore_db.collection('history').document(history_id)
-        transaction.delete(history_ref)
+    history_ref = get_firestore().collection('history')
+    writes.extend(('delete', history_ref.document(item['id']), None) for item in history_items)
+    return writes
+
+def delete_history_item(history_id, history_data=None):
+    # 获取历史记录，调用方已读取时直接使用
+    if history_data is None:
+        with span('firestore.get'):
+            history_doc = get_firestore().collection('history').document(history_id).get()
         
-        # 删除关联的单词
-        words_ref = firestore_db.collection('detected_words')
-        words_query = words_ref.where('history_id', '==', history_id)
+        if not history_doc.exists:
+            return False
         
-        for doc in words_query.get():
-            transaction.delete(doc.reference)
+        history_data = history_doc.to_dict()
+    
+    history_data = dict(history_data, id=history_id)
     
-    delete_in_transaction(transaction, history_id)
+    # 分批删除历史记录和关联的单词，不受单次事务500个写操作的限制
+    commit_versioned_writes(_history_delete_writes([history_data]), 'history', [history_data.get('user_id')])
+    
+    # 删除存储中的图片和缩略图
+    _delete_images_async([history_data.get('image_storage_path'), history_data.get('thumbnail_storage_path')])
     return True
 
-def upload_image(file_data, filename):
+def delete_history_items(user_id, history_ids=None, start=None, end=None):
+    """
+    批量删除用户的历史记录，按ID列表或 created_at 时间范围 [start, end) 选择
+    只删除属于该用户的记录，返回删除的条数
+    """
+    if history_ids is not None:
+        # get_all 每次最多读取100个文档，分块读取
+        history_items = []
+        for i in range(0, len(history_ids), 100):
+            history_items.extend(get_history_items(history_ids[i:i + 100]))
+        history_items = [item for item in history_items if item.get('user_id') == user_id]
+    else:
+        query = get_firestore().collection('history').where('user_id', '==', user_id)
+        if start is not None:
+            query = query.where('created_at', '>=', start)
+        if end is not None:
+            query = query.where('created_at', '<', end)
+        query = query.select(['id', 'user_id', 'image_storage_path', 'thumbnail_storage_path', 'words_inline'])
+        with span('firestore.query'):
+            history_items = [dict(doc.to_dict(), id=doc.id) for doc in query.stream()]
+    
+    if not history_items:
+        return 0
+    
+    commit_versioned_writes(_history_delete_writes(history_items), 'history', [user_id])
+    _delete_images_async([path for item in history_items
+                          for path in (item.get('image_storage_path'), item.get('thumbnail_storage_path'))])
+    return len(history_items)
+
+def upload_image(file_data, filename, content_type=None, folder='uploads'):
     """
-    上传图片到Firebase Storage
+    上传图片到Firebase Storage的 folder 目录，file_data 可以是bytes或文件对象，文件对象直接分块读取上传
+    content_type未指定时根据文件扩展名推断
+    创建时直接设置 STORAGE_PREDEFINED_ACL(默认publicRead)，不再单独调用make_public
+    超过 STORAGE_RESUMABLE_THRESHOLD 字节的文件使用分块的断点续传上传
     """
     # 生成唯一文件名
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     unique_filename = f"{timestamp}_{uuid.uuid4().hex[:8]}_{filename}"
     
     # 创建Blob
-    blob = storage_bucket.blob(f"uploads/{unique_filename}")
+    blob = get_storage_bucket().blob(f"{folder}/{unique_filename}")
     
     # 设置内容类型
-    content_type = 'image/jpeg'
-    if filename.lower().endswith('.png'):
-        content_type = 'image/png'
-    elif filename.lower().endswith('.gif'):
-        content_type = 'image/gif'
-    elif filename.lower().endswith('.webp'):
-        content_type = 'image/webp'
+    if not content_type:
+        content_type = 'image/jpeg'
+        if filename.lower().endswith('.png'):
+            content_type = 'image/png'
+        elif filename.lower().endswith('.gif'):
+            content_type = 'image/gif'
+        elif filename.lower().endswith('.webp'):
+            content_type = 'image/webp'
     
-    # 上传文件
-    blob.upload_from_string(file_data, content_type=content_type)
+    if isinstance(file_data, (bytes, bytearray)):
+        stream, size = io.BytesIO(file_data), len(file_data)
+    else:
+        stream = file_data
+        stream.seek(0, io.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
     
-    # 生成公共URL
-    blob.make_public()
+    # 大文件按块上传，单块失败时只重传该块；块大小必须是256KB的整数倍
+    if size > int(os.environ.get('STORAGE_RESUMABLE_THRESHOLD', 8 * 1024 * 1024)):
+        blob.chunk_size = int(os.environ.get('STORAGE_CHUNK_SIZE', 8 * 1024 * 1024))
+    
+    # 公开读取的ACL随上传请求一起设置；桶已通过IAM公开时可设为空跳过
+    predefined_acl = os.environ.get('STORAGE_PREDEFINED_ACL', 'publicRead') or None
+    
+    # 上传文件
+    with span('storage.upload'):
+        blob.upload_from_file(stream, size=size, content_type=content_type, predefined_acl=predefined_acl)
     
-    return blob.public_url, f"uploads/{unique_filename}"
+    return blob.public_url, f"{folder}/{unique_filename}"
+
+
+def upload_thumbnail(file_data, filename):
+    """
+    生成并上传历史列表使用的缩略图，返回写入历史记录的缩略图字段
+    缩略图不影响分析结果，失败时返回None，列表回退显示原图
+    """
+    try:
+        with span('image.thumbnail'):
+            thumbnail = make_thumbnail(file_data)
+        thumbnail_url, thumbnail_path = upload_image(
+            thumbnail['data'], f"{filename.rsplit('.', 1)[0]}.webp", content_type='image/webp', folder='thumbnails')
+    except Exception as e:
+        logger.warning(f"生成缩略图失败: {str(e)}")
+        return None
+    return {
+        'thumbnail_url': thumbnail_url,
+        'thumbnail_storage_path': thumbnail_path,
+        'placeholder': thumbnail['placeholder'],
+        'image_width': thumbnail['width'],
+        'image_height': thumbnail['height']
+    }
+
+def delete_image(storage_path):
+    """删除存储中的图片"""
+    with span('storage.delete'):
+        get_storage_bucket().blob(storage_path).delete()
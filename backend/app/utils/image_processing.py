@@ -0,0 +1,239 @@
+import io
+import os
+import base64
+import hashlib
+from app.services import LazyModule
+
+# Pillow只在处理图片时才导入，缩短进程启动时间
+Image = LazyModule('PIL.Image')
+ImageOps = LazyModule('PIL.ImageOps')
+
+# 输出格式对应的MIME类型与扩展名
+OUTPUT_FORMATS = {
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'jpg': ('JPEG', 'image/jpeg', 'jpg'),
+}
+
+# Pillow识别的格式对应的MIME类型与扩展名
+SOURCE_FORMATS = {
+    'JPEG': ('image/jpeg', 'jpg'),
+    'PNG': ('image/png', 'png'),
+    'GIF': ('image/gif', 'gif'),
+    'WEBP': ('image/webp', 'webp'),
+}
+
+
+class ImageRejected(Exception):
+    """上传的图片在读取全部内容之前被拒绝，status 为对应的HTTP状态码"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _as_stream(image_data):
+    """bytes 包装为文件对象，文件对象回到开头"""
+    if isinstance(image_data, (bytes, bytearray)):
+        return io.BytesIO(image_data)
+    image_data.seek(0)
+    return image_data
+
+
+def data_size(image_data):
+    if isinstance(image_data, (bytes, bytearray)):
+        return len(image_data)
+    image_data.seek(0, io.SEEK_END)
+    size = image_data.tell()
+    image_data.seek(0)
+    return size
+
+
+def read_image_data(image_data):
+    """读取图片的完整内容，image_data 可以是bytes或文件对象"""
+    if isinstance(image_data, (bytes, bytearray)):
+        return bytes(image_data)
+    return _as_stream(image_data).read()
+
+
+def sniff_image(stream, max_bytes=None, max_pixels=None):
+    """
+    只读取文件头检查上传的图片，不解码像素也不把文件读入内存
+    检查文件大小(IMAGE_MAX_UPLOAD_BYTES)、格式以及像素数(IMAGE_MAX_PIXELS)，不通过时抛出 ImageRejected
+    返回 (Pillow格式名, 文件字节数)
+    """
+    max_bytes = max_bytes or int(os.environ.get('IMAGE_MAX_UPLOAD_BYTES', 20 * 1024 * 1024))
+    max_pixels = max_pixels or int(os.environ.get('IMAGE_MAX_PIXELS', 50_000_000))
+
+    size = data_size(stream)
+    if size > max_bytes:
+        raise ImageRejected(f'图片不能超过{max_bytes // (1024 * 1024)}MB', 413)
+    if size == 0:
+        raise ImageRejected('文件为空')
+
+    try:
+        # Image.open 只解析文件头，像素在 load 时才读取
+        img = Image.open(_as_stream(stream))
+        image_format, (width, height) = img.format, img.size
+    except Exception:
+        raise ImageRejected('无法识别的图片文件')
+    finally:
+        stream.seek(0)
+
+    if image_format not in SOURCE_FORMATS:
+        raise ImageRejected(f'不支持的图片格式: {image_format}')
+    if width * height > max_pixels:
+        raise ImageRejected('图片分辨率过大', 413)
+    return image_format, size
+
+
+def normalize_image(image_data, max_edge=None, output_format=None, quality=None):
+    """
+    上传和视觉分析前的图片预处理：按EXIF方向旋转、缩放长边、重新编码
+    image_data 可以是bytes或文件对象(例如上传文件的临时文件)，需要重新编码时不会先把原图读入内存
+    参数未指定时读取环境变量 IMAGE_MAX_EDGE / IMAGE_OUTPUT_FORMAT / IMAGE_QUALITY
+    返回 (data, mime_type, extension)
+    """
+    max_edge = max_edge or int(os.environ.get('IMAGE_MAX_EDGE', 1600))
+    output_format = (output_format or os.environ.get('IMAGE_OUTPUT_FORMAT', 'webp')).lower()
+    quality = quality or int(os.environ.get('IMAGE_QUALITY', 82))
+    pil_format, mime_type, extension = OUTPUT_FORMATS.get(output_format, OUTPUT_FORMATS['webp'])
+
+    img = Image.open(_as_stream(image_data))
+    source_format = img.format
+    # JPEG可以在解码时直接按比例缩小，大幅减少大图的解码耗时
+    img.draft('RGB', (max_edge, max_edge))
+    orientation = img.getexif().get(0x0112, 1)
+    needs_resize = max(img.size) > max_edge
+
+    # 已经足够小、方向正确且格式一致的图片直接使用原始数据
+    if not needs_resize and orientation == 1 and source_format == pil_format:
+        return read_image_data(image_data), mime_type, extension
+
+    img = ImageOps.exif_transpose(img)
+    if needs_resize:
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+    if pil_format == 'JPEG' or not has_alpha:
+        if has_alpha:
+            # JPEG不支持透明通道，合成到白色背景上
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        else:
+            img = img.convert('RGB')
+    else:
+        img = img.convert('RGBA')
+
+    output = io.BytesIO()
+    if pil_format == 'JPEG':
+        img.save(output, pil_format, quality=quality, optimize=True, progressive=True)
+    else:
+        img.save(output, pil_format, quality=quality, method=4)
+    data = output.getvalue()
+
+    # 未缩放也未旋转时，重新编码反而更大则保留原图
+    if not needs_resize and orientation == 1 and len(data) >= data_size(image_data) and source_format in SOURCE_FORMATS:
+        source_mime, source_ext = SOURCE_FORMATS[source_format]
+        return read_image_data(image_data), source_mime, source_ext
+
+    return data, mime_type, extension
+
+
+def make_thumbnail(image_data, size=None, quality=None, placeholder_size=None):
+    """
+    生成历史列表使用的缩略图和内联占位图，只解码一次
+    缩略图长边为 THUMBNAIL_SIZE(默认256)像素的WebP；占位图为长边 PLACEHOLDER_SIZE(默认16)像素的WebP data URI，
+    直接保存在历史记录中，列表加载缩略图之前先模糊显示
+    返回 {'data', 'width', 'height', 'placeholder'}，width/height 为原图尺寸，供前端预留布局
+    """
+    size = size or int(os.environ.get('THUMBNAIL_SIZE', 256))
+    quality = quality or int(os.environ.get('THUMBNAIL_QUALITY', 70))
+    placeholder_size = placeholder_size or int(os.environ.get('PLACEHOLDER_SIZE', 16))
+
+    img = Image.open(_as_stream(image_data))
+    # draft 会改变解码尺寸，原图尺寸需要在此之前读取；EXIF方向为旋转90度时宽高互换
+    width, height = img.size
+    if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+        width, height = height, width
+    img.draft('RGB', (size, size))
+    img = ImageOps.exif_transpose(img)
+    has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+    img = img.convert('RGBA' if has_alpha else 'RGB')
+
+    thumb = img.copy()
+    thumb.thumbnail((size, size), Image.LANCZOS)
+    output = io.BytesIO()
+    thumb.save(output, 'WEBP', quality=quality, method=4)
+
+    # 占位图只需要大致的颜色分布，质量越低data URI越短
+    thumb.thumbnail((placeholder_size, placeholder_size), Image.BILINEAR)
+    tiny = io.BytesIO()
+    thumb.save(tiny, 'WEBP', quality=30)
+    placeholder = 'data:image/webp;base64,' + base64.b64encode(tiny.getvalue()).decode('ascii')
+
+    return {'data': output.getvalue(), 'width': width, 'height': height, 'placeholder': placeholder}
+
+
+def _load_normalized(image_data):
+    """读取图片并按EXIF方向校正，转换为灰度图用于感知哈希"""
+    img = Image.open(io.BytesIO(image_data))
+    # 解码时先缩小，减少大图的计算量
+    img.draft('L', (256, 256))
+    img = ImageOps.exif_transpose(img)
+    return img.convert('L')
+
+
+def average_hash(img, hash_size=8):
+    """aHash: 缩放到8x8，按像素是否高于均值生成64位哈希"""
+    small = img.resize((hash_size, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    avg = sum(pixels) / len(pixels)
+    bits = 0
+    for p in pixels:
+        bits = (bits << 1) | (1 if p > avg else 0)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def difference_hash(img, hash_size=8):
+    """dHash: 缩放到9x8，按相邻像素的明暗变化生成64位哈希"""
+    small = img.resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            left = pixels[offset + col]
+            right = pixels[offset + col + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+# aHash和dHash中0和1都至少要有这么多位，纯色、墙面、天空等低纹理图片的哈希接近全0或全1，不能区分不同图片
+MIN_HASH_BITS = 8
+
+
+def is_informative_hash(hex_hash):
+    """哈希的0和1都不少于 MIN_HASH_BITS 位"""
+    bits = len(hex_hash) * 4
+    ones = bin(int(hex_hash, 16)).count('1')
+    return min(ones, bits - ones) >= MIN_HASH_BITS
+
+
+def compute_image_keys(image_data):
+    """
+    计算图片的内容哈希与感知哈希
+    返回 (content_hash, perceptual_hash)，图片无法解码或纹理太少时感知哈希为None
+    """
+    content_hash = hashlib.sha256(image_data).hexdigest()
+    try:
+        img = _load_normalized(image_data)
+        a_hash, d_hash = average_hash(img), difference_hash(img)
+    except Exception:
+        return content_hash, None
+    if not (is_informative_hash(a_hash) and is_informative_hash(d_hash)):
+        return content_hash, None
+    return content_hash, f"{a_hash}{d_hash}"
@@ -0,0 +1,123 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """任务队列已满"""
+    pass
+
+
+class JobQueue:
+    """
+    进程内异步任务队列：有界线程池执行任务，任务状态保存在内存中
+    状态依次为 queued -> running -> succeeded / failed
+    """
+
+    def __init__(self, workers=4, max_pending=100, ttl=3600, name='jobs'):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._pending = 0
+        self._cond = threading.Condition()
+
+    def submit(self, user_id, fn, *args, **kwargs):
+        """提交任务并返回任务信息，排队任务超过上限时抛出 QueueFullError"""
+        with self._cond:
+            self._cleanup()
+            if self._pending >= self.max_pending:
+                raise QueueFullError('任务队列已满')
+            self._pending += 1
+            now = time.time()
+            job = {
+                'id': str(uuid.uuid4()),
+                'user_id': user_id,
+                'status': 'queued',
+                'result': None,
+                'error': None,
+                'created_at': now,
+                'updated_at': now
+            }
+            self._jobs[job['id']] = job
+        self._executor.submit(self._run, job['id'], fn, args, kwargs)
+        return dict(job)
+
+    def _update(self, job_id, **fields):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job['updated_at'] = time.time()
+            self._cond.notify_all()
+
+    def _run(self, job_id, fn, args, kwargs):
+        with self._cond:
+            self._pending -= 1
+        self._update(job_id, status='running')
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"异步任务 {job_id} 失败: {str(e)}", exc_info=True)
+            self._update(job_id, status='failed', error=str(e))
+        else:
+            self._update(job_id, status='succeeded', result=result)
+
+    def _cleanup(self):
+        # 清理已完成且超过保留时间的任务
+        expire_before = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['status'] in ('succeeded', 'failed') and job['updated_at'] < expire_before]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait(self, job_id, last_updated_at=None, timeout=15):
+        """等待任务状态更新，超时返回当前状态，任务不存在返回None"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return None
+                if job['updated_at'] != last_updated_at or job['status'] in ('succeeded', 'failed'):
+                    return dict(job)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return dict(job)
+                self._cond.wait(remaining)
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_job_queue(name):
+    """
+    按名称获取共享任务队列，配置项(前缀为大写名称)：
+    {NAME}_JOB_WORKERS: 并发执行的任务数(默认4)
+    {NAME}_JOB_QUEUE_SIZE: 最多排队的任务数(默认100)
+    {NAME}_JOB_TTL: 已完成任务的保留时间(秒，默认3600)
+    """
+    with _queues_lock:
+        queue = _queues.get(name)
+        if queue is None:
+            prefix = name.upper()
+            queue = JobQueue(
+                workers=int(os.environ.get(f'{prefix}_JOB_WORKERS', 4)),
+                max_pending=int(os.environ.get(f'{prefix}_JOB_QUEUE_SIZE', 100)),
+                ttl=int(os.environ.get(f'{prefix}_JOB_TTL', 3600)),
+                name=f'{name}-job'
+            )
+            _queues[name] = queue
+        return queue
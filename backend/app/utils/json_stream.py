@@ -0,0 +1,51 @@
+import re
+import json
+
+# 匹配已经完整输出的 "字段": "字符串值"
+FIELD_PATTERN = re.compile(r'"([A-Za-z_][A-Za-z0-9_]*)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+class JsonFieldScanner:
+    """
+    增量解析模型流式输出中的JSON字符串字段
+    每次 feed 返回新完成的 (字段名, 值) 列表
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self._pos = 0
+        self.fields = {}
+
+    def feed(self, text):
+        self.buffer += text
+        completed = []
+        for match in FIELD_PATTERN.finditer(self.buffer, self._pos):
+            name = match.group(1)
+            try:
+                value = json.loads(f'"{match.group(2)}"')
+            except ValueError:
+                value = match.group(2)
+            self._pos = match.end()
+            if name not in self.fields:
+                self.fields[name] = value
+                completed.append((name, value))
+        return completed
+
+
+def parse_json_content(content):
+    """
+    从模型返回的文本中解析JSON，先尝试整体解析，再截取第一个{到最后一个}之间的内容
+    无法解析时返回None
+    """
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
+    start = content.find('{')
+    end = content.rfind('}')
+    if start == -1 or end <= start:
+        return None
+    try:
+        return json.loads(content[start:end + 1])
+    except ValueError:
+        return None
@@ -0,0 +1,223 @@
+import os
+import hmac
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# 直方图分桶(秒)，覆盖毫秒级的数据库读写到数十秒的模型调用
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_PREFIX = 'shirupic'
+
+# 当前请求记录的阶段耗时 [(名称, 秒)]，不在请求中时为None
+_request_spans = contextvars.ContextVar('request_spans', default=None)
+
+
+class Histogram:
+    """按标签分组的累积直方图，输出Prometheus文本格式"""
+
+    def __init__(self, name, help_text, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted(self._series.items())
+            items = [(labels, dict(series, buckets=list(series['buckets']))) for labels, series in items]
+        for labels, series in items:
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            for bound, count in zip(self.buckets, series['buckets']):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {series["count"]}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {series["sum"]:.6f}')
+            lines.append(f'{self.name}_count{{{label_text}}} {series["count"]}')
+        return '\n'.join(lines)
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            lines.append(f'{self.name}{{{label_text}}} {value}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+span_duration = Histogram(f'{METRIC_PREFIX}_span_duration_seconds',
+                          '外部调用等阶段的耗时', ('span',))
+span_errors = Counter(f'{METRIC_PREFIX}_span_errors_total',
+                      '阶段执行抛出异常的次数', ('span',))
+request_duration = Histogram(f'{METRIC_PREFIX}_request_duration_seconds',
+                             'HTTP请求处理耗时', ('endpoint', 'method', 'status'))
+
+# /metrics 输出的全部指标，其他模块通过 register_metric 添加
+_registry = [span_duration, span_errors, request_duration]
+
+
+def register_metric(metric):
+    _registry.append(metric)
+    return metric
+
+
+def observe_span(name, seconds):
+    """记录阶段耗时到直方图，并计入当前请求的Server-Timing"""
+    span_duration.observe((name,), seconds)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+@contextmanager
+def span(name):
+    """
+    计时上下文，例如:
+        with span('storage.upload'):
+            blob.upload_from_string(...)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        span_errors.inc((name,))
+        raise
+    finally:
+        observe_span(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """计时装饰器"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind_request_spans(fn):
+    """
+    让在线程池中执行的函数把阶段耗时计入提交它的请求
+    线程池中的线程不继承请求上下文，需要在提交前包装
+    """
+    spans = _request_spans.get()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _request_spans.set(spans)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _request_spans.reset(token)
+    return wrapper
+
+
+def render_metrics():
+    return '\n'.join(metric.render() for metric in list(_registry)) + '\n'
+
+
+def server_timing_header(spans, total):
+    """同名阶段合并耗时和次数，格式如 openai.vision;dur=812.4, total;dur=934.1"""
+    merged = {}
+    for name, seconds in spans:
+        duration, count = merged.get(name, (0.0, 0))
+        merged[name] = (duration + seconds, count + 1)
+    parts = []
+    for name, (duration, count) in merged.items():
+        desc = f';desc="x{count}"' if count > 1 else ''
+        parts.append(f'{name};dur={duration * 1000:.1f}{desc}')
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def init_app(app):
+    """
+    注册请求计时钩子和 /metrics 接口
+    METRICS_ENABLED=false 时关闭；访问 /metrics 需要 METRICS_TOKEN 作为 Bearer 令牌，
+    未设置令牌时返回404，只有在仅内网可达的部署中设置 METRICS_PUBLIC=true 才允许匿名访问
+    """
+    if os.environ.get('METRICS_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+        return
+
+    from flask import request, g, Response
+
+    server_timing = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+    metrics_token = os.environ.get('METRICS_TOKEN')
+    metrics_public = os.environ.get('METRICS_PUBLIC', 'false').lower() in ('1', 'true', 'yes')
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.request_spans_token = _request_spans.set([])
+
+    @app.after_request
+    def record_request_timing(response):
+        start = g.pop('request_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        spans = _request_spans.get() or []
+        if server_timing:
+            response.headers['Server-Timing'] = server_timing_header(spans, elapsed)
+            # 允许跨域的前端通过 PerformanceResourceTiming 读取
+            response.headers.setdefault('Timing-Allow-Origin', '*')
+        # 流式响应的耗时只统计到开始返回为止
+        request_duration.observe((request.endpoint or 'unmatched', request.method, str(response.status_code)), elapsed)
+        return response
+
+    @app.teardown_request
+    def clear_request_spans(exc=None):
+        token = g.pop('request_spans_token', None)
+        if token is not None:
+            try:
+                _request_spans.reset(token)
+            except ValueError:
+                # 流式响应在其他上下文中结束时无法还原，直接清空
+                _request_spans.set(None)
+
+    @app.route('/metrics')
+    def metrics():
+        if metrics_token:
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {metrics_token}'):
+                return Response('unauthorized\n', status=401, mimetype='text/plain')
+        elif not metrics_public:
+            return Response('not found\n', status=404, mimetype='text/plain')
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
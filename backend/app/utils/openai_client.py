@@ -0,0 +1,106 @@
+import os
+import time
+import logging
+import threading
+from dotenv import dotenv_values
+
+logger = logging.getLogger(__name__)
+
+# 默认读取后端根目录下的.env文件
+ENV_PATH = os.environ.get('DOTENV_PATH') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '.env')
+
+# 热更新时从.env同步到环境变量的配置项
+RELOAD_KEYS = ('OPENAI_API_KEY', 'OPENAI_BASE_URL', 'OPENAI_POOL_SIZE', 'OPENAI_TIMEOUT',
+               'OPENAI_CONNECT_TIMEOUT', 'OPENAI_MAX_RETRIES')
+
+_client = None
+_lock = threading.Lock()
+_env_mtime = None
+_last_check = 0.0
+
+
+def _env_file_mtime():
+    try:
+        return os.path.getmtime(ENV_PATH)
+    except OSError:
+        return None
+
+
+def _build_client():
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if not api_key:
+        return None
+
+    # openai和httpx导入较慢，在第一次创建客户端时才导入
+    import httpx
+    from openai import OpenAI
+
+    pool_size = int(os.environ.get('OPENAI_POOL_SIZE', 32))
+    timeout = float(os.environ.get('OPENAI_TIMEOUT', 60))
+    connect_timeout = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', 5))
+
+    # 共享的HTTP连接池，保持长连接以复用TLS握手
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=60),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout)
+    )
+    return OpenAI(
+        api_key=api_key,
+        base_url=os.environ.get('OPENAI_BASE_URL') or None,
+        max_retries=int(os.environ.get('OPENAI_MAX_RETRIES', 2)),
+        http_client=http_client
+    )
+
+
+def reload_openai_client():
+    """
+    重新读取.env中的OpenAI配置并重建客户端，用于密钥轮换
+    正在进行的请求继续使用旧客户端，旧连接池随之回收
+    """
+    global _client, _env_mtime
+    with _lock:
+        _env_mtime = _env_file_mtime()
+        if _env_mtime is not None:
+            values = dotenv_values(ENV_PATH)
+            for key in RELOAD_KEYS:
+                if values.get(key):
+                    os.environ[key] = values[key]
+        _client = _build_client()
+        logger.info('OpenAI客户端已重新加载')
+    return _client
+
+
+def _check_env_file():
+    """每隔 OPENAI_ENV_CHECK_INTERVAL 秒检查一次.env的修改时间，变化时自动重新加载"""
+    global _last_check
+    interval = float(os.environ.get('OPENAI_ENV_CHECK_INTERVAL', 30))
+    now = time.monotonic()
+    if interval <= 0 or now - _last_check < interval:
+        return
+    _last_check = now
+    if _env_file_mtime() != _env_mtime:
+        reload_openai_client()
+
+
+def get_openai_client():
+    """获取进程共享的OpenAI客户端，未配置API密钥时返回None"""
+    global _client, _env_mtime
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _env_mtime = _env_file_mtime()
+                _client = _build_client()
+    else:
+        _check_env_file()
+    return _client
+
+
+def set_openai_client(client):
+    """替换共享的OpenAI客户端，用于测试和基准环境注入替身"""
+    global _client, _env_mtime, _last_check
+    with _lock:
+        _client = client
+        # 禁止.env检查覆盖注入的客户端
+        _env_mtime = _env_file_mtime()
+        _last_check = float('inf')
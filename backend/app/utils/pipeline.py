@@ -0,0 +1,68 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    获取进程共享的有界线程池，用于并发执行上传、模型调用等网络IO
+    线程数由 PIPELINE_MAX_WORKERS 配置(默认16)
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                max_workers = int(os.environ.get('PIPELINE_MAX_WORKERS', 16))
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pipeline')
+    return _executor
+
+
+def run_in_background(fn, *args, **kwargs):
+    """在共享线程池中执行不影响响应的任务，异常只记录日志"""
+    def runner():
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"后台任务 {getattr(fn, '__name__', fn)} 失败: {str(e)}", exc_info=True)
+    return get_executor().submit(runner)
+
+
+class StageTimer:
+    """记录流水线各阶段耗时(毫秒)"""
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.timings = {}
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.timings[name] = round(seconds * 1000, 1)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name, fn):
+        """包装函数，使其在任意线程执行时记录自身耗时"""
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def as_dict(self):
+        result = dict(self.timings)
+        result['total'] = round((time.perf_counter() - self._start) * 1000, 1)
+        return result
@@ -0,0 +1,63 @@
+import re
+import hashlib
+import logging
+import unicodedata
+from app.utils.cache import create_cache, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# 翻译结果缓存，后端由 TRANSLATE_CACHE_BACKEND 等环境变量配置
+_cache = create_cache('TRANSLATE_CACHE', default_dir='.cache/translate', default_collection='translate_cache')
+
+# 合并同时进行的相同查询
+_single_flight = SingleFlight()
+
+
+def normalize_query(query):
+    """统一全角半角、去除首尾及重复空白"""
+    query = unicodedata.normalize('NFKC', query)
+    return re.sub(r'\s+', ' ', query).strip()
+
+
+def translation_cache_key(model, system_prompt, query):
+    prompt_hash = hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()[:16]
+    return f"{model}:{prompt_hash}:{normalize_query(query)}"
+
+
+def get_cached_translation(key):
+    if _cache is None:
+        return None
+    try:
+        return _cache.get(key)
+    except Exception as e:
+        logger.warning(f"读取翻译缓存失败: {str(e)}")
+        return None
+
+
+def set_cached_translation(key, result):
+    if _cache is None:
+        return
+    try:
+        _cache.set(key, result)
+    except Exception as e:
+        logger.warning(f"写入翻译缓存失败: {str(e)}")
+
+
+def memoized_translation(key, fn):
+    """
+    先查缓存，未命中时通过single-flight调用fn并写入缓存
+    fn 返回 (result, cacheable)
+    返回 (result, 来源)，来源为 'hit' / 'miss' / 'shared'
+    """
+    result = get_cached_translation(key)
+    if result is not None:
+        return result, 'hit'
+
+    def load():
+        value, cacheable = fn()
+        if cacheable:
+            set_cached_translation(key, value)
+        return value
+
+    result, shared = _single_flight.do(key, load)
+    return result, 'shared' if shared else 'miss'
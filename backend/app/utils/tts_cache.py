@@ -0,0 +1,221 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from app.utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+# 对象存储后端的对象名前缀
+STORAGE_PREFIX = 'tts_cache/'
+
+
+def audio_cache_key(text, voice, model, instructions):
+    """按 (文本, 声音, 模型, 指令) 计算音频的内容地址"""
+    raw = json.dumps([text, voice, model, instructions], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """
+    语音缓存：内存LRU + 磁盘或对象存储
+    超过 max_bytes 时淘汰：磁盘按最近访问时间，对象存储按写入时间(读取不更新对象的修改时间)
+    """
+
+    def __init__(self, directory, max_bytes, memory_bytes, backend='disk'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.backend = backend
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._stored_size = None
+        # 淘汰需要列出和删除文件或对象，与内存缓存使用不同的锁，淘汰期间不阻塞内存读取
+        self._size_lock = threading.Lock()
+        if backend == 'disk':
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        """磁盘缓存文件路径，仅磁盘后端可用"""
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def _bucket(self):
+        from app.services import get_storage_bucket
+        return get_storage_bucket()
+
+    def _blob(self, key):
+        return self._bucket().blob(f"{STORAGE_PREFIX}{key}.mp3")
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_bytes:
+                _, old = self._memory.popitem(last=False)
+                self._memory_size -= len(old)
+
+    def get_memory(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+            return data
+
+    def get_path(self, key):
+        """磁盘命中时返回文件路径并刷新访问时间"""
+        if self.backend != 'disk':
+            return None
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def get(self, key):
+        """返回音频数据，未命中返回None"""
+        data = self.get_memory(key)
+        if data is not None:
+            return data
+        try:
+            if self.backend == 'disk':
+                path = self.get_path(key)
+                if not path:
+                    return None
+                with open(path, 'rb') as f:
+                    data = f.read()
+            else:
+                with span('storage.tts_cache_get'):
+                    blob = self._blob(key)
+                    if not blob.exists():
+                        return None
+                    data = blob.download_as_bytes()
+        except Exception as e:
+            logger.warning(f"读取语音缓存失败: {str(e)}")
+            return None
+        self._remember(key, data)
+        return data
+
+    def set(self, key, data):
+        self._remember(key, data)
+        try:
+            if self.backend == 'disk':
+                self._write_disk(key, data)
+            else:
+                self._write_storage(key, data)
+        except Exception as e:
+            logger.warning(f"写入语音缓存失败: {str(e)}")
+
+    def _write_storage(self, key, data):
+        from google.api_core.exceptions import NotFound
+        blob = self._blob(key)
+        # 与磁盘相同，覆盖已有的对象时只计入大小的变化
+        try:
+            with span('storage.tts_cache_get'):
+                blob.reload()
+            old_size = blob.size or 0
+        except NotFound:
+            old_size = 0
+        with span('storage.tts_cache_set'):
+            blob.upload_from_string(data, content_type='audio/mpeg')
+        self._add_stored(len(data) - old_size)
+
+    def _write_disk(self, key, data):
+        path = self.path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        # 覆盖已有的文件时只计入大小的变化
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        os.replace(tmp_path, path)
+        self._add_stored(len(data) - old_size)
+
+    def _add_stored(self, delta):
+        """
+        累计已缓存的大小，超过上限时淘汰
+        大小在首次写入时统计一次，之后按写入累加，每次淘汰时按实际列表重新校准
+        """
+        with self._size_lock:
+            if self._stored_size is None:
+                self._stored_size = sum(size for _, size, _ in self._scan())
+            else:
+                self._stored_size += delta
+            if self._stored_size > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        """返回 (时间, 大小, 位置) 列表，磁盘为文件路径，对象存储为对象名"""
+        if self.backend != 'disk':
+            with span('storage.tts_cache_list'):
+                return [(blob.updated.timestamp() if blob.updated else 0, blob.size or 0, blob.name)
+                        for blob in self._bucket().list_blobs(prefix=STORAGE_PREFIX)]
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.mp3'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        # 淘汰到上限的90%，避免每次写入都扫描目录
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                self._remove(path)
+                total -= size
+            except Exception as e:
+                logger.warning(f"淘汰语音缓存失败: {str(e)}")
+        self._stored_size = total
+
+    def _remove(self, location):
+        if self.backend == 'disk':
+            os.remove(location)
+        else:
+            with span('storage.tts_cache_delete'):
+                self._bucket().blob(location).delete()
+
+
+_audio_cache = None
+_audio_cache_lock = threading.Lock()
+
+
+def get_audio_cache():
+    """
+    获取共享语音缓存，配置项：
+    TTS_CACHE_BACKEND: disk(默认) / storage
+    TTS_CACHE_DIR: 磁盘缓存目录
+    TTS_CACHE_MAX_BYTES: 磁盘或对象存储缓存的上限(默认512MB)
+    TTS_CACHE_MEMORY_BYTES: 内存缓存上限(默认32MB)
+    """
+    global _audio_cache
+    if _audio_cache is None:
+        with _audio_cache_lock:
+            if _audio_cache is None:
+                _audio_cache = AudioCache(
+                    directory=os.environ.get('TTS_CACHE_DIR', '.cache/tts'),
+                    max_bytes=int(os.environ.get('TTS_CACHE_MAX_BYTES', 512 * 1024 * 1024)),
+                    memory_bytes=int(os.environ.get('TTS_CACHE_MEMORY_BYTES', 32 * 1024 * 1024)),
+                    backend=os.environ.get('TTS_CACHE_BACKEND', 'disk').lower()
+                )
+    return _audio_cache
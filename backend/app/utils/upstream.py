@@ -0,0 +1,267 @@
+import os
+import math
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+from app.utils.metrics import Counter, register_metric, METRIC_PREFIX
+
+# 各上游单次调用的默认超时(秒)，可通过 OPENAI_VISION_TIMEOUT / OPENAI_CHAT_TIMEOUT 覆盖
+CALL_TIMEOUTS = {
+    'vision': 30.0,
+    'chat': 15.0,
+}
+
+# 请求剩余时间少于该值时不再调用上游，避免发出注定超时却仍然计费的调用
+MIN_CALL_TIMES = {
+    'vision': 5.0,
+    'chat': 2.0,
+}
+
+# 对冲延迟按最近多少次成功调用的耗时计算，样本不足时不对冲
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+
+hedged = register_metric(Counter(f'{METRIC_PREFIX}_upstream_hedged_total',
+                                 '发出的对冲请求数，按最终采用的结果分组', ('upstream', 'winner')))
+timeouts = register_metric(Counter(f'{METRIC_PREFIX}_upstream_timeouts_total',
+                                   '上游调用超时或请求截止时间已到的次数', ('upstream',)))
+
+# 当前请求的截止时间(time.monotonic)和总时长(秒)，不在请求中或不限制时为None
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+_budget = contextvars.ContextVar('request_budget', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """请求的剩余时间不足以调用上游"""
+
+
+def init_app(app):
+    """
+    为每个请求设置截止时间，上游调用的超时不超过请求剩余的时间
+    REQUEST_DEADLINE: 请求的总时长上限(秒，默认25，小于前端30秒的请求超时)，0表示不限制
+    请求头 X-Request-Timeout 可以为单个请求指定更短的时长(秒)
+    """
+    from flask import request, g
+
+    default_budget = float(os.environ.get('REQUEST_DEADLINE', 25))
+
+    @app.before_request
+    def start_request_deadline():
+        budget = default_budget
+        try:
+            requested = float(request.headers.get('X-Request-Timeout') or 0)
+        except ValueError:
+            requested = 0
+        if requested > 0 and math.isfinite(requested):
+            budget = min(budget, requested) if budget > 0 else requested
+        if budget > 0:
+            g.request_deadline_tokens = (_deadline.set(time.monotonic() + budget), _budget.set(budget))
+
+    @app.teardown_request
+    def clear_request_deadline(exc=None):
+        tokens = g.pop('request_deadline_tokens', None)
+        if tokens is not None:
+            try:
+                _deadline.reset(tokens[0])
+                _budget.reset(tokens[1])
+            except ValueError:
+                _deadline.set(None)
+                _budget.set(None)
+
+
+def remaining():
+    """当前请求剩余的秒数，没有截止时间时返回None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def bind_item_deadline(fn):
+    """
+    批量处理时每一项在开始执行时重新计算截止时间，时长与所属请求相同
+    排在后面的项不会因为前面的项耗时而只剩下很短的超时
+    """
+    budget = _budget.get()
+
+    def wrapper(*args, **kwargs):
+        deadline = time.monotonic() + budget if budget else None
+        tokens = (_deadline.set(deadline), _budget.set(budget))
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _deadline.reset(tokens[0])
+            _budget.reset(tokens[1])
+    return wrapper
+
+
+def call_timeout(upstream):
+    """单次调用的超时：取配置的超时与请求剩余时间的较小值，剩余时间不足时抛出 DeadlineExceeded"""
+    timeout = float(os.environ.get(f'OPENAI_{upstream.upper()}_TIMEOUT', CALL_TIMEOUTS[upstream]))
+    left = remaining()
+    if left is None:
+        return timeout
+    if left < MIN_CALL_TIMES[upstream]:
+        raise DeadlineExceeded('请求处理超时')
+    return min(timeout, left)
+
+
+def is_timeout(error):
+    """上游超时或请求截止时间已到"""
+    if isinstance(error, (DeadlineExceeded, TimeoutError)):
+        return True
+    try:
+        import openai
+    except ImportError:
+        return False
+    return isinstance(error, openai.APITimeoutError)
+
+
+class LatencyWindow:
+    """最近若干次成功调用的耗时，用于计算对冲延迟"""
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct, min_samples=MIN_SAMPLES):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(pct / 100 * len(samples)) - 1))
+        return samples[index]
+
+
+class Hedger:
+    """
+    对冲请求：调用超过最近耗时的指定分位数仍未返回时再发一次，采用先成功返回的结果
+    落后的调用无法中途取消，会在自身超时内结束，结果丢弃
+    对冲请求数不超过调用总数的 max_ratio，上游整体变慢时不会成倍放大压力
+    """
+
+    def __init__(self, percentile=95, min_delay=0.05, max_ratio=0.1, max_workers=64):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self._windows = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+
+    def _window(self, upstream):
+        with self._lock:
+            if upstream not in self._windows:
+                self._windows[upstream] = LatencyWindow()
+            return self._windows[upstream]
+
+    def delay(self, upstream):
+        """发出对冲请求前等待的秒数，样本不足时返回None"""
+        value = self._window(upstream).percentile(self.percentile)
+        return None if value is None else max(value, self.min_delay)
+
+    def _count_call(self, upstream):
+        with self._lock:
+            calls, hedges = self._counts.get(upstream, (0, 0))
+            self._counts[upstream] = (calls + 1, hedges)
+
+    def _take_budget(self, upstream):
+        with self._lock:
+            calls, hedges = self._counts.get(upstream, (0, 0))
+            if hedges + 1 > calls * self.max_ratio:
+                return False
+            self._counts[upstream] = (calls, hedges + 1)
+            return True
+
+    def _attempt(self, upstream, call, timeout):
+        start = time.perf_counter()
+        result = call(timeout)
+        self._window(upstream).add(time.perf_counter() - start)
+        return result
+
+    def call(self, upstream, call):
+        """call(timeout) 发起一次上游调用"""
+        self._count_call(upstream)
+        primary = self._executor.submit(self._attempt, upstream, call, call_timeout(upstream))
+        delay = self.delay(upstream)
+        if delay is None:
+            return primary.result()
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeout:
+            pass
+
+        # 剩余时间不够再发一次或超出对冲比例时继续等待原请求
+        left = remaining()
+        if (left is not None and left < MIN_CALL_TIMES[upstream]) or not self._take_budget(upstream):
+            return primary.result()
+        backup = self._executor.submit(self._attempt, upstream, call, call_timeout(upstream))
+
+        names = {primary: 'primary', backup: 'hedge'}
+        pending = set(names)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    hedged.inc((upstream, names[future]))
+                    return future.result()
+                error = future.exception()
+        hedged.inc((upstream, 'none'))
+        raise error
+
+
+_hedger = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger():
+    """
+    获取进程共享的对冲器，未开启时返回None
+    HEDGE_ENABLED: 设为true开启(默认关闭，对冲会增加模型调用次数)
+    HEDGE_PERCENTILE: 按最近耗时的哪个分位数决定何时发出对冲请求(默认95)
+    HEDGE_MAX_RATIO: 对冲请求数占调用总数的上限(默认0.1)
+    HEDGE_MIN_DELAY: 发出对冲请求前至少等待的秒数(默认0.05)
+    """
+    global _hedger
+    if os.environ.get('HEDGE_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    if _hedger is None:
+        with _hedger_lock:
+            if _hedger is None:
+                _hedger = Hedger(
+                    percentile=float(os.environ.get('HEDGE_PERCENTILE', 95)),
+                    min_delay=float(os.environ.get('HEDGE_MIN_DELAY', 0.05)),
+                    max_ratio=float(os.environ.get('HEDGE_MAX_RATIO', 0.1)),
+                    max_workers=int(os.environ.get('HEDGE_MAX_WORKERS', 64))
+                )
+    return _hedger
+
+
+def call_upstream(upstream, client, call):
+    """
+    在请求截止时间内调用上游，call(client, timeout) 发起一次调用
+    OpenAI SDK 的自动重试次数限制为剩余时间内能容纳的完整尝试次数减一，
+    开启对冲时由 Hedger 决定是否再发一次
+    """
+    try:
+        timeout = call_timeout(upstream)
+        left = remaining()
+        if left is not None:
+            max_retries = int(os.environ.get('OPENAI_MAX_RETRIES', 2))
+            client = client.with_options(max_retries=max(0, min(max_retries, int(left // timeout) - 1)))
+
+        hedger = get_hedger()
+        if hedger is None:
+            return call(client, timeout)
+        return hedger.call(upstream, lambda attempt_timeout: call(client, attempt_timeout))
+    except Exception as e:
+        if is_timeout(e):
+            timeouts.inc((upstream,))
+        raise
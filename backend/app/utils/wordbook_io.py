@@ -0,0 +1,142 @@
+import io
+import re
+import csv
+import json
+import html
+import codecs
+import shutil
+import tempfile
+
+# 支持的导入导出格式
+IMPORT_FORMATS = ('csv', 'tsv', 'anki')
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'tsv': ('text/tab-separated-values', 'tsv'),
+    'json': ('application/x-ndjson', 'jsonl'),
+}
+
+EXPORT_COLUMNS = ('word', 'kana', 'meaning', 'createdAt')
+
+# 表头中可识别的列名
+HEADER_ALIASES = {
+    'word': 'word', '单词': 'word', '単語': 'word', 'front': 'word', 'expression': 'word',
+    'kana': 'kana', '假名': 'kana', 'かな': 'kana', 'reading': 'kana', 'furigana': 'kana',
+    'meaning': 'meaning', '意思': 'meaning', '中文': 'meaning', 'back': 'meaning', 'definition': 'meaning',
+}
+
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+
+def detect_format(filename, requested=None):
+    """根据参数或文件扩展名判断导入格式"""
+    if requested:
+        return requested.lower()
+    ext = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    if ext == 'csv':
+        return 'csv'
+    if ext in ('tsv', 'tab'):
+        return 'tsv'
+    # Anki导出的纯文本笔记为制表符分隔的.txt文件
+    return 'anki'
+
+
+def _clean(value):
+    # Anki字段可能包含HTML标签和实体
+    value = TAG_PATTERN.sub('', value or '')
+    return html.unescape(value).strip()
+
+
+def prepare_import_stream(stream, chunk_size=64 * 1024):
+    """
+    写入之前先完整检查一遍文件编码，避免分批写入一部分后才发现后面的内容无法解码
+    返回 (可从头读取的文件对象, 第一个无法解码的行号)，编码正确时行号为None
+    不能回到开头的流先复制到临时文件(较小时在内存中)
+    """
+    if not stream.seekable():
+        spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        shutil.copyfileobj(stream, spooled)
+        stream = spooled
+    stream.seek(0)
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    line = 1
+    bad_line = None
+    while True:
+        chunk = stream.read(chunk_size)
+        pending = len(decoder.getstate()[0])
+        try:
+            text = decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError as e:
+            # 错误位置相对于解码器缓存的不完整字符加上本次读取的内容
+            bad_line = line + chunk[:max(0, e.start - pending)].count(b'\n')
+            break
+        line += text.count('\n')
+        if not chunk:
+            break
+    stream.seek(0)
+    return stream, bad_line
+
+
+def iter_import_rows(stream, fmt):
+    """
+    逐行解析上传的单词文件，不把整个文件读入内存
+    有表头时按列名识别，否则按 单词, 假名, 意思 的顺序；只有两列时视为 单词, 意思
+    产出 {'word', 'kana', 'meaning'}
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    delimiter = ',' if fmt == 'csv' else '\t'
+
+    if fmt == 'anki':
+        # 跳过 #separator:tab 等文件头
+        lines = (line for line in text if not line.startswith('#'))
+    else:
+        lines = text
+
+    columns = None
+    for row in csv.reader(lines, delimiter=delimiter):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if columns is None:
+            header = [HEADER_ALIASES.get(cell.strip().lower()) for cell in row]
+            if 'word' in header:
+                columns = header
+                continue
+            columns = ['word', 'meaning'] if len(row) == 2 else ['word', 'kana', 'meaning']
+
+        item = {'word': '', 'kana': '', 'meaning': ''}
+        for name, cell in zip(columns, row):
+            if name:
+                item[name] = _clean(cell)
+        if item['word']:
+            yield item
+
+
+def iter_export_chunks(words, fmt, rows_per_chunk=200):
+    """将单词逐批序列化为导出格式，每批产出一段文本"""
+    buffer = io.StringIO()
+
+    if fmt == 'json':
+        writer = None
+    else:
+        writer = csv.writer(buffer, delimiter=',' if fmt == 'csv' else '\t', lineterminator='\n')
+        # 带BOM方便Excel识别UTF-8
+        if fmt == 'csv':
+            buffer.write('\ufeff')
+        writer.writerow(EXPORT_COLUMNS)
+
+    count = 0
+    for word in words:
+        if writer is None:
+            buffer.write(json.dumps({name: word.get(name, '') for name in EXPORT_COLUMNS}, ensure_ascii=False))
+            buffer.write('\n')
+        else:
+            writer.writerow([word.get(name, '') for name in EXPORT_COLUMNS])
+        count += 1
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    remaining = buffer.getvalue()
+    if remaining:
+        yield remaining
@@ -0,0 +1,107 @@
+"""
+token_required 认证开销微基准
+
+用法(在backend目录下运行):
+    python -m benchmarks.bench_auth [--iterations 20000]
+
+对比三种情况的单次认证耗时：
+- legacy: 旧实现，每次 jwt.decode 并向stdout打印约10行日志(含完整payload)
+- cold:   新实现，缓存未命中(每次使用新令牌)
+- warm:   新实现，缓存命中
+"""
+import os
+import sys
+import time
+import argparse
+import datetime
+import jwt
+from flask import Flask
+
+from app.api import wordbook
+from app.api.wordbook import token_required
+
+SECRET_KEY = 'benchmark-secret-key-at-least-32-bytes-long'
+
+
+def legacy_auth(token, out):
+    # 还原旧实现的主要开销：完整解码 + 同步打印
+    print('------- 单词本接口认证开始 -------', file=out)
+    print(f'收到的令牌: {token[:20]}...{token[-10:]}', file=out)
+    print(f'尝试使用密钥解码令牌 (密钥前10个字符: {SECRET_KEY[:10]})', file=out)
+    payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+    print(f'令牌解码成功: {payload}', file=out)
+    user = {
+        'id': payload['user_id'],
+        'name': payload.get('name', '用户'),
+        'email': payload.get('email', ''),
+        'profile_picture': payload.get('profile_picture', '')
+    }
+    print(f'用户验证成功: {user["id"]}', file=out)
+    print('------- 单词本接口认证成功 -------', file=out)
+    return user
+
+
+def make_token(user_id):
+    return jwt.encode({
+        'user_id': user_id,
+        'email': f'{user_id}@example.com',
+        'name': '用户',
+        'profile_picture': '',
+        'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=7)
+    }, SECRET_KEY, algorithm='HS256')
+
+
+def measure(fn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = SECRET_KEY
+
+    @token_required
+    def view(user):
+        return user
+
+    n = args.iterations
+    warm_token = make_token('warm-user')
+    cold_tokens = [make_token(f'user-{i}') for i in range(n)]
+
+    def run_new(token):
+        with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+            return view()
+
+    # 请求上下文本身的开销作为基线，单独扣除
+    def run_context(_):
+        with app.test_request_context(headers={'Authorization': f'Bearer {warm_token}'}):
+            pass
+
+    stdout = sys.stdout if os.environ.get('BENCH_REAL_STDOUT') else open(os.devnull, 'w')
+
+    def run_legacy(i):
+        with app.test_request_context(headers={'Authorization': f'Bearer {warm_token}'}):
+            legacy_auth(warm_token, stdout)
+
+    baseline = measure(run_context, n)
+    legacy = measure(run_legacy, n)
+    wordbook._verified_tokens.clear()
+    cold = measure(lambda i: run_new(cold_tokens[i]), n)
+    run_new(warm_token)
+    warm = measure(lambda i: run_new(warm_token), n)
+
+    print(f"iterations: {n}")
+    print(f"request context only:            {baseline:8.1f} us/request")
+    for name, value in (('legacy (decode + stdout prints)', legacy),
+                        ('new, cache miss', cold),
+                        ('new, cache hit', warm)):
+        print(f"{name + ':':<33}{value:8.1f} us/request  (auth overhead {max(value - baseline, 0):.1f} us)")
+
+if __name__ == '__main__':
+    main()
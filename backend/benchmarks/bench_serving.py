@@ -0,0 +1,173 @@
+"""
+服务器并发压测：在真实的HTTP服务器中启动使用替身的应用，上游调用保持较高延迟，
+逐级提高并发数，对比开发服务器和gunicorn各模式的吞吐量与延迟
+
+用法(在backend目录下运行):
+    python -m benchmarks.bench_serving
+    python -m benchmarks.bench_serving --levels 1,16,64,128 --openai-latency 1000:0.3
+    python -m benchmarks.bench_serving --modes gunicorn-gthread --workers 2 --threads 64
+
+压测请求为不重复的 POST /api/ai/translate，每次都会调用一次模拟的OpenAI接口。
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import itertools
+import datetime
+import threading
+import subprocess
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+
+from benchmarks.run import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET_KEY = 'benchmark-secret-key-at-least-32-bytes-long'
+
+# 所有并发级别共用的查询编号，保证每次请求都不命中翻译缓存
+_query_ids = itertools.count()
+
+DEV_SERVER = """
+import os
+from benchmarks.fake_app import app
+app.run(host='127.0.0.1', port=int(os.environ['PORT']), debug=True, use_reloader=False)
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, args):
+    env = dict(os.environ,
+               PORT=str(port),
+               SECRET_KEY=SECRET_KEY,
+               LOG_LEVEL='WARNING',
+               METRICS_ENABLED='false',
+               BENCH_OPENAI_LATENCY=args.openai_latency,
+               BENCH_FIRESTORE_LATENCY=args.firestore_latency,
+               GUNICORN_BIND=f'127.0.0.1:{port}',
+               GUNICORN_WORKERS=str(args.workers))
+    if mode == 'werkzeug':
+        # 改动前 run.py 的启动方式
+        command = [sys.executable, '-c', DEV_SERVER]
+    else:
+        worker_class = mode.split('-', 1)[1]
+        env['GUNICORN_WORKER_CLASS'] = worker_class
+        env['GUNICORN_THREADS'] = str(args.threads if worker_class == 'gthread' else 1)
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'benchmarks.fake_app:app']
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{mode} 启动失败')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/api/ping')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} 启动超时')
+
+
+def run_level(port, token, concurrency, requests_per_client, timeout):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def client_loop(_):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+        for _ in range(requests_per_client):
+            body = json.dumps({'query': f'単語{next(_query_ids)}'})
+            start = time.perf_counter()
+            try:
+                connection.request('POST', '/api/ai/translate', body=body, headers={
+                    'Content-Type': 'application/json',
+                    'Authorization': f'Bearer {token}'
+                })
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except OSError:
+                ok = False
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+        connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client_loop, range(concurrency)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    total = concurrency * requests_per_client
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': errors[0],
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'rps': round(total / wall, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='werkzeug,gunicorn-sync,gunicorn-gthread',
+                        help='werkzeug / gunicorn-sync / gunicorn-gthread / gunicorn-gevent')
+    parser.add_argument('--levels', default='1,8,32,64', help='逗号分隔的并发数')
+    parser.add_argument('--requests-per-client', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn进程数')
+    parser.add_argument('--threads', type=int, default=64, help='gthread每个进程的线程数')
+    parser.add_argument('--openai-latency', default='500:0.2')
+    parser.add_argument('--firestore-latency', default='15:0.3')
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+    args = parser.parse_args()
+
+    token = jwt.encode({
+        'user_id': 'bench-user',
+        'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    }, SECRET_KEY, algorithm='HS256')
+    levels = [int(level) for level in args.levels.split(',')]
+
+    report = {'settings': vars(args), 'results': {}}
+    for mode in args.modes.split(','):
+        port = free_port()
+        process = start_server(mode, port, args)
+        try:
+            results = []
+            for concurrency in levels:
+                result = run_level(port, token, concurrency, args.requests_per_client, args.timeout)
+                results.append(result)
+                if not args.json:
+                    print(f"{mode:<18} 并发 {concurrency:>4}  {result['rps']:>7.1f} req/s  "
+                          f"p50 {result['p50_ms']:>8.1f}ms  p95 {result['p95_ms']:>8.1f}ms  errors {result['errors']}",
+                          flush=True)
+            report['results'][mode] = results
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
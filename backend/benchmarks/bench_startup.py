@@ -0,0 +1,101 @@
+"""
+冷启动耗时报告：在全新的子进程中导入 run.py(包含 create_app)并处理第一个请求
+
+用法(在backend目录下运行):
+    python -m benchmarks.bench_startup            # 默认重复5次取中位数
+    python -m benchmarks.bench_startup --runs 10 --top 20
+
+输出:
+- import run.py 的耗时、第一个请求(/api/ping)的耗时
+- 导入完成后已加载的重量级模块(openai、PIL、google.auth、Firestore客户端等)
+- python -X importtime 统计的耗时最多的顶层模块
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 冷启动时不应加载的模块，应在第一次使用时才导入
+HEAVY_MODULES = ('openai', 'httpx', 'PIL', 'google.auth', 'google.oauth2', 'google.cloud.firestore',
+                 'google.cloud.storage', 'grpc', 'firebase_admin.auth')
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import run
+imported = time.perf_counter()
+client = run.app.test_client()
+client.get('/api/ping')
+first_request = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_request_ms': (first_request - imported) * 1000,
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_probe(extra_args=()):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='0', LOG_LEVEL='WARNING')
+    result = subprocess.run([sys.executable, *extra_args, '-c', PROBE], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else '子进程启动失败')
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def parse_importtime(stderr, top):
+    """解析 -X importtime 输出，按顶层包汇总累计耗时，返回耗时最多的 [(包, 毫秒)]"""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        root = parts[2].strip().split('.')[0]
+        if root == 'run':
+            continue
+        # 包第一次导入的累计耗时已包含其子模块，取最大值
+        packages[root] = max(packages.get(root, 0), int(parts[1]) / 1000)
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='显示耗时最多的顶层模块数')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+    args = parser.parse_args()
+
+    # 先运行一次预热.pyc缓存，避免把编译时间计入结果
+    run_probe()
+    samples = [run_probe()[0] for _ in range(args.runs)]
+    probe, stderr = run_probe(('-X', 'importtime'))
+
+    report = {
+        'runs': args.runs,
+        'import_ms': round(statistics.median(s['import_ms'] for s in samples), 1),
+        'first_request_ms': round(statistics.median(s['first_request_ms'] for s in samples), 1),
+        'heavy_modules_loaded': probe['loaded'],
+        'slowest_imports': [{'module': name, 'ms': round(ms, 1)} for name, ms in parse_importtime(stderr, args.top)],
+    }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"import run.py:     {report['import_ms']:8.1f} ms (中位数，共{args.runs}次)")
+    print(f"第一个请求:         {report['first_request_ms']:8.1f} ms")
+    print(f"已加载的重量级模块: {', '.join(report['heavy_modules_loaded']) or '无'}")
+    print('耗时最多的包(累计):')
+    for item in report['slowest_imports']:
+        print(f"  {item['ms']:8.1f} ms  {item['module']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""
+使用进程内替身的应用实例，供 bench_serving 在真实的HTTP服务器中启动:
+    gunicorn -c gunicorn.conf.py benchmarks.fake_app:app
+
+替身延迟通过环境变量配置，格式同 benchmarks.run:
+BENCH_FIRESTORE_LATENCY、BENCH_STORAGE_LATENCY、BENCH_OPENAI_LATENCY
+"""
+import os
+import tempfile
+
+os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key-at-least-32-bytes-long')
+os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+os.environ.setdefault('TTS_CACHE_DIR', tempfile.mkdtemp(prefix='shirupic-bench-tts-'))
+os.environ.setdefault('ANALYSIS_CACHE_BACKEND', 'memory')
+os.environ.setdefault('TRANSLATE_CACHE_BACKEND', 'memory')
+os.environ.setdefault('ADMISSION_ENABLED', 'false')
+
+from benchmarks.fakes import FakeFirestore, FakeBucket, FakeOpenAI
+from app import create_app
+
+app = create_app({
+    'FIRESTORE_CLIENT': FakeFirestore(os.environ.get('BENCH_FIRESTORE_LATENCY', '15:0.3')),
+    'STORAGE_BUCKET': FakeBucket(os.environ.get('BENCH_STORAGE_LATENCY', '60:0.4')),
+    'OPENAI_CLIENT': FakeOpenAI(os.environ.get('BENCH_OPENAI_LATENCY', '600:0.5')),
+})
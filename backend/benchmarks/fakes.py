@@ -0,0 +1,503 @@
+"""
+基准测试使用的进程内替身：Firestore、Firebase Storage 和 OpenAI 客户端
+
+每次远程调用(文档读写、查询、批量提交、上传、模型调用)都会按配置的延迟分布休眠，
+用于在没有真实Firebase项目和OpenAI密钥的情况下测量后端自身的开销和并发行为。
+"""
+import io
+import copy
+import json
+import math
+import time
+import uuid
+import random
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from google.cloud.firestore_v1 import transforms
+from google.api_core.exceptions import AlreadyExists, NotFound
+
+
+class Latency:
+    """
+    延迟分布(毫秒)，格式：
+    - "20": 固定20ms
+    - "20:0.5": 中位数20ms、sigma为0.5的对数正态分布，模拟长尾
+    - "600:0.3:0.02:20": 在此基础上2%的调用变慢20倍，模拟偶发卡住的上游请求
+    - "0": 不休眠
+    """
+
+    def __init__(self, spec='0'):
+        parts = str(spec).split(':')
+        self.median = float(parts[0])
+        self.sigma = float(parts[1]) if len(parts) > 1 else 0.0
+        self.stall_ratio = float(parts[2]) if len(parts) > 2 else 0.0
+        self.stall_factor = float(parts[3]) if len(parts) > 3 else 10.0
+        self._random = random.Random(hash(spec))
+        self._lock = threading.Lock()
+
+    def sample(self):
+        if self.median <= 0:
+            return 0.0
+        with self._lock:
+            value = self.median
+            if self.sigma > 0:
+                value = self._random.lognormvariate(math.log(self.median), self.sigma)
+            if self.stall_ratio > 0 and self._random.random() < self.stall_ratio:
+                value *= self.stall_factor
+        return value / 1000
+
+    def wait(self, timeout=None):
+        """休眠一次采样的延迟，超过 timeout 时休眠 timeout 秒后抛出 TimeoutError"""
+        seconds = self.sample()
+        if timeout is not None and seconds > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f'request timed out after {timeout:.1f}s')
+        if seconds:
+            time.sleep(seconds)
+
+
+# ---------------------------------------------------------------- Firestore
+
+def _resolve(value, current=None):
+    """处理 SERVER_TIMESTAMP、Increment 和 ArrayUnion 等特殊值"""
+    if value is transforms.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, transforms.Increment):
+        return (current or 0) + value.value
+    if isinstance(value, transforms.ArrayUnion):
+        current = list(current) if isinstance(current, list) else []
+        return current + [item for item in value.values if item not in current]
+    if isinstance(value, transforms.ArrayRemove):
+        return [item for item in (current or []) if item not in value.values]
+    return copy.deepcopy(value)
+
+
+def _check_value(value, in_array=False):
+    """与Firestore一致，拒绝数组直接嵌套数组的值"""
+    if isinstance(value, (list, tuple)):
+        if in_array:
+            raise ValueError('Cannot convert nested arrays')
+        for item in value:
+            _check_value(item, True)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _check_value(item)
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        if self._data is None or field not in self._data:
+            raise KeyError(field)
+        return copy.deepcopy(self._data[field])
+
+
+class FakeDocumentReference:
+    def __init__(self, db, collection, doc_id):
+        self._db = db
+        self.collection_name = collection
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self.collection_name}/{self.id}"
+
+    def _apply_set(self, data, merge=False):
+        docs = self._db._collection(self.collection_name)
+        current = docs.get(self.id) if merge else None
+        result = dict(current) if current else {}
+        _check_value(data)
+        for key, value in data.items():
+            result[key] = _resolve(value, result.get(key))
+        docs[self.id] = result
+
+    def _apply_update(self, data):
+        docs = self._db._collection(self.collection_name)
+        if self.id not in docs:
+            raise KeyError(f'文档不存在: {self.path}')
+        _check_value(data)
+        for key, value in data.items():
+            docs[self.id][key] = _resolve(value, docs[self.id].get(key))
+
+    def _apply_delete(self):
+        self._db._collection(self.collection_name).pop(self.id, None)
+
+    def set(self, data, merge=False):
+        self._db.latency.wait()
+        with self._db.lock:
+            self._apply_set(data, merge)
+
+    def create(self, data):
+        self._db.latency.wait()
+        with self._db.lock:
+            if self.id in self._db._collection(self.collection_name):
+                raise ValueError(f'文档已存在: {self.path}')
+            self._apply_set(data)
+
+    def update(self, data):
+        self._db.latency.wait()
+        with self._db.lock:
+            self._apply_update(data)
+
+    def delete(self):
+        self._db.latency.wait()
+        with self._db.lock:
+            self._apply_delete()
+
+    def get(self):
+        self._db.latency.wait()
+        return self._db._snapshot(self)
+
+
+class FakeQuery:
+    OPERATORS = {
+        '==': lambda a, b: a == b,
+        '!=': lambda a, b: a != b,
+        '<': lambda a, b: a is not None and a < b,
+        '<=': lambda a, b: a is not None and a <= b,
+        '>': lambda a, b: a is not None and a > b,
+        '>=': lambda a, b: a is not None and a >= b,
+        'in': lambda a, b: a in b,
+        'array_contains': lambda a, b: isinstance(a, list) and b in a,
+    }
+
+    def __init__(self, db, collection, filters=(), orders=(), limit_count=None, cursor=None, fields=None):
+        self._db = db
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._cursor = cursor
+        self._fields = fields
+
+    def _copy(self, **changes):
+        params = dict(filters=self._filters, orders=self._orders, limit_count=self._limit,
+                      cursor=self._cursor, fields=self._fields)
+        params.update(changes)
+        return FakeQuery(self._db, self._collection, **params)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def start_after(self, cursor):
+        return self._copy(cursor=cursor)
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    @staticmethod
+    def _sort_value(item, field):
+        value = item[0] if field == '__name__' else item[1].get(field)
+        # 缺少字段的文档排在最后
+        return (value is None, value)
+
+    def _matches(self, data):
+        return all(self.OPERATORS[op](data.get(field), value) for field, op, value in self._filters)
+
+    def _cursor_values(self):
+        if isinstance(self._cursor, FakeSnapshot):
+            data = self._cursor._data or {}
+            return [self._cursor.id if field == '__name__' else data.get(field) for field, _ in self._orders]
+        return [self._cursor.get(field) for field, _ in self._orders]
+
+    def _after_cursor(self, doc_id, data, cursor_values):
+        for (field, direction), value in zip(self._orders, cursor_values):
+            current = doc_id if field == '__name__' else data.get(field)
+            if current == value:
+                continue
+            descending = str(direction).upper().endswith('DESCENDING')
+            return current < value if descending else current > value
+        return False
+
+    def _run(self):
+        with self._db.lock:
+            docs = [(doc_id, copy.deepcopy(data)) for doc_id, data in self._db._collection(self._collection).items()
+                    if self._matches(data)]
+        for field, direction in reversed(self._orders):
+            descending = str(direction).upper().endswith('DESCENDING')
+            docs.sort(key=lambda item: self._sort_value(item, field), reverse=descending)
+        if self._cursor is not None:
+            cursor_values = self._cursor_values()
+            docs = [item for item in docs if self._after_cursor(item[0], item[1], cursor_values)]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        results = []
+        for doc_id, data in docs:
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            ref = FakeDocumentReference(self._db, self._collection, doc_id)
+            results.append(FakeSnapshot(ref, data))
+        return results
+
+    def stream(self):
+        self._db.latency.wait()
+        return iter(self._run())
+
+    def get(self):
+        self._db.latency.wait()
+        return self._run()
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, db, name):
+        super().__init__(db, name)
+        self.id = name
+
+    def document(self, doc_id=None):
+        return FakeDocumentReference(self._db, self._collection, doc_id or uuid.uuid4().hex)
+
+
+class FakeWriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append(('set', ref, data, merge))
+
+    def create(self, ref, data):
+        self._writes.append(('create', ref, data, False))
+
+    def update(self, ref, data):
+        self._writes.append(('update', ref, data, False))
+
+    def delete(self, ref):
+        self._writes.append(('delete', ref, None, False))
+
+    def commit(self):
+        if len(self._writes) > 500:
+            raise ValueError('批量写入最多包含500个操作')
+        self._db.latency.wait()
+        with self._db.lock:
+            # 与Firestore一致，create 的文档已存在时整批都不写入
+            for op, ref, _, _ in self._writes:
+                if op == 'create' and ref.id in self._db._collection(ref.collection_name):
+                    raise AlreadyExists(f'Document already exists: {ref.path}')
+            for op, ref, data, merge in self._writes:
+                if op in ('set', 'create'):
+                    ref._apply_set(data, merge)
+                elif op == 'update':
+                    ref._apply_update(data)
+                else:
+                    ref._apply_delete()
+        self._db.stats['batch_commits'] += 1
+        return []
+
+
+class FakeFirestore:
+    """内存中的Firestore替身，覆盖后端使用到的接口"""
+
+    def __init__(self, latency='0'):
+        self.latency = latency if isinstance(latency, Latency) else Latency(latency)
+        self.lock = threading.RLock()
+        self.data = {}
+        self.stats = {'batch_commits': 0}
+
+    def _collection(self, name):
+        return self.data.setdefault(name, {})
+
+    def _snapshot(self, ref):
+        with self.lock:
+            data = self._collection(ref.collection_name).get(ref.id)
+            return FakeSnapshot(ref, copy.deepcopy(data))
+
+    def collection(self, name):
+        return FakeCollectionReference(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, refs, field_paths=None):
+        refs = list(refs)
+        self.latency.wait()
+        return [self._snapshot(ref) for ref in refs]
+
+
+# ---------------------------------------------------------------- Storage
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self._bucket = bucket
+        self.name = name
+        self.chunk_size = None
+        self.size = None
+        self.updated = None
+
+    @property
+    def public_url(self):
+        return f"https://storage.example.com/{self._bucket.name}/{self.name}"
+
+    def upload_from_string(self, data, content_type=None, predefined_acl=None):
+        self._bucket.latency.wait()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self._bucket.lock:
+            self._bucket.blobs[self.name] = (bytes(data), content_type, datetime.now(timezone.utc))
+
+    def upload_from_file(self, file_obj, content_type=None, size=None, predefined_acl=None, rewind=False):
+        if rewind:
+            file_obj.seek(0)
+        self.upload_from_string(file_obj.read() if size is None else file_obj.read(size), content_type)
+
+    def make_public(self):
+        self._bucket.latency.wait()
+
+    def exists(self):
+        self._bucket.latency.wait()
+        with self._bucket.lock:
+            return self.name in self._bucket.blobs
+
+    def reload(self):
+        self._bucket.latency.wait()
+        with self._bucket.lock:
+            if self.name not in self._bucket.blobs:
+                raise NotFound(f'No such object: {self._bucket.name}/{self.name}')
+            data, _, self.updated = self._bucket.blobs[self.name]
+            self.size = len(data)
+
+    def download_as_bytes(self):
+        self._bucket.latency.wait()
+        with self._bucket.lock:
+            return self._bucket.blobs[self.name][0]
+
+    def delete(self):
+        self._bucket.latency.wait()
+        with self._bucket.lock:
+            self._bucket.blobs.pop(self.name, None)
+
+
+class FakeBucket:
+    def __init__(self, latency='0', name='benchmark-bucket'):
+        self.latency = latency if isinstance(latency, Latency) else Latency(latency)
+        self.name = name
+        self.lock = threading.Lock()
+        self.blobs = {}
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def list_blobs(self, prefix=''):
+        self.latency.wait()
+        with self.lock:
+            items = [(name, len(data), updated) for name, (data, _, updated) in self.blobs.items()
+                     if name.startswith(prefix)]
+        blobs = []
+        for name, size, updated in sorted(items):
+            blob = FakeBlob(self, name)
+            blob.size, blob.updated = size, updated
+            blobs.append(blob)
+        return blobs
+
+
+# ---------------------------------------------------------------- OpenAI
+
+VISION_RESULT = {
+    "words": [
+        {"id": "uuid", "word": "猫", "kana": "ねこ", "meaning": "猫", "position": {"x": 30, "y": 40}},
+        {"id": "uuid", "word": "椅子", "kana": "いす", "meaning": "椅子", "position": {"x": 60, "y": 70}},
+    ],
+    "sentence": {"japanese": "猫が椅子の上にいます。", "chinese": "猫在椅子上。"}
+}
+
+
+def _translation_for(query):
+    return json.dumps({
+        "word": query,
+        "kana": "かな",
+        "meaning": f"{query}的意思",
+        "example": f"{query}を使った例文です。",
+        "exampleMeaning": "这是一个例句。"
+    }, ensure_ascii=False)
+
+
+class _FakeStream(list):
+    def close(self):
+        pass
+
+
+class FakeOpenAI:
+    """OpenAI客户端替身，支持 responses / chat.completions / audio.speech"""
+
+    def __init__(self, latency='0', tts_bytes=24000):
+        self.latency = latency if isinstance(latency, Latency) else Latency(latency)
+        self.tts_bytes = tts_bytes
+        self.calls = {'vision': 0, 'chat': 0, 'tts': 0}
+        self._lock = threading.Lock()
+        self.responses = SimpleNamespace(create=self._vision)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.audio = SimpleNamespace(speech=SimpleNamespace(create=self._speech))
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def _vision(self, timeout=None, **kwargs):
+        self._count('vision')
+        self.latency.wait(timeout)
+        text = json.dumps(VISION_RESULT, ensure_ascii=False)
+        return SimpleNamespace(output=[SimpleNamespace(content=[SimpleNamespace(text=text)])])
+
+    def _chat(self, model=None, messages=None, stream=False, timeout=None, **kwargs):
+        self._count('chat')
+        query = messages[-1]['content'] if messages else ''
+        text = _translation_for(query)
+        if not stream:
+            self.latency.wait(timeout)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+        # 流式响应：首个片段前等待完整延迟的一部分，其余片段均匀输出
+        first_token = self.latency.sample()
+        time.sleep(first_token * 0.3)
+        chunks = [text[i:i + 8] for i in range(0, len(text), 8)]
+        per_chunk = first_token * 0.7 / max(len(chunks), 1)
+
+        def generate():
+            for chunk in chunks:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))])
+                time.sleep(per_chunk)
+
+        return _FakeStream(generate())
+
+    def _speech(self, input=None, **kwargs):
+        self._count('tts')
+        self.latency.wait()
+        seed = (input or '').encode('utf-8') or b'0'
+        content = (seed * (self.tts_bytes // len(seed) + 1))[:self.tts_bytes]
+        return SimpleNamespace(content=content)
+
+
+def make_test_image(seed, size=(1280, 960)):
+    """生成每个seed都不同的JPEG图片，避免命中分析结果缓存"""
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    img = Image.new('RGB', size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(50, 400), y0 + rng.randrange(50, 400)
+        draw.rectangle([x0, y0, x1, y1], fill=tuple(rng.randrange(256) for _ in range(3)))
+    output = io.BytesIO()
+    img.save(output, 'JPEG', quality=90)
+    return output.getvalue()
+
@@ -0,0 +1,311 @@
+"""
+后端接口基准测试：使用进程内替身代替Firestore、Storage和OpenAI，测量各接口的延迟分布和吞吐量
+
+用法(在backend目录下运行):
+    python -m benchmarks.run                                  # 运行全部场景
+    python -m benchmarks.run --scenarios analyze,translate    # 只运行指定场景
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json   # 与基线对比，出现回退时退出码为1
+
+延迟分布格式见 benchmarks/fakes.py 中的 Latency，例如 "600:0.5" 表示中位数600ms的对数正态分布，
+"600:0.3:0.03:20" 表示另有3%的调用慢20倍。
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 在导入应用之前准备好隔离的运行环境
+os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key-at-least-32-bytes-long')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+os.environ['TTS_CACHE_DIR'] = tempfile.mkdtemp(prefix='shirupic-bench-tts-')
+os.environ['ANALYSIS_CACHE_BACKEND'] = 'memory'
+os.environ['TRANSLATE_CACHE_BACKEND'] = 'memory'
+# 基准测试由单个用户高频请求，关闭准入控制以测量完整的处理耗时
+os.environ.setdefault('ADMISSION_ENABLED', 'false')
+
+import jwt
+
+from benchmarks.fakes import FakeFirestore, FakeBucket, FakeOpenAI, make_test_image
+
+USER_ID = 'bench-user'
+
+VOCABULARY = ['猫', '犬', '椅子', '机', '本', '水', '空', '山', '川', '花',
+              '車', '電車', '学校', '先生', '友達', '時計', '電話', '窓', '扉', '鞄',
+              '靴', '帽子', '眼鏡', '財布', '鍵', '傘', '皿', '箸', 'コップ', 'テーブル']
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def seed_data(db, history_count, word_count):
+    """预先写入历史记录和单词，使列表接口有真实的数据量"""
+    from firebase_admin import firestore
+    from app.utils.firebase_utils import add_history_items, commit_writes
+
+    records = []
+    for i in range(history_count):
+        records.append({
+            'user_id': USER_ID,
+            'image_url': f'https://storage.example.com/seed/{i}.webp',
+            'image_storage_path': f'uploads/seed_{i}.webp',
+            'sentence': '猫が椅子の上にいます。',
+            'translated_sentence': '猫在椅子上。',
+            'detected_words': [
+                {'word': '猫', 'kana': 'ねこ', 'meaning': '猫', 'position_x': 30, 'position_y': 40},
+                {'word': '椅子', 'kana': 'いす', 'meaning': '椅子', 'position_x': 60, 'position_y': 70},
+            ]
+        })
+    history_ids, _ = add_history_items(records)
+
+    writes = []
+    words_ref = db.collection('words')
+    for i in range(word_count):
+        word_id = f'seed-word-{i}'
+        writes.append(('set', words_ref.document(word_id), {
+            'id': word_id,
+            'user_id': USER_ID,
+            'word': f'単語{i}',
+            'kana': f'たんご{i}',
+            'meaning': f'单词{i}',
+            'created_at': firestore.SERVER_TIMESTAMP
+        }))
+    commit_writes(writes)
+    return history_ids
+
+
+def build_scenarios(history_ids, images):
+    etags = {}
+
+    def revalidate(client, path):
+        # 带上一次响应的ETag重新请求，列表未变化时返回304
+        if path not in etags:
+            etags[path] = client.get(path).headers.get('ETag')
+        return client.get(path, headers={'If-None-Match': etags[path]})
+
+    def analyze(client, i):
+        data = {'image': (io.BytesIO(images[i % len(images)]), f'photo_{i}.jpg')}
+        return client.post('/api/image/analyze', data=data, content_type='multipart/form-data')
+
+    def translate(client, i):
+        # 不需要例句时常用词由本地词典直接返回
+        return client.post('/api/ai/translate', json={'query': VOCABULARY[i % len(VOCABULARY)], 'examples': False})
+
+    def translate_examples(client, i):
+        # 需要例句时调用模型，重复的查询命中翻译缓存
+        return client.post('/api/ai/translate', json={'query': VOCABULARY[i % len(VOCABULARY)], 'examples': True})
+
+    def translate_model(client, i):
+        # 使用不重复的查询，每次都调用模型，用于观察上游长尾延迟的影响
+        return client.post('/api/ai/translate', json={'query': f'{VOCABULARY[i % len(VOCABULARY)]}{i}', 'examples': True})
+
+    def translate_stream(client, i):
+        # 使用不重复的查询，测量流式接口的完整耗时
+        return client.post('/api/ai/translate/stream', json={'query': f'{VOCABULARY[i % len(VOCABULARY)]}{i}'})
+
+    def tts(client, i):
+        return client.post('/api/tts/speak', json={'text': VOCABULARY[i % len(VOCABULARY)]})
+
+    def history_list(client, i):
+        return client.get('/api/history')
+
+    def history_page(client, i):
+        return client.get('/api/history?limit=20')
+
+    def history_detail(client, i):
+        return client.get(f'/api/history/{history_ids[i % len(history_ids)]}')
+
+    def wordbook_list(client, i):
+        return client.get('/api/wordbook')
+
+    def history_revalidate(client, i):
+        return revalidate(client, '/api/history')
+
+    def wordbook_revalidate(client, i):
+        return revalidate(client, '/api/wordbook')
+
+    def wordbook_add(client, i):
+        word = VOCABULARY[i % len(VOCABULARY)]
+        return client.post('/api/wordbook/add', json={'word': f'{word}{i}', 'kana': 'かな', 'meaning': '意思'})
+
+    return {
+        'analyze': analyze,
+        'translate': translate,
+        'translate_examples': translate_examples,
+        'translate_model': translate_model,
+        'translate_stream': translate_stream,
+        'tts': tts,
+        'history_list': history_list,
+        'history_page': history_page,
+        'history_detail': history_detail,
+        'wordbook_list': wordbook_list,
+        'history_revalidate': history_revalidate,
+        'wordbook_revalidate': wordbook_revalidate,
+        'wordbook_add': wordbook_add,
+    }
+
+
+def run_scenario(app, token, fn, requests, concurrency):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+            client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        start = time.perf_counter()
+        response = fn(client, i)
+        # 读取完整响应体，流式接口也计入全部耗时
+        _ = response.get_data()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors.append(f'{response.status_code}: {response.get_data(as_text=True)[:200]}')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'rps': round(requests / wall, 1) if wall > 0 else None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """p95上升或吞吐量下降超过容忍比例视为回退"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        if base['p95_ms'] > 0 and current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if base.get('rps') and current['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: rps {base['rps']} -> {current['rps']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default='all', help='逗号分隔的场景名称，默认全部')
+    parser.add_argument('--requests', type=int, default=100, help='每个场景的请求数')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--firestore-latency', default='15:0.3')
+    parser.add_argument('--storage-latency', default='60:0.4')
+    parser.add_argument('--openai-latency', default='600:0.5')
+    parser.add_argument('--seed-history', type=int, default=300, help='预置的历史记录数')
+    parser.add_argument('--seed-words', type=int, default=1000, help='预置的单词数')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='对比基线时允许的回退比例')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+    args = parser.parse_args()
+
+    db = FakeFirestore('0')
+    bucket = FakeBucket(args.storage_latency)
+    openai_client = FakeOpenAI(args.openai_latency)
+
+    from app import create_app
+    app = create_app({'FIRESTORE_CLIENT': db, 'STORAGE_BUCKET': bucket, 'OPENAI_CLIENT': openai_client,
+                      'TESTING': True})
+
+    # 预置数据时不计延迟，完成后再启用
+    history_ids = seed_data(db, args.seed_history, args.seed_words)
+    from benchmarks.fakes import Latency
+    db.latency = Latency(args.firestore_latency)
+
+    token = jwt.encode({
+        'user_id': USER_ID,
+        'name': 'benchmark',
+        'email': 'bench@example.com',
+        'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    }, os.environ['SECRET_KEY'], algorithm='HS256')
+
+    images = [make_test_image(i) for i in range(args.requests)]
+    scenarios = build_scenarios(history_ids, images)
+    selected = list(scenarios) if args.scenarios == 'all' else [name.strip() for name in args.scenarios.split(',')]
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        parser.error(f"未知的场景: {', '.join(unknown)}，可选: {', '.join(scenarios)}")
+
+    random.seed(0)
+    results = {}
+    for name in selected:
+        results[name] = run_scenario(app, token, scenarios[name], args.requests, args.concurrency)
+        if not args.json:
+            r = results[name]
+            print(f"{name:<18} p50 {r['p50_ms']:>8.1f}ms  p95 {r['p95_ms']:>8.1f}ms  p99 {r['p99_ms']:>8.1f}ms  "
+                  f"{r['rps']:>8.1f} req/s  errors {r['errors']}", flush=True)
+            if r['first_error']:
+                print(f"    first error: {r['first_error']}")
+
+    report = {
+        'recorded_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'settings': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'firestore_latency': args.firestore_latency,
+            'storage_latency': args.storage_latency,
+            'openai_latency': args.openai_latency,
+            'seed_history': args.seed_history,
+            'seed_words': args.seed_words,
+        },
+        'upstream_calls': openai_client.calls,
+        'results': results,
+    }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"基线已保存到 {args.save_baseline}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != report['settings']:
+            print('警告: 与基线的运行参数不同，对比结果仅供参考', file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('性能回退:', file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print('与基线相比没有性能回退', file=sys.stderr)
+
+    if any(r['errors'] for r in results.values()):
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
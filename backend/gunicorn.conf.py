@@ -0,0 +1,50 @@
+"""
+生产环境的gunicorn配置，启动方式:
+    gunicorn -c gunicorn.conf.py run:app
+
+请求大部分时间在等待OpenAI和Firebase返回，默认使用单个进程、多个线程(gthread)，
+在同一进程内共享连接池、缓存和异步任务队列。所有配置都可以通过环境变量覆盖。
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5001')}")
+
+# 工作进程类型: gthread(默认) / gevent(需要安装gevent)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+# 进程数，默认1个，通过线程数扩展并发
+# 异步分析任务保存在进程内存中，多个进程时查询任务状态的请求可能落到其他进程而返回404，
+# 只有在前面有按用户会话保持的负载均衡时才应调大
+workers = int(os.environ.get('GUNICORN_WORKERS') or os.environ.get('WEB_CONCURRENCY') or 1)
+
+# gthread每个进程的线程数，即每个进程可同时等待的上游请求数
+threads = int(os.environ.get('GUNICORN_THREADS', 64))
+
+# gevent每个进程的最大并发连接数
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# 视觉模型和流式翻译可能持续数十秒，超时需要大于 OPENAI_TIMEOUT
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# 定期重启工作进程，防止长时间运行后内存增长
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+# Firebase、OpenAI客户端在第一次使用时才创建，各工作进程在fork之后各自建立连接
+preload_app = False
+
+
+def post_worker_init(worker):
+    if worker_class == 'gevent':
+        # Firestore客户端基于gRPC，在gevent下需要让gRPC使用协程友好的IO
+        try:
+            from grpc.experimental import gevent as grpc_gevent
+            grpc_gevent.init_gevent()
+        except ImportError:
+            pass
@@ -1,6 +1,13 @@
+import os
 from app import create_app
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    # 开发服务器，仅用于本地调试；生产环境使用 gunicorn -c gunicorn.conf.py run:app
+    app.run(
+        debug=os.environ.get('FLASK_DEBUG', 'false').lower() in ('1', 'true', 'yes'),
+        host='0.0.0.0',
+        port=int(os.environ.get('PORT', 5001)),
+        threaded=True
+    )
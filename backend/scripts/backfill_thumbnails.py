@@ -0,0 +1,75 @@
+"""
+为没有缩略图的旧历史记录生成缩略图和占位图
+
+用法(在backend目录下运行):
+    python -m scripts.backfill_thumbnails [--dry-run] [--page-size 200]
+
+--dry-run  只统计需要处理的记录，不生成也不写入
+"""
+import sys
+import argparse
+
+from app import create_app
+from scripts.migrate_detected_words import iter_history_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--page-size', type=int, default=200)
+    args = parser.parse_args()
+
+    create_app()
+    from app.services import get_firestore, get_storage_bucket
+    from app.utils.firebase_utils import upload_thumbnail, commit_versioned_writes
+
+    try:
+        firestore_db = get_firestore()
+        bucket = get_storage_bucket()
+    except Exception as e:
+        print(f'Firebase 初始化失败，请检查 FIREBASE_CREDENTIALS 配置: {str(e)}')
+        sys.exit(1)
+
+    processed = 0
+    failed = 0
+    commits = 0
+    for docs in iter_history_pages(firestore_db, args.page_size):
+        pending = []
+        for doc in docs:
+            data = doc.to_dict() or {}
+            if not data.get('thumbnail_url') and data.get('image_storage_path'):
+                pending.append((doc, data['image_storage_path'], data.get('user_id')))
+        if not pending:
+            continue
+
+        writes = []
+        user_ids = set()
+        for doc, storage_path, user_id in pending:
+            if args.dry_run:
+                processed += 1
+                continue
+            try:
+                image_data = bucket.blob(storage_path).download_as_bytes()
+            except Exception as e:
+                print(f'下载图片失败 {storage_path}: {str(e)}')
+                failed += 1
+                continue
+            thumbnail = upload_thumbnail(image_data, storage_path.rsplit('/', 1)[-1])
+            if thumbnail is None:
+                failed += 1
+                continue
+            writes.append(('update', doc.reference, thumbnail))
+            user_ids.add(user_id)
+            processed += 1
+
+        # 同时更新这些用户的历史记录版本号，客户端缓存的列表会重新获取
+        if writes:
+            commits += commit_versioned_writes(writes, 'history', [user_id for user_id in user_ids if user_id])
+        print(f"已处理 {processed} 条历史记录，失败 {failed} 条")
+
+    action = '需要处理' if args.dry_run else '已生成缩略图'
+    print(f"完成：{action} {processed} 条历史记录，失败 {failed} 条，提交 {commits} 次批量写入")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+生成翻译接口使用的本地词典文件(SQLite)
+
+用法(在backend目录下运行):
+    python -m scripts.build_dictionary [--tsv words.tsv ...] [--jmdict JMdict.gz --lang eng] [--output PATH]
+
+--tsv     单词<TAB>假名<TAB>中文意思 格式的词典文件，可指定多次，优先于JMdict
+--jmdict  JMdict的XML文件(支持.gz)，按 --lang 选择释义语言；JMdict没有中文释义，
+          其他语言的词条不会作为翻译结果返回，只用于判断同音词是否有歧义
+--output  输出路径，默认为 DICTIONARY_PATH 或 .cache/dictionary.sqlite
+
+随代码提供的种子词典始终会被导入，且优先级最高。
+"""
+import os
+import re
+import gzip
+import sqlite3
+import argparse
+import xml.etree.ElementTree as ET
+
+from app.utils.dictionary import (BACKEND_DIR, SEED_PATH, SEED_PRIORITY, DEFAULT_PRIORITY, MEANING_LANG,
+                                  create_index, insert_entries, iter_tsv_entries)
+
+TSV_PRIORITY = 10
+
+# JMdict的 ke_pri / re_pri 标签表示常用词，nfXX 为按词频划分的组号(01最常用)
+JMDICT_PRIORITY = 20
+COMMON_TAGS = {'news1', 'ichi1', 'spec1', 'spec2', 'gai1'}
+
+XML_LANG = '{http://www.w3.org/XML/1998/namespace}lang'
+
+
+def _jmdict_priority(tags):
+    ranks = [int(tag[2:]) for tag in tags if re.fullmatch(r'nf\d\d', tag)]
+    if ranks:
+        return JMDICT_PRIORITY + min(ranks)
+    if COMMON_TAGS.intersection(tags):
+        return JMDICT_PRIORITY + 50
+    return DEFAULT_PRIORITY
+
+
+def iter_jmdict_entries(path, lang='eng', max_glosses=3):
+    """逐个解析JMdict词条，返回 (单词, 假名, 释义, 优先级, 释义语言)"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        for _, element in ET.iterparse(f, events=('end',)):
+            if element.tag != 'entry':
+                continue
+            kanji = [k.findtext('keb') for k in element.findall('k_ele')]
+            readings = [r.findtext('reb') for r in element.findall('r_ele')]
+            tags = [t.text for t in element.iter() if t.tag in ('ke_pri', 're_pri')]
+            glosses = []
+            for sense in element.findall('sense'):
+                for gloss in sense.findall('gloss'):
+                    if gloss.get(XML_LANG, 'eng') == lang and gloss.text:
+                        glosses.append(gloss.text)
+            element.clear()
+            if not readings or not glosses:
+                continue
+            meaning = '；'.join(glosses[:max_glosses])
+            priority = _jmdict_priority(tags)
+            # 每种写法都作为一个词条，单词和假名都能查到
+            for word in kanji or readings[:1]:
+                yield word, readings[0], meaning, priority, lang
+            for reading in readings[1:]:
+                yield reading, reading, meaning, priority, lang
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tsv', action='append', default=[])
+    parser.add_argument('--jmdict')
+    parser.add_argument('--lang', default='eng')
+    parser.add_argument('--output', default=os.environ.get('DICTIONARY_PATH') or
+                        os.path.join(BACKEND_DIR, '.cache', 'dictionary.sqlite'))
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    temp_path = f'{args.output}.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    conn = sqlite3.connect(temp_path)
+    create_index(conn)
+    total = insert_entries(conn, iter_tsv_entries(SEED_PATH, SEED_PRIORITY))
+    print(f"种子词典: {total} 个词条")
+    for path in args.tsv:
+        count = insert_entries(conn, iter_tsv_entries(path, TSV_PRIORITY))
+        print(f"{path}: {count} 个词条")
+        total += count
+    if args.jmdict:
+        count = insert_entries(conn, iter_jmdict_entries(args.jmdict, args.lang))
+        print(f"{args.jmdict}: {count} 个词条")
+        if args.lang != MEANING_LANG:
+            print(f"  释义语言为 {args.lang}，这些词条不会作为翻译结果返回，只用于判断同音词是否有歧义")
+        total += count
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+
+    # 生成完成后再替换，运行中的服务不会读到写了一半的文件
+    os.replace(temp_path, args.output)
+    print(f"完成：共 {total} 个词条，已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
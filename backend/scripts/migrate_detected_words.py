@@ -0,0 +1,81 @@
+"""
+将旧数据中保存在 detected_words 集合里的单词迁移为历史记录文档内嵌的 words 字段
+
+用法(在backend目录下运行):
+    python -m scripts.migrate_detected_words [--dry-run] [--delete-legacy] [--page-size 200]
+
+--dry-run        只统计需要迁移的记录，不写入
+--delete-legacy  迁移后删除 detected_words 集合中对应的文档
+"""
+import sys
+import argparse
+
+from app import create_app
+
+
+def iter_history_pages(db, page_size):
+    """按文档ID分页遍历全部历史记录"""
+    query = db.collection('history').order_by('__name__').limit(page_size)
+    last_doc = None
+    while True:
+        page_query = query.start_after(last_doc) if last_doc else query
+        docs = list(page_query.stream())
+        if not docs:
+            return
+        yield docs
+        last_doc = docs[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--delete-legacy', action='store_true')
+    parser.add_argument('--page-size', type=int, default=200)
+    args = parser.parse_args()
+
+    create_app()
+    from app.services import get_firestore
+    from app.utils.firebase_utils import get_legacy_detected_words, commit_writes
+
+    try:
+        firestore_db = get_firestore()
+    except Exception as e:
+        print(f'Firebase 初始化失败，请检查 FIREBASE_CREDENTIALS 配置: {str(e)}')
+        sys.exit(1)
+
+    migrated = 0
+    words_moved = 0
+    commits = 0
+    for docs in iter_history_pages(firestore_db, args.page_size):
+        pending = [doc for doc in docs if not (doc.to_dict() or {}).get('words_inline')]
+        if not pending:
+            continue
+
+        # 每页的旧单词通过少量 in 查询一次读出
+        words_by_history = get_legacy_detected_words(doc.id for doc in pending)
+
+        writes = []
+        for doc in pending:
+            words = words_by_history.get(doc.id, [])
+            writes.append(('update', doc.reference, {
+                'words': words,
+                'word_count': len(words),
+                'words_inline': True
+            }))
+            if args.delete_legacy:
+                for word in words:
+                    if word.get('id'):
+                        writes.append(('delete', firestore_db.collection('detected_words').document(word['id']), None))
+            words_moved += len(words)
+        migrated += len(pending)
+
+        if not args.dry_run:
+            commits += commit_writes(writes)
+        print(f"已处理 {migrated} 条历史记录，{words_moved} 个单词")
+
+    action = '需要迁移' if args.dry_run else '已迁移'
+    print(f"完成：{action} {migrated} 条历史记录，{words_moved} 个单词，提交 {commits} 次批量写入")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+将使用随机ID的旧单词文档迁移为由 (用户, 单词, 假名) 决定的ID，并合并重复的单词
+
+用法(在backend目录下运行):
+    python -m scripts.migrate_word_ids [--dry-run] [--page-size 200]
+
+--dry-run  只统计需要迁移和合并的单词，不写入
+
+同一用户的重复单词中，已经使用新ID的文档优先保留，否则保留最早添加的一条。
+"""
+import sys
+import argparse
+
+from app import create_app
+
+
+def iter_word_pages(db, page_size):
+    """按文档ID分页遍历全部单词"""
+    query = db.collection('words').order_by('__name__').limit(page_size)
+    last_doc = None
+    while True:
+        page_query = query.start_after(last_doc) if last_doc else query
+        docs = list(page_query.stream())
+        if not docs:
+            return
+        yield docs
+        last_doc = docs[-1]
+
+
+def _created_key(word_data):
+    created_at = word_data.get('created_at')
+    return (created_at is None, created_at.timestamp() if created_at else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--page-size', type=int, default=200)
+    args = parser.parse_args()
+
+    create_app()
+    from app.services import get_firestore
+    from app.utils.firebase_utils import word_doc_id, commit_versioned_writes
+
+    try:
+        firestore_db = get_firestore()
+    except Exception as e:
+        print(f'Firebase 初始化失败，请检查 FIREBASE_CREDENTIALS 配置: {str(e)}')
+        sys.exit(1)
+
+    # 先按目标ID分组，再决定每组保留哪一条
+    groups = {}
+    for docs in iter_word_pages(firestore_db, args.page_size):
+        for doc in docs:
+            word_data = doc.to_dict() or {}
+            target_id = word_doc_id(word_data.get('user_id'), word_data.get('word'), word_data.get('kana'))
+            groups.setdefault(target_id, []).append((doc, word_data))
+
+    words_ref = firestore_db.collection('words')
+    writes = []
+    user_ids = set()
+    migrated = 0
+    merged = 0
+    for target_id, entries in groups.items():
+        if len(entries) == 1 and entries[0][0].id == target_id:
+            continue
+        entries.sort(key=lambda entry: (entry[0].id != target_id, _created_key(entry[1])))
+        keep_doc, keep_data = entries[0]
+        # 新文档写入后再删除旧文档，中途失败时重新运行即可
+        if keep_doc.id != target_id:
+            writes.append(('set', words_ref.document(target_id), dict(keep_data, id=target_id)))
+            writes.append(('delete', keep_doc.reference, None))
+            migrated += 1
+        for doc, _ in entries[1:]:
+            writes.append(('delete', doc.reference, None))
+            merged += 1
+        user_ids.add(keep_data.get('user_id'))
+
+    commits = 0
+    if writes and not args.dry_run:
+        commits = commit_versioned_writes(writes, 'words', [user_id for user_id in user_ids if user_id])
+
+    action = '需要迁移' if args.dry_run else '已迁移'
+    print(f"完成：{action} {migrated} 个单词，合并 {merged} 个重复单词，提交 {commits} 次批量写入")
+
+
+if __name__ == '__main__':
+    main()
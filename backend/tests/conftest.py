@@ -0,0 +1,52 @@
+"""
+接口测试共用的夹具，使用 benchmarks.fakes 中的进程内替身，不连接Firebase和OpenAI
+在backend目录下运行: python -m pytest tests
+"""
+import os
+import sys
+import uuid
+import tempfile
+
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-at-least-32-bytes-long')
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')
+os.environ.setdefault('TTS_CACHE_DIR', tempfile.mkdtemp(prefix='shirupic-test-tts-'))
+os.environ.setdefault('ANALYSIS_CACHE_BACKEND', 'memory')
+os.environ.setdefault('TRANSLATE_CACHE_BACKEND', 'memory')
+os.environ.setdefault('ADMISSION_ENABLED', 'false')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from benchmarks.fakes import FakeFirestore, FakeBucket, FakeOpenAI
+from app import create_app
+
+
+@pytest.fixture
+def firestore():
+    return FakeFirestore('0')
+
+
+@pytest.fixture
+def bucket():
+    return FakeBucket('0')
+
+
+@pytest.fixture
+def app(firestore, bucket):
+    return create_app({'FIRESTORE_CLIENT': firestore, 'STORAGE_BUCKET': bucket, 'OPENAI_CLIENT': FakeOpenAI('0')})
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers():
+    # 每个测试使用不同的用户，进程内缓存的版本号等状态不会互相影响
+    user_id = f'test-{uuid.uuid4().hex[:12]}'
+    token = jwt.encode({'user_id': user_id}, os.environ['SECRET_KEY'], algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
@@ -0,0 +1,60 @@
+import pytest
+
+from app import services
+from app.utils import analysis_cache
+from app.utils.cache import MemoryCache, FirestoreCache
+from benchmarks.fakes import FakeFirestore
+
+BASE_HASH = 'f0' * 16
+
+
+def flip_bits(perceptual_hash, *bits):
+    value = int(perceptual_hash, 16)
+    for bit in bits:
+        value ^= 1 << bit
+    return format(value, f'0{len(perceptual_hash)}x')
+
+
+@pytest.fixture(params=['memory', 'firestore'])
+def cache(request, monkeypatch):
+    if request.param == 'firestore':
+        services.override('firestore', FakeFirestore('0'))
+        backend = FirestoreCache('analysis_cache', ttl=60)
+    else:
+        backend = MemoryCache()
+    monkeypatch.setattr(analysis_cache, '_cache', backend)
+    return backend
+
+
+def test_perceptual_hash_matches_within_distance(cache):
+    analysis_cache.set_cached_analysis('a' * 64, BASE_HASH, {'words': [{'word': '猫'}]})
+
+    result, matched_by = analysis_cache.get_cached_analysis('a' * 64, BASE_HASH)
+    assert matched_by == 'sha256'
+
+    result, matched_by = analysis_cache.get_cached_analysis('b' * 64, flip_bits(BASE_HASH, 1, 40, 90))
+    assert matched_by == 'phash'
+    assert result == {'words': [{'word': '猫'}]}
+
+    result, matched_by = analysis_cache.get_cached_analysis('b' * 64, flip_bits(BASE_HASH, 1, 2, 40, 90))
+    assert result is None
+
+
+def test_band_index_keeps_every_similar_image(cache):
+    for i in range(3):
+        analysis_cache.set_cached_analysis(f'{i}' * 64, flip_bits(BASE_HASH, i), {'index': i})
+    band_key = analysis_cache._band_keys(BASE_HASH)[1]
+    assert len(cache.get(band_key)) == 3
+
+
+def test_firestore_cache_expiry_and_clear():
+    firestore = FakeFirestore('0')
+    services.override('firestore', firestore)
+    cache = FirestoreCache('test_cache', ttl=60)
+    cache.set('key', {'value': 1})
+    cache.set('expired', 1, ttl=-1)
+    assert cache.get('key') == {'value': 1}
+    assert cache.get('expired') is None
+
+    cache.clear(page_size=1)
+    assert firestore.data['test_cache'] == {}
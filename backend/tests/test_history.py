@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+from benchmarks.fakes import make_test_image
+
+
+@pytest.fixture
+def history_id(client, auth_headers):
+    response = client.post('/api/image/analyze', data={'image': (io.BytesIO(make_test_image(1)), 'photo.png')},
+                           headers=auth_headers, content_type='multipart/form-data')
+    assert response.status_code == 200
+    return client.get('/api/history', headers=auth_headers).get_json()[0]['id']
+
+
+def test_fields_projection_skips_words_unless_requested(client, auth_headers, history_id):
+    items = client.get('/api/history?limit=5&fields=thumbnail_url', headers=auth_headers).get_json()['items']
+    assert [item['id'] for item in items] == [history_id]
+    assert 'words' not in items[0]
+    assert 'sentence' not in items[0]
+
+    items = client.get('/api/history?limit=5&fields=thumbnail_url,words&include_words=1',
+                       headers=auth_headers).get_json()['items']
+    assert len(items[0]['words']) > 0
+
+
+@pytest.mark.parametrize('body', [
+    {'from': '2000-01-01', 'to': '2000-01-02'},
+    {'to': '2000-01-01T00:00:00'},
+    {'from': '2000-01-01T00:00:00+08:00', 'to': '2000-01-02Z'},
+])
+def test_delete_by_range_accepts_dates_without_offset(client, auth_headers, history_id, body):
+    response = client.delete('/api/history', json=body, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_json()['deleted'] == 0
+
+
+@pytest.mark.parametrize('body', [{'from': 'yesterday'}, {'from': 5}])
+def test_delete_by_range_rejects_invalid_dates(client, auth_headers, body):
+    assert client.delete('/api/history', json=body, headers=auth_headers).status_code == 400
+
+
+def test_delete_by_range(client, auth_headers, history_id):
+    response = client.delete('/api/history', json={'from': '2000-01-01'}, headers=auth_headers)
+    assert response.get_json()['deleted'] == 1
+    assert client.get('/api/history', headers=auth_headers).get_json() == []
@@ -0,0 +1,22 @@
+from app import create_app
+from benchmarks.fakes import FakeFirestore, FakeBucket, FakeOpenAI
+
+
+def make_client():
+    return create_app({'FIRESTORE_CLIENT': FakeFirestore('0'), 'STORAGE_BUCKET': FakeBucket('0'),
+                       'OPENAI_CLIENT': FakeOpenAI('0')}).test_client()
+
+
+def test_metrics_hidden_without_token(monkeypatch):
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    monkeypatch.delenv('METRICS_PUBLIC', raising=False)
+    assert make_client().get('/metrics').status_code == 404
+
+
+def test_metrics_require_token(monkeypatch):
+    monkeypatch.setenv('METRICS_TOKEN', 'secret')
+    client = make_client()
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert 'request_duration' in response.get_data(as_text=True)
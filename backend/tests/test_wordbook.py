@@ -0,0 +1,97 @@
+import io
+
+
+def add(client, headers, word, kana, meaning):
+    return client.post('/api/wordbook/add', json={'word': word, 'kana': kana, 'meaning': meaning}, headers=headers)
+
+
+def list_words(client, headers):
+    return client.get('/api/wordbook', headers=headers).get_json()
+
+
+def test_add_is_idempotent_and_keeps_stored_meaning(client, auth_headers):
+    first = add(client, auth_headers, '猫', 'ねこ', '猫')
+    assert first.status_code == 201
+    assert first.get_json()['created'] is True
+
+    second = add(client, auth_headers, ' 猫 ', 'ねこ', '狗')
+    assert second.status_code == 200
+    body = second.get_json()
+    assert body['created'] is False
+    assert body['id'] == first.get_json()['id']
+    assert body['meaning'] == '猫'
+
+    words = list_words(client, auth_headers)
+    assert [(w['word'], w['meaning']) for w in words] == [('猫', '猫')]
+
+
+def test_batch_add_deduplicates(client, auth_headers):
+    add(client, auth_headers, '猫', 'ねこ', '猫')
+    response = client.post('/api/wordbook/add/batch', json={'words': [
+        {'word': '犬', 'kana': 'いぬ', 'meaning': '狗'},
+        {'word': '猫', 'kana': 'ねこ', 'meaning': '其他'},
+        {'word': '犬', 'kana': 'いぬ', 'meaning': '狗'},
+    ]}, headers=auth_headers)
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['saved'] == 2
+    assert body['ids'][0] == body['ids'][2]
+    assert sorted((w['word'], w['meaning']) for w in list_words(client, auth_headers)) == [('犬', '狗'), ('猫', '猫')]
+
+
+def test_rename_onto_existing_word_is_rejected(client, auth_headers):
+    add(client, auth_headers, '猫', 'ねこ', '猫')
+    dog = add(client, auth_headers, '犬', 'いぬ', '狗').get_json()
+
+    response = client.put(f"/api/wordbook/{dog['id']}", json={'word': '猫', 'kana': 'ねこ'}, headers=auth_headers)
+    assert response.status_code == 409
+    assert sorted((w['word'], w['meaning']) for w in list_words(client, auth_headers)) == [('犬', '狗'), ('猫', '猫')]
+
+    response = client.put(f"/api/wordbook/{dog['id']}", json={'kana': 'イヌ'}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_json()['id'] != dog['id']
+
+
+def test_etag_returns_304_until_the_wordbook_changes(client, auth_headers):
+    add(client, auth_headers, '猫', 'ねこ', '猫')
+    first = client.get('/api/wordbook', headers=auth_headers)
+    etag = first.headers['ETag']
+
+    cached = client.get('/api/wordbook', headers=dict(auth_headers, **{'If-None-Match': etag}))
+    assert cached.status_code == 304
+
+    add(client, auth_headers, '犬', 'いぬ', '狗')
+    changed = client.get('/api/wordbook', headers=dict(auth_headers, **{'If-None-Match': etag}))
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_paging_and_invalid_cursor(client, auth_headers):
+    for word, kana in (('猫', 'ねこ'), ('犬', 'いぬ'), ('鳥', 'とり')):
+        add(client, auth_headers, word, kana, word)
+
+    page = client.get('/api/wordbook?limit=2', headers=auth_headers).get_json()
+    assert len(page['items']) == 2
+    rest = client.get(f"/api/wordbook?limit=2&cursor={page['nextCursor']}", headers=auth_headers).get_json()
+    assert len(rest['items']) == 1
+    assert rest['nextCursor'] is None
+
+    assert client.get('/api/wordbook?limit=2&cursor=not-a-cursor', headers=auth_headers).status_code == 400
+
+
+def test_import_with_invalid_utf8_writes_nothing(client, auth_headers):
+    content = 'word,kana,meaning\n猫,ねこ,猫\n'.encode('utf-8') + b'\xff\xfe,x,y\n'
+    response = client.post('/api/wordbook/import', data={'file': (io.BytesIO(content), 'words.csv')},
+                           headers=auth_headers, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert response.get_json()['imported'] == 0
+    assert list_words(client, auth_headers) == []
+
+
+def test_import_skips_existing_words(client, auth_headers):
+    add(client, auth_headers, '猫', 'ねこ', '用户的释义')
+    content = 'word,kana,meaning\n猫,ねこ,文件中的释义\n犬,いぬ,狗\n犬,いぬ,狗\n'.encode('utf-8')
+    response = client.post('/api/wordbook/import', data={'file': (io.BytesIO(content), 'words.csv')},
+                           headers=auth_headers, content_type='multipart/form-data')
+    assert response.get_json() == {'imported': 1, 'duplicates': 2}
+    assert sorted((w['word'], w['meaning']) for w in list_words(client, auth_headers)) == [('犬', '狗'), ('猫', '用户的释义')]
@@ -127,6 +127,8 @@ interface HistoryItem {
   id: string;
   imageUrl: string;
   image_url?: string;
+  thumbnailUrl?: string;  // 列表使用的缩略图，旧记录没有时显示原图
+  placeholder?: string;   // 缩略图加载前显示的模糊占位图(data URI)
   sentence: string;
   sentence_japanese?: string;
   translated_sentence?: string;
@@ -137,6 +139,7 @@ interface HistoryItem {
   wordCount?: number;
   word_count?: number;
   imageData?: string;  // 用于离线模式下存储图片数据
+  thumbnailData?: string;  // 离线模式下列表使用的缩略图数据
 }
 
 const HistoryPage: React.FC = () => {
@@ -160,11 +163,13 @@ const HistoryPage: React.FC = () => {
         adaptedItems = localHistory.map((item) => ({
           id: item.id,
           imageUrl: item.imageUrl,
+          thumbnailUrl: item.thumbnailUrl,
           sentence: item.sentence,
           translatedSentence: item.translatedSentence,
           createdAt: item.timestamp ? new Date(item.timestamp).toISOString() : new Date().toISOString(),
           wordCount: item.wordCount || 0,
-          imageData: item.imageData // 离线模式下可能直接包含图片数据
+          imageData: item.imageData, // 离线模式下可能直接包含图片数据
+          thumbnailData: item.thumbnailData
         }));
         console.log('离线模式：已加载本地历史记录数据', adaptedItems.length);
       } else {
@@ -174,6 +179,8 @@ const HistoryPage: React.FC = () => {
         adaptedItems = response.data.map((item: any) => ({
           id: item.id,
           imageUrl: item.image_url || item.imageUrl,
+          thumbnailUrl: item.thumbnail_url,
+          placeholder: item.placeholder,
           sentence: item.sentence_japanese || item.sentence,
           translatedSentence: item.sentence_chinese || item.translated_sentence || item.translatedSentence,
           createdAt: item.created_at || item.createdAt,
@@ -184,10 +191,15 @@ const HistoryPage: React.FC = () => {
         try {
           for (const item of adaptedItems) {
             // 尝试获取图片缓存，如果已有则保存到本地历史记录
+            // 原图和缩略图分开保存，离线详情页的单词标注需要原图
             let imageData = null;
             if (item.imageUrl) {
               imageData = await getCachedImage(item.imageUrl);
             }
+            let thumbnailData = null;
+            if (item.thumbnailUrl) {
+              thumbnailData = await getCachedImage(item.thumbnailUrl);
+            }
             
             // 根据原始创建时间解析时间戳
             let timestamp;
@@ -205,6 +217,8 @@ const HistoryPage: React.FC = () => {
               id: item.id,
               imageUrl: item.imageUrl,
               imageData: imageData || undefined, // 如果有缓存则保存图片数据
+              thumbnailUrl: item.thumbnailUrl,
+              thumbnailData: thumbnailData || undefined,
               sentence: item.sentence,
               translatedSentence: item.translatedSentence,
               wordCount: item.wordCount,
@@ -221,19 +235,24 @@ const HistoryPage: React.FC = () => {
       
       // 检查每个图片是否有缓存
       for (const item of adaptedItems) {
-        // 如果离线模式下直接有图片数据，则使用该数据
+        // 如果离线模式下直接有图片数据，则使用该数据，列表优先使用缩略图
+        const listImageUrl = item.thumbnailUrl || item.imageUrl;
         if (item.imageData) {
           cachedUrls.current.set(item.imageUrl, item.imageData);
-          console.log('使用离线存储的图片数据:', item.imageUrl);
+        }
+        const listImageData = item.thumbnailData || item.imageData;
+        if (listImageData) {
+          cachedUrls.current.set(listImageUrl, listImageData);
+          console.log('使用离线存储的图片数据:', listImageUrl);
           continue;
         }
         
         // 否则检查缓存
-        if (item.imageUrl) {
-          const cachedData = await getCachedImage(item.imageUrl);
+        if (listImageUrl) {
+          const cachedData = await getCachedImage(listImageUrl);
           if (cachedData) {
-            cachedUrls.current.set(item.imageUrl, cachedData);
-            console.log('使用缓存图片:', item.imageUrl);
+            cachedUrls.current.set(listImageUrl, cachedData);
+            console.log('使用缓存图片:', listImageUrl);
           }
         }
       }
@@ -267,11 +286,13 @@ const HistoryPage: React.FC = () => {
             return {
               id: item.id,
               imageUrl: item.imageUrl,
+              thumbnailUrl: item.thumbnailUrl,
               sentence: item.sentence,
               translatedSentence: item.translatedSentence,
               createdAt: itemCreatedAt,
               wordCount: item.wordCount || 0,
               imageData: item.imageData,
+              thumbnailData: item.thumbnailData,
               words: item.words || [] // 确保单词数组也被加载
             };
           });
@@ -281,6 +302,10 @@ const HistoryPage: React.FC = () => {
             if (item.imageData) {
               cachedUrls.current.set(item.imageUrl, item.imageData);
             }
+            const listImageData = item.thumbnailData || item.imageData;
+            if (listImageData) {
+              cachedUrls.current.set(item.thumbnailUrl || item.imageUrl, listImageData);
+            }
           }
           
           setHistoryItems(adaptedItems);
@@ -433,6 +458,8 @@ const HistoryPage: React.FC = () => {
               id: detailData.id,
               imageUrl: detailData.image_url || detailData.imageUrl,
               imageData: detailData.cachedImageData || undefined,
+              thumbnailUrl: detailData.thumbnail_url,
+              thumbnailData: (detailData.thumbnail_url && cachedUrls.current.get(detailData.thumbnail_url)) || undefined,
               sentence: detailData.sentence_japanese || detailData.sentence,
               translatedSentence: detailData.sentence_chinese || detailData.translatedSentence,
               wordCount: detailData.word_count || detailData.wordCount || 0,
@@ -513,83 +540,89 @@ const HistoryPage: React.FC = () => {
           columnClassName="masonry-grid_column"
           style={{ marginTop: 16 }}
         >
-          {historyItems.map((item) => (
-            <motion.div
-              key={item.id}
-              initial={{ opacity: 0, y: 20 }}
-              animate={{ opacity: 1, y: 0 }}
-              transition={{ duration: 0.3 }}
-            >
-              <ImageCard onClick={() => handleViewDetails(item)}>
-                  <StyledImage
-                    src={cachedUrls.current.get(item.imageUrl) || item.imageUrl}
-                    alt="历史图片"
-                    preview={false}
-                    onLoad={() => {
-                      // 如果这个图片URL还没有缓存，就缓存它
-                      if (item.imageUrl && !cachedUrls.current.has(item.imageUrl)) {
-                        // 使用URL转换为base64
-                        convertImageToBase64(item.imageUrl)
-                          .then(base64Data => {
-                            // 存入缓存
-                            cacheImage(item.imageUrl, base64Data);
-                            // 更新当前的缓存映射
-                            cachedUrls.current.set(item.imageUrl, base64Data);
-                          })
-                          .catch(err => console.error('缓存图片失败:', err));
-                      }
-                    }}
-                  />
-                  
-                  <WordCountBadge>
-                    <TranslationOutlined />
-                    {item.wordCount || 0}个单词
-                  </WordCountBadge>
-                  
-                  <CardContent>
-                    <Paragraph ellipsis={{ rows: 2 }} style={{ fontSize: '14px', marginBottom: '4px', fontWeight: 'bold' }}>
-                      {item.sentence}
-                    </Paragraph>
-                    <Text type="secondary" style={{ fontSize: '12px', display: 'block' }}>
-                      {formatDate(item.createdAt)}
-                    </Text>
-                  </CardContent>
-                  
-                  <div style={{
-                    position: 'absolute',
-                    bottom: '8px',
-                    right: '8px',
-                    display: 'flex',
-                    gap: '8px',
-                    zIndex: 2
-                  }}>
-                    <Tooltip title="删除记录">
-                      <Button
-                        type="text"
-                        danger
-                        size="small"
-                        shape="circle"
-                        icon={<DeleteOutlined />}
-                        onClick={(e) => {
-                          e.stopPropagation();
-                          handleDelete(item.id);
-                        }}
-                        style={{
-                          opacity: 0.7,
-                          transition: 'opacity 0.3s'
-                        }}
-                        onMouseEnter={(e) => {
-                          e.currentTarget.style.opacity = '1';
-                        }}
-                        onMouseLeave={(e) => {
-                          e.currentTarget.style.opacity = '0.7';
-                        }}
-                      />
-                    </Tooltip>
-                  </div>
-                </ImageCard>
-            </motion.div>
-          ))}
+          {historyItems.map((item) => {
+            const listImageUrl = item.thumbnailUrl || item.imageUrl;
+            return (
+              <motion.div
+                key={item.id}
+                initial={{ opacity: 0, y: 20 }}
+                animate={{ opacity: 1, y: 0 }}
+                transition={{ duration: 0.3 }}
+              >
+                <ImageCard onClick={() => handleViewDetails(item)}>
+                    <StyledImage
+                      src={cachedUrls.current.get(listImageUrl) || listImageUrl}
+                      alt="历史图片"
+                      preview={false}
+                      placeholder={item.placeholder ? (
+                        <img src={item.placeholder} alt="" style={{ width: '100%', filter: 'blur(8px)' }} />
+                      ) : undefined}
+                      onLoad={() => {
+                        // 如果这个图片URL还没有缓存，就缓存它
+                        if (listImageUrl && !cachedUrls.current.has(listImageUrl)) {
+                          // 使用URL转换为base64
+                          convertImageToBase64(listImageUrl)
+                            .then(base64Data => {
+                              // 存入缓存
+                              cacheImage(listImageUrl, base64Data);
+                              // 更新当前的缓存映射
+                              cachedUrls.current.set(listImageUrl, base64Data);
+                            })
+                            .catch(err => console.error('缓存图片失败:', err));
+                        }
+                      }}
+                    />
+                    
+                    <WordCountBadge>
+                      <TranslationOutlined />
+                      {item.wordCount || 0}个单词
+                    </WordCountBadge>
+                    
+                    <CardContent>
+                      <Paragraph ellipsis={{ rows: 2 }} style={{ fontSize: '14px', marginBottom: '4px', fontWeight: 'bold' }}>
+                        {item.sentence}
+                      </Paragraph>
+                      <Text type="secondary" style={{ fontSize: '12px', display: 'block' }}>
+                        {formatDate(item.createdAt)}
+                      </Text>
+                    </CardContent>
+                    
+                    <div style={{
+                      position: 'absolute',
+                      bottom: '8px',
+                      right: '8px',
+                      display: 'flex',
+                      gap: '8px',
+                      zIndex: 2
+                    }}>
+                      <Tooltip title="删除记录">
+                        <Button
+                          type="text"
+                          danger
+                          size="small"
+                          shape="circle"
+                          icon={<DeleteOutlined />}
+                          onClick={(e) => {
+                            e.stopPropagation();
+                            handleDelete(item.id);
+                          }}
+                          style={{
+                            opacity: 0.7,
+                            transition: 'opacity 0.3s'
+                          }}
+                          onMouseEnter={(e) => {
+                            e.currentTarget.style.opacity = '1';
+                          }}
+                          onMouseLeave={(e) => {
+                            e.currentTarget.style.opacity = '0.7';
+                          }}
+                        />
+                      </Tooltip>
+                    </div>
+                  </ImageCard>
+              </motion.div>
+            );
+          })}
         </Masonry>
       ) : (
         <Empty
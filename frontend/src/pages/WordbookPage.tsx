@@ -209,6 +209,41 @@ interface TranslateResult {
   exampleMeaning?: string;
 }
 
+// 解析翻译接口的返回数据，兼容JSON字符串、OpenAI格式和对象
+const parseTranslateResult = (data: any): TranslateResult | undefined => {
+  let result;
+  
+  // 处理不同的数据格式可能性
+  if (typeof data === 'string') {
+    // 尝试解析JSON字符串
+    try {
+      result = JSON.parse(data);
+    } catch (e) {
+      // 如果不是有效的JSON，查找JSON部分并解析
+      const jsonMatch = data.match(/\{[\s\S]*\}/);
+      if (jsonMatch) {
+        result = JSON.parse(jsonMatch[0]);
+      }
+    }
+  } else if (data.choices && data.choices[0]?.message?.content) {
+    // OpenAI格式响应
+    const content = data.choices[0].message.content;
+    try {
+      const jsonMatch = content.match(/\{[\s\S]*\}/);
+      if (jsonMatch) {
+        result = JSON.parse(jsonMatch[0]);
+      }
+    } catch (e) {
+      console.error('解析AI响应失败:', e);
+    }
+  } else if (typeof data === 'object') {
+    // 直接是对象
+    result = data;
+  }
+  
+  return result;
+};
+
 const WordbookPage: React.FC = () => {
   const [words, setWords] = useState<Word[]>([]);
   const [filteredWords, setFilteredWords] = useState<Word[]>([]);
@@ -411,9 +446,10 @@ const WordbookPage: React.FC = () => {
       message.success('单词已更新');
       setEditModalVisible(false);
       fetchWords();
-    } catch (error) {
+    } catch (error: any) {
       console.error('更新单词失败:', error);
-      message.error('更新单词失败');
+      // 409: 修改后与单词本中已有的单词相同
+      message.error(error.response?.status === 409 ? error.response.data.error : '更新单词失败');
     }
   };
 
@@ -424,7 +460,7 @@ const WordbookPage: React.FC = () => {
     setAddModalVisible(true);
   };
 
-  // 翻译单词 - 使用AI接口翻译单词并自动填充表单
+  // 翻译单词 - 先用本地词典快速填充表单，例句随后由AI接口补充
   const handleTranslate = async () => {
     const word = form.getFieldValue('word');
     if (!word) {
@@ -434,37 +470,8 @@ const WordbookPage: React.FC = () => {
     
     setTranslating(true);
     try {
-      const response = await aiAPI.translateJapaneseChinese(word);
-      const data = response.data;
-      let result;
-      
-      // 处理不同的数据格式可能性
-      if (typeof data === 'string') {
-        // 尝试解析JSON字符串
-        try {
-          result = JSON.parse(data);
-        } catch (e) {
-          // 如果不是有效的JSON，查找JSON部分并解析
-          const jsonMatch = data.match(/\{[\s\S]*\}/);
-          if (jsonMatch) {
-            result = JSON.parse(jsonMatch[0]);
-          }
-        }
-      } else if (data.choices && data.choices[0]?.message?.content) {
-        // OpenAI格式响应
-        const content = data.choices[0].message.content;
-        try {
-          const jsonMatch = content.match(/\{[\s\S]*\}/);
-          if (jsonMatch) {
-            result = JSON.parse(jsonMatch[0]);
-          }
-        } catch (e) {
-          console.error('解析AI响应失败:', e);
-        }
-      } else if (typeof data === 'object') {
-        // 直接是对象
-        result = data;
-      }
+      const response = await aiAPI.translateJapaneseChinese(word, false);
+      const result = parseTranslateResult(response.data);
       
       if (result && result.word) {
         setTranslateResult(result);
@@ -475,6 +482,10 @@ const WordbookPage: React.FC = () => {
           meaning: result.meaning || ''
         });
         message.success('翻译成功');
+        // 词典结果不含例句，在后台请求AI生成
+        if (!result.example) {
+          loadExamples(word, result.word);
+        }
       } else {
         message.error('无法解析翻译结果');
       }
@@ -486,6 +497,21 @@ const WordbookPage: React.FC = () => {
     }
   };
 
+  // 补充例句，只更新例句字段，保留词典给出的单词、假名和含义
+  const loadExamples = async (query: string, word: string) => {
+    try {
+      const response = await aiAPI.translateJapaneseChinese(query, true);
+      const result = parseTranslateResult(response.data);
+      if (result && (result.example || result.exampleMeaning)) {
+        setTranslateResult(current => current && current.word === word
+          ? { ...current, example: result.example, exampleMeaning: result.exampleMeaning }
+          : current);
+      }
+    } catch (error) {
+      console.error('获取例句失败:', error);
+    }
+  };
+
   // 保存新单词
   const handleSaveNew = async (values: any) => {
     try {
@@ -152,6 +152,8 @@ export interface IHistoryItem {
   id: string;               // 历史记录ID
   imageUrl: string;        // 图片URL
   imageData?: string;      // 图片数据(base64格式)
+  thumbnailUrl?: string;   // 缩略图URL
+  thumbnailData?: string;  // 缩略图数据(base64格式)，仅用于列表显示
   sentence: string;        // 原始日语句子
   translatedSentence: string; // 翻译后的中文句子
   wordCount?: number;      // 单词数量